@@ -0,0 +1,174 @@
+"""
+Event-driven achievement evaluation.
+
+Active Achievement rules are loaded once per process and indexed by
+condition_type. When an event happens only the rule types it can affect are
+evaluated, with one set-based metric query per type for any number of users,
+and newly earned UserAchievement rows are inserted in bulk.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_right
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from main.models import (
+    Achievement, Budget, Expense, User, UserAchievement, UserProfile, UserProgress, VirtualPortfolio
+)
+
+logger = logging.getLogger(__name__)
+
+# Condition types each event can change
+EVENT_CONDITIONS = {
+    'module_completed': ('modules_completed',),
+    'points_earned': ('points_earned', 'streak_days'),
+    'portfolio_revalued': ('portfolio_profit', 'portfolio_value'),
+    'expense_recorded': ('budget_followed',),
+}
+
+# Safety net for rule edits made by other processes
+RULES_MAX_AGE = 300
+BATCH_SIZE = 500
+
+_rules = None
+_rules_loaded_at = 0
+_rules_lock = threading.Lock()
+
+
+def get_rules():
+    """Active rules as {condition_type: ([thresholds ascending], [achievement ids])}"""
+    global _rules, _rules_loaded_at
+    with _rules_lock:
+        if _rules is None or time.monotonic() - _rules_loaded_at > RULES_MAX_AGE:
+            rules = {}
+            for condition_type, value, achievement_id in Achievement.objects.filter(
+                is_active=True
+            ).order_by('condition_type', 'condition_value', 'id').values_list(
+                'condition_type', 'condition_value', 'id'
+            ):
+                thresholds, ids = rules.setdefault(condition_type, ([], []))
+                thresholds.append(value)
+                ids.append(achievement_id)
+            _rules = rules
+            _rules_loaded_at = time.monotonic()
+        return _rules
+
+
+def invalidate_rules():
+    global _rules
+    with _rules_lock:
+        _rules = None
+
+
+def _modules_completed(user_ids):
+    return dict(
+        UserProgress.objects.filter(user_id__in=user_ids, is_completed=True).order_by().values(
+            'user_id'
+        ).annotate(total=Count('id')).values_list('user_id', 'total')
+    )
+
+
+def _points_earned(user_ids):
+    return dict(UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'total_points'))
+
+
+def _streak_days(user_ids):
+    return dict(UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'streak_days'))
+
+
+def _portfolio_profit(user_ids):
+    return dict(VirtualPortfolio.objects.filter(user_id__in=user_ids).values_list('user_id', 'profit_loss'))
+
+
+def _portfolio_value(user_ids):
+    return dict(VirtualPortfolio.objects.filter(user_id__in=user_ids).values_list('user_id', 'current_value'))
+
+
+def _budget_followed(user_ids):
+    """Finished budgets whose period spending stayed within the budget"""
+    spent = Expense.objects.filter(
+        user_id=OuterRef('user_id'),
+        date__gte=OuterRef('start_date'),
+        date__lte=OuterRef('end_date'),
+    ).order_by().values('user_id').annotate(total=Sum('amount')).values('total')
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return dict(
+        Budget.objects.filter(user_id__in=user_ids, end_date__lt=timezone.localdate()).annotate(
+            spent=Coalesce(Subquery(spent, output_field=money), Value(0), output_field=money)
+        ).filter(spent__lte=F('total_amount')).order_by().values('user_id').annotate(
+            total=Count('id')
+        ).values_list('user_id', 'total')
+    )
+
+
+METRICS = {
+    'modules_completed': _modules_completed,
+    'points_earned': _points_earned,
+    'streak_days': _streak_days,
+    'portfolio_profit': _portfolio_profit,
+    'portfolio_value': _portfolio_value,
+    'budget_followed': _budget_followed,
+}
+
+
+def evaluate(event, user_ids, condition_types=None):
+    """
+    Award any achievements ``event`` may have unlocked for ``user_ids``.
+
+    Returns the number of UserAchievement rows considered for insertion;
+    rows the user already has are skipped by the database.
+    """
+    rules = get_rules()
+    condition_types = condition_types or EVENT_CONDITIONS[event]
+    user_ids = list(user_ids)
+    earned = []
+    for condition_type in condition_types:
+        if condition_type not in rules:
+            continue
+        thresholds, achievement_ids = rules[condition_type]
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            values = METRICS[condition_type](user_ids[start:start + BATCH_SIZE])
+            for user_id, value in values.items():
+                unlocked = bisect_right(thresholds, value or 0)
+                earned.extend(
+                    UserAchievement(user_id=user_id, achievement_id=achievement_id)
+                    for achievement_id in achievement_ids[:unlocked]
+                )
+    if earned:
+        UserAchievement.objects.bulk_create(earned, ignore_conflicts=True, batch_size=BATCH_SIZE)
+        logger.debug('Event %s: %d achievements checked for %d users', event, len(earned), len(user_ids))
+    return len(earned)
+
+
+def evaluate_on_commit(event, user_ids):
+    """Run ``evaluate`` once the current transaction commits"""
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: evaluate(event, user_ids))
+
+
+def evaluate_portfolios(portfolio_ids):
+    """Fire ``portfolio_revalued`` for the owners of the given portfolios"""
+    rules = get_rules()
+    if not any(condition_type in rules for condition_type in EVENT_CONDITIONS['portfolio_revalued']):
+        return 0
+    portfolio_ids = list(portfolio_ids)
+    user_ids = []
+    for start in range(0, len(portfolio_ids), BATCH_SIZE):
+        user_ids.extend(VirtualPortfolio.objects.filter(
+            pk__in=portfolio_ids[start:start + BATCH_SIZE]
+        ).values_list('user_id', flat=True))
+    return evaluate('portfolio_revalued', user_ids)
+
+
+def evaluate_all(batch_size=BATCH_SIZE):
+    """Evaluate every rule type for every user; used for backfills"""
+    total = 0
+    condition_types = tuple(METRICS)
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(user_ids), batch_size):
+        total += evaluate(None, user_ids[start:start + batch_size], condition_types)
+    return total
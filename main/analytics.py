@@ -0,0 +1,160 @@
+"""
+Vectorised portfolio performance analytics over PortfolioSnapshot series.
+
+Series are loaded as NumPy arrays straight from snapshot rows. The
+statistics are array expressions with no per-day Python loop: returns,
+drawdown, volatility, Sharpe ratio, and beta/correlation/tracking error
+against a benchmark.
+
+The benchmark is the platform as a whole: the summed net worth of every
+portfolio that existed before the window starts. Portfolios opened during the
+window would otherwise show up as gains. It costs one GROUP BY over the
+window and is cached until the day ends.
+"""
+from datetime import datetime, time as dt_time, timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from main.models import PortfolioSnapshot
+
+TRADING_DAYS = 252
+MAX_HISTORY_DAYS = 5 * 365
+BENCHMARK_KEY = 'analytics:benchmark:{start}:{end}'
+
+
+def load_series(portfolio, start, end, field='net_worth'):
+    """(dates as datetime64[D], values as float64) of a portfolio's snapshots in [start, end]"""
+    rows = PortfolioSnapshot.objects.filter(
+        portfolio=portfolio, date__gte=start, date__lte=end
+    ).order_by('date').values_list('date', field)
+    dates = np.array([row[0] for row in rows], dtype='datetime64[D]')
+    values = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    return dates, values
+
+
+def benchmark_series(start, end):
+    """Summed net worth by day of portfolios that existed before ``start``"""
+    key = BENCHMARK_KEY.format(start=start.isoformat(), end=end.isoformat())
+    cached = cache.get(key)
+    if cached is None:
+        opened_before = timezone.make_aware(datetime.combine(start, dt_time.min))
+        rows = list(
+            PortfolioSnapshot.objects.filter(
+                date__gte=start, date__lte=end, portfolio__created_at__lt=opened_before
+            ).order_by('date').values('date').annotate(total=Sum('net_worth')).values_list('date', 'total')
+        )
+        cached = ([row[0] for row in rows], [float(row[1]) for row in rows])
+        # Today's totals move until the day's last snapshot run
+        tomorrow = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=1), dt_time.min))
+        cache.set(key, cached, max(60, int((tomorrow - timezone.now()).total_seconds())))
+    dates, totals = cached
+    return np.array(dates, dtype='datetime64[D]'), np.array(totals, dtype=np.float64)
+
+
+def simple_returns(values):
+    """Period-over-period returns; periods starting from zero are 0"""
+    values = np.asarray(values, dtype=np.float64)
+    previous = values[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.where(previous != 0, np.diff(values) / previous, 0.0)
+    return returns
+
+
+def cumulative_returns(values):
+    """Growth since the first value, e.g. 0.05 for +5%"""
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values) or values[0] == 0:
+        return np.zeros_like(values)
+    return values / values[0] - 1
+
+
+def drawdown(values):
+    """Fall from the running peak at each point (0 or negative)"""
+    values = np.asarray(values, dtype=np.float64)
+    peaks = np.maximum.accumulate(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(peaks > 0, values / peaks - 1, 0.0)
+
+
+def annualised_volatility(returns, periods=TRADING_DAYS):
+    if len(returns) < 2:
+        return None
+    return float(np.std(returns, ddof=1) * np.sqrt(periods))
+
+
+def sharpe_ratio(returns, periods=TRADING_DAYS):
+    """Annualised Sharpe ratio with a zero risk-free rate"""
+    if len(returns) < 2:
+        return None
+    deviation = np.std(returns, ddof=1)
+    if deviation == 0:
+        return None
+    return float(np.mean(returns) / deviation * np.sqrt(periods))
+
+
+def align(dates, values, other_dates, other_values):
+    """Both series restricted to the dates they have in common"""
+    common, mine, theirs = np.intersect1d(dates, other_dates, assume_unique=True, return_indices=True)
+    return common, values[mine], other_values[theirs]
+
+
+def compare(returns, benchmark_returns, periods=TRADING_DAYS):
+    """Beta, correlation and annualised tracking error against aligned benchmark returns"""
+    if len(returns) < 2:
+        return {'beta': None, 'correlation': None, 'tracking_error': None}
+    variance = np.var(benchmark_returns, ddof=1)
+    covariance = np.cov(returns, benchmark_returns, ddof=1)[0, 1]
+    spread = np.std(returns, ddof=1) * np.sqrt(variance)
+    return {
+        'beta': float(covariance / variance) if variance else None,
+        'correlation': float(covariance / spread) if spread else None,
+        'tracking_error': float(np.std(returns - benchmark_returns, ddof=1) * np.sqrt(periods)),
+    }
+
+
+def performance(portfolio, start, end):
+    """
+    Chart series and summary statistics of a portfolio between two dates.
+
+    Arrays are returned as lists, ready for JSON.
+    """
+    dates, values = load_series(portfolio, start, end)
+    bench_dates, bench_values = benchmark_series(start, end)
+    returns = simple_returns(values)
+    drawdowns = drawdown(values)
+
+    common, mine, theirs = align(dates, values, bench_dates, bench_values)
+    benchmark_cumulative = np.full(len(dates), np.nan)
+    if len(common):
+        # Benchmark growth rebased to the portfolio's first day in common
+        benchmark_cumulative[np.searchsorted(dates, common)] = cumulative_returns(theirs)
+    total_return = float(cumulative_returns(values)[-1]) if len(values) else None
+    benchmark_return = float(cumulative_returns(theirs)[-1]) if len(theirs) else None
+
+    stats = {
+        'days': int(len(values)),
+        'start_value': float(values[0]) if len(values) else None,
+        'end_value': float(values[-1]) if len(values) else None,
+        'total_return': total_return,
+        'max_drawdown': float(drawdowns.min()) if len(values) else None,
+        'volatility': annualised_volatility(returns),
+        'sharpe_ratio': sharpe_ratio(returns),
+        'benchmark_return': benchmark_return,
+        'excess_return': (
+            total_return - benchmark_return if total_return is not None and benchmark_return is not None else None
+        ),
+    }
+    stats.update(compare(simple_returns(mine), simple_returns(theirs)))
+    return {
+        'dates': [str(day) for day in dates],
+        'net_worth': values.round(2).tolist(),
+        'cumulative_return': cumulative_returns(values).round(6).tolist(),
+        'drawdown': drawdowns.round(6).tolist(),
+        'benchmark_cumulative_return': [
+            None if np.isnan(value) else round(float(value), 6) for value in benchmark_cumulative
+        ],
+        'stats': stats,
+    }
@@ -0,0 +1,336 @@
+"""
+View benchmark harness.
+
+Drives every routed view through the Django test client as a seeded user and
+records p50/p95 latency, SQL query count and peak allocated memory per route.
+Results are plain dicts that serialise to the JSON baseline files read back
+by compare_results(), which lists the routes that regressed. Latency and
+memory are measured warm (after ``warmup`` requests), so cached views report
+their cached cost. Requests that write are rolled back so every iteration
+sees the same data. Templates missing from templates/ are replaced by
+STAND_IN_TEMPLATES.
+"""
+import gc
+import logging
+import platform
+import secrets
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+
+from main.models import FraudScenario, LearningModule, Stock, User
+
+DEFAULT_ITERATIONS = 20
+DEFAULT_WARMUP = 2
+MEMORY_SAMPLES = 3
+
+# Used for templates missing from templates/, so those views are measured
+# rather than recorded as 500s. Each one touches what its view puts in the
+# context, so lazy querysets are still evaluated.
+STAND_IN_TEMPLATES = {
+    'budget_analysis.html': (
+        '{{ total_monthly_expenses }} {{ savings_rate }} {{ health_score }} '
+        '{% for row in budget_analysis_data %}{{ row }}{% endfor %}{{ monthly_comparison }}{{ daily_expenses }}'
+        '{% for row in top_categories %}{{ row }}{% endfor %}{% for row in recent_transactions %}{{ row }}{% endfor %}'
+        '{{ categories_over_budget }}{{ recommendations|join:"," }}'
+    ),
+    'expenses.html': '{% for expense in expenses %}{{ expense }}{% endfor %}{{ monthly_expenses }}{{ form }}',
+    'goals.html': '{% for goal in goals %}{{ goal }}{% endfor %}{{ form }}',
+    'leaderboard.html': '{% for row in top_users %}{{ row.username }}{% endfor %}{{ user_rank }}',
+    'module_detail.html': '{{ module.title }}{{ content_html }}{{ progress.is_completed }}',
+    'modules.html': '{% for module in modules %}{{ module.title }}{% endfor %}{{ progress_dict }}',
+    'quiz.html': '{% for question in questions %}{{ question.question_text }}{% endfor %}{{ attempts_left }}',
+    'scenario_detail.html': (
+        '{{ scenario.title }}{{ scenario_html }}{% for flag in red_flags %}{{ flag.description }}{% endfor %}'
+        '{{ progress.is_correct }}'
+    ),
+    'scenarios.html': '{% for scenario in scenarios %}{{ scenario.title }}{% endfor %}{{ progress_dict }}',
+    'settings.html': '{{ form }}{{ profile }}',
+    'stocks.html': '{% for stock in page_obj %}{{ stock.symbol }}{{ stock.current_price }}{% endfor %}',
+    'trade.html': '{{ stock.symbol }}{{ portfolio.virtual_cash }}{{ holding.quantity }}{{ idempotency_key }}',
+}
+
+
+class Route:
+    """One benchmarked request against a named URL"""
+
+    def __init__(self, name, label=None, method='GET', args=None, query=None, data=None, json_body=None,
+                 headers=None):
+        self.name = name
+        self.label = label or name
+        self.method = method
+        self.args = args
+        self.query = query
+        self.data = data
+        self.json_body = json_body
+        self.headers = headers
+
+    @property
+    def writes(self):
+        return self.method != 'GET'
+
+    def path(self, fixture):
+        args = [fixture[arg] for arg in self.args] if self.args else None
+        path = reverse(self.name, args=args)
+        return f'{path}?{self.query}' if self.query else path
+
+    def request(self, client, fixture):
+        path = self.path(fixture)
+        extra = self.headers(fixture) if self.headers else {}
+        if self.method == 'GET':
+            return client.get(path, **extra)
+        if self.json_body is not None:
+            return client.post(path, self.json_body(fixture), content_type='application/json', **extra)
+        return client.post(path, self.data(fixture) if callable(self.data) else (self.data or {}), **extra)
+
+
+ROUTES = [
+    Route('home'),
+    Route('register'),
+    Route('login'),
+    Route('dashboard'),
+    Route('profile_settings'),
+    Route('leaderboard'),
+    Route('leaderboard', 'leaderboard:weekly', query='window=weekly'),
+    Route('user_achievements'),
+    Route('learning_modules'),
+    Route('module_detail', args=['module_id']),
+    Route('complete_module', method='POST', args=['module_id']),
+    Route('take_quiz', args=['module_id']),
+    Route('portfolio_view'),
+    Route('stock_list'),
+    Route('stock_list', 'stock_list:search', query='search=SYN0001'),
+    Route('trade_stock', args=['stock_id']),
+    Route(
+        'trade_stock', 'trade_stock:buy', method='POST', args=['stock_id'],
+        data={'transaction_type': 'buy', 'quantity': '1'}
+    ),
+    Route('budget_management'),
+    Route('budget_analysis'),
+    Route('budget_planner'),
+    Route('expense_tracking'),
+    Route('expense_predictor'),
+    Route('financial_goals'),
+    Route('fraud_scenarios'),
+    Route('fraud_scenario_detail', args=['scenario_id']),
+    Route('api_stock_price', args=['stock_id']),
+    Route('api_stock_history', args=['stock_id'], query='interval=1h&days=7'),
+    Route('api_stock_search', query='q=syn'),
+    Route('api_stock_quotes', query='ids=1,2,3,4,5&symbols=SYN000010,SYN000011'),
+    Route('api_portfolio_summary'),
+    Route(
+        'api_batch_orders', method='POST',
+        json_body=lambda fixture: {
+            'orders': [
+                {'stock_id': stock_id, 'transaction_type': 'buy', 'quantity': 1}
+                for stock_id in fixture['basket']
+            ]
+        }
+    ),
+    Route('api_portfolio_history'),
+    Route('api_user_stats'),
+    Route('metrics', headers=lambda fixture: {'HTTP_AUTHORIZATION': f'Bearer {fixture["metrics_token"]}'}),
+]
+
+# Named routes that are deliberately not benchmarked
+SKIPPED_ROUTES = {
+    'logout': 'ends the benchmark session',
+}
+
+
+def uncovered_routes():
+    """Named URL patterns with neither a Route nor a SKIPPED_ROUTES entry"""
+    covered = {route.name for route in ROUTES} | set(SKIPPED_ROUTES)
+    names = {
+        pattern.name for pattern in get_resolver().url_patterns
+        if isinstance(pattern, URLPattern) and pattern.name
+    }
+    return sorted(names - covered)
+
+
+def build_fixture():
+    """Pick the benchmark user and the objects routes refer to"""
+    users = User.objects.filter(profile__isnull=False, portfolio__isnull=False).order_by('id')
+    count = users.count()
+    if not count:
+        raise ValueError('No users with a profile and portfolio to benchmark as; seed data first')
+    # The middle user is closer to typical than the first or last one seeded
+    user = users[count // 2]
+    stocks = list(Stock.objects.filter(is_active=True).order_by('symbol').values_list('id', flat=True)[:5])
+    modules = LearningModule.objects.filter(is_active=True).order_by('id')
+    # Preferably one with a quiz, so take_quiz has one to serve
+    module = modules.filter(quiz__isnull=False).first() or modules.first()
+    scenario = FraudScenario.objects.filter(is_active=True).order_by('id').first()
+    return {
+        'user': user,
+        'users': count,
+        'stock_id': stocks[0] if stocks else 0,
+        'basket': stocks,
+        'module_id': module.id if module else 0,
+        'scenario_id': scenario.id if scenario else 0,
+        # A throwaway token when none is configured, so the scrape is measured rather than refused
+        'metrics_token': settings.PAISABUDDY_SETTINGS.get('METRICS_TOKEN') or secrets.token_hex(16),
+    }
+
+
+@contextmanager
+def _rolled_back(enabled):
+    if not enabled:
+        yield
+        return
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def _percentile(values, percent):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+def measure_route(client, route, fixture, iterations=DEFAULT_ITERATIONS, warmup=DEFAULT_WARMUP):
+    """Latency, query count and memory for one route"""
+    latencies = []
+    queries = []
+    statuses = set()
+    for iteration in range(warmup + iterations):
+        with _rolled_back(route.writes), CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = route.request(client, fixture)
+            elapsed = time.perf_counter() - started
+        if iteration >= warmup:
+            latencies.append(elapsed * 1000)
+            queries.append(len(captured.captured_queries))
+            statuses.add(response.status_code)
+
+    # Memory is sampled separately; tracing slows every allocation down
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(MEMORY_SAMPLES):
+            # Leftover cyclic garbage would otherwise count towards the peak
+            gc.collect()
+            with _rolled_back(route.writes):
+                baseline = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                route.request(client, fixture)
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'method': route.method,
+        'path': route.path(fixture),
+        'status': sorted(statuses),
+        'p50_ms': round(_percentile(latencies, 50), 3),
+        'p95_ms': round(_percentile(latencies, 95), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries': max(queries),
+        'memory_kb': round(statistics.median(peaks) / 1024, 1),
+    }
+
+
+def templates_with_stand_ins():
+    """TEMPLATES with STAND_IN_TEMPLATES behind the configured loaders"""
+    templates = []
+    for config in settings.TEMPLATES:
+        config = dict(config, OPTIONS=dict(config.get('OPTIONS', {})))
+        if config['BACKEND'] == 'django.template.backends.django.DjangoTemplates':
+            loaders = config['OPTIONS'].get('loaders') or (
+                ['django.template.loaders.filesystem.Loader']
+                + (['django.template.loaders.app_directories.Loader'] if config.get('APP_DIRS') else [])
+            )
+            config['APP_DIRS'] = False
+            config['OPTIONS']['loaders'] = list(loaders) + [
+                ('django.template.loaders.locmem.Loader', STAND_IN_TEMPLATES)
+            ]
+        templates.append(config)
+    return templates
+
+
+def run_benchmarks(iterations=DEFAULT_ITERATIONS, warmup=DEFAULT_WARMUP, only=None):
+    """Benchmark every route (or the labels in ``only``) against the current database"""
+    fixture = build_fixture()
+    app_settings = dict(settings.PAISABUDDY_SETTINGS, METRICS_TOKEN=fixture['metrics_token'])
+    client = Client(raise_request_exception=False)
+    client.force_login(fixture['user'])
+    cache.clear()
+    results = {}
+    # Failing routes are recorded by status; their tracebacks would swamp the report
+    request_logger = logging.getLogger('django.request')
+    disabled, request_logger.disabled = request_logger.disabled, True
+    try:
+        with override_settings(PAISABUDDY_SETTINGS=app_settings, TEMPLATES=templates_with_stand_ins()):
+            for route in ROUTES:
+                if only and route.label not in only:
+                    continue
+                results[route.label] = measure_route(client, route, fixture, iterations, warmup)
+    finally:
+        request_logger.disabled = disabled
+    return {'users': fixture['users'], 'routes': results}
+
+
+def benchmark_meta(iterations, warmup):
+    return {
+        'created': timezone.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'iterations': iterations,
+        'warmup': warmup,
+    }
+
+
+def compare_results(baseline, current, latency_threshold=0.5, memory_threshold=0.25,
+                    query_threshold=0, min_latency_delta_ms=2.0, min_memory_delta_kb=64.0):
+    """
+    Regressions of ``current`` against ``baseline`` as readable strings.
+
+    Both arguments are benchmark documents with a ``sizes`` mapping. Every
+    size and route of ``current`` must be in the baseline and every route
+    must answer 2xx/3xx. A route regresses when it issues more than
+    ``query_threshold`` extra queries, when its median latency grows by more
+    than ``latency_threshold`` (and by at least ``min_latency_delta_ms``; p95
+    over a few dozen requests is too noisy to gate on), or when its peak
+    memory grows by more than ``memory_threshold`` (and by at least
+    ``min_memory_delta_kb``).
+    """
+    regressions = []
+    for size, current_size in current.get('sizes', {}).items():
+        baseline_size = baseline.get('sizes', {}).get(size)
+        if baseline_size is None:
+            regressions.append(f'[{size} users]: not in the baseline')
+            continue
+        baseline_routes = baseline_size.get('routes', {})
+        for label, now in current_size.get('routes', {}).items():
+            where = f'[{size} users] {label}'
+            failed = [status for status in now['status'] if not 200 <= status < 400]
+            if failed:
+                regressions.append(f'{where}: answered with status {failed}')
+            before = baseline_routes.get(label)
+            if before is None:
+                regressions.append(f'{where}: not in the baseline')
+                continue
+            if now['queries'] > before['queries'] + query_threshold:
+                regressions.append(f'{where}: queries {before["queries"]} -> {now["queries"]}')
+            latency_delta = now['p50_ms'] - before['p50_ms']
+            if latency_delta > min_latency_delta_ms and now['p50_ms'] > before['p50_ms'] * (1 + latency_threshold):
+                regressions.append(
+                    f'{where}: p50 {before["p50_ms"]:.1f}ms -> {now["p50_ms"]:.1f}ms '
+                    f'(p95 {before["p95_ms"]:.1f}ms -> {now["p95_ms"]:.1f}ms)'
+                )
+            memory_delta = now['memory_kb'] - before['memory_kb']
+            if memory_delta > min_memory_delta_kb and now['memory_kb'] > before['memory_kb'] * (1 + memory_threshold):
+                regressions.append(f'{where}: memory {before["memory_kb"]:.0f}KB -> {now["memory_kb"]:.0f}KB')
+    return regressions
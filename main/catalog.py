@@ -0,0 +1,133 @@
+"""
+In-process catalog of active learning content.
+
+The Catalog holds the active learning modules, their quizzes with questions
+and answer keys, and the active fraud scenarios with their red flags. Large
+content and HTML columns are deferred. Five queries build it, and it is
+shared by every view that lists or counts content.
+
+Content changes a few times a month. Each process keeps one Catalog, tagged
+with the content version it was built at. That version is a stamp in the
+cache backend. Saves and deletes of modules, quizzes, questions, scenarios
+and red flags drop the local catalog. On commit they also replace the
+stamp. Other processes check the stamp at most once every
+VERSION_CHECK_INTERVAL seconds and rebuild when it changes. Code that writes
+content in bulk calls invalidate_catalog() itself.
+
+Catalog entries are model instances shared between requests; treat them as
+read-only.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+
+from main.models import FraudRedFlag, FraudScenario, LearningModule, Quiz, QuizQuestion
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'catalog:version'
+VERSION_CHECK_INTERVAL = 1.0
+
+# Question ids of a quiz in order, and their correct options as one string
+AnswerKey = namedtuple('AnswerKey', ['question_ids', 'answers'])
+
+
+class Catalog:
+    """Active modules, quizzes and fraud scenarios at one content version"""
+
+    def __init__(self, modules, quizzes, scenarios):
+        self.modules = tuple(modules)
+        self.modules_by_id = {module.pk: module for module in self.modules}
+        self.quizzes_by_module = {quiz.module_id: quiz for quiz in quizzes}
+        self.answer_keys = {
+            quiz.pk: AnswerKey(
+                tuple(question.pk for question in quiz.questions.all()),
+                ''.join(question.correct_answer for question in quiz.questions.all()),
+            )
+            for quiz in self.quizzes_by_module.values()
+        }
+        self.scenarios = tuple(scenarios)
+        self.scenarios_by_id = {scenario.pk: scenario for scenario in self.scenarios}
+
+    @classmethod
+    def build(cls):
+        """Load the catalog from the database"""
+        modules = LearningModule.objects.filter(is_active=True).defer('content', 'content_html')
+        quizzes = Quiz.objects.filter(module__is_active=True).prefetch_related(
+            Prefetch('questions', queryset=QuizQuestion.objects.order_by('pk'))
+        )
+        scenarios = FraudScenario.objects.filter(is_active=True).order_by('pk').defer(
+            'scenario_content', 'scenario_html'
+        ).prefetch_related(Prefetch('red_flags', queryset=FraudRedFlag.objects.order_by('order', 'pk')))
+        return cls(modules, quizzes, scenarios)
+
+    @property
+    def module_count(self):
+        return len(self.modules)
+
+    @property
+    def scenario_count(self):
+        return len(self.scenarios)
+
+    def module(self, module_id):
+        """Active module by id, or None"""
+        return self.modules_by_id.get(module_id)
+
+    def quiz(self, module_id):
+        """Quiz of an active module with its questions prefetched, or None"""
+        return self.quizzes_by_module.get(module_id)
+
+    def scenario(self, scenario_id):
+        """Active scenario by id with its red flags prefetched, or None"""
+        return self.scenarios_by_id.get(scenario_id)
+
+
+_catalog = None
+_catalog_version = None
+_version_checked_at = 0.0
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """This process's Catalog, rebuilt when content changed"""
+    global _catalog, _catalog_version, _version_checked_at
+    with _catalog_lock:
+        now = time.monotonic()
+        if _catalog is not None and now - _version_checked_at < VERSION_CHECK_INTERVAL:
+            return _catalog
+        version = cache.get(VERSION_KEY)
+        _version_checked_at = now
+        if _catalog is None or version != _catalog_version:
+            started = time.perf_counter()
+            _catalog = Catalog.build()
+            _catalog_version = version
+            logger.debug(
+                'Built content catalog of %d modules and %d scenarios in %.3fs',
+                _catalog.module_count, _catalog.scenario_count, time.perf_counter() - started
+            )
+        return _catalog
+
+
+def _drop_local_catalog():
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
+
+
+def _bump_version():
+    _drop_local_catalog()
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_catalog():
+    """
+    Rebuild this process's catalog on its next use, and every other
+    process's once the current transaction commits.
+    """
+    _drop_local_catalog()
+    transaction.on_commit(_bump_version)
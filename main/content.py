@@ -0,0 +1,233 @@
+"""
+Pre-rendered learning content.
+
+LearningModule.content and FraudScenario.scenario_content are Markdown (raw
+HTML allowed). They are rendered to sanitized HTML when the row is saved.
+The HTML is stored next to its source, together with a hash of the source
+and RENDERER_VERSION. Views read the HTML from the cache, keyed by that
+hash, or else from its column, so a request never renders. A large module
+costs the same to serve as a small one.
+
+Rows written without save() (bulk_create, queryset.update()) are rendered on
+their first uncached view. Changing the renderer (extensions, sanitizer rules) means
+bumping RENDERER_VERSION and running the render_content command. The command
+re-renders every row whose stored hash no longer matches. Both paths
+invalidate the content catalog, whose entries carry the hash.
+
+The sanitizer is an allowlist over html.parser. Only the tags and
+attributes Markdown produces for prose survive. Links and images must use
+http(s), mailto, or a relative URL. Script-like elements are dropped along
+with their content. Unclosed tags are closed.
+"""
+import hashlib
+import logging
+import re
+import time
+from collections import namedtuple
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+import markdown
+from django.core.cache import cache
+from django.db import transaction
+
+from main.catalog import invalidate_catalog
+from main.models import FraudScenario, LearningModule
+
+logger = logging.getLogger(__name__)
+
+RENDERER_VERSION = 1
+MARKDOWN_EXTENSIONS = ['extra', 'sane_lists']
+CACHE_KEY = 'content:{model}:{pk}:{hash}'
+CACHE_TIMEOUT = 24 * 60 * 60
+DEFAULT_BATCH_SIZE = 200
+
+ALLOWED_TAGS = frozenset([
+    'a', 'abbr', 'b', 'blockquote', 'br', 'code', 'dd', 'del', 'div', 'dl', 'dt', 'em', 'h1', 'h2', 'h3', 'h4',
+    'h5', 'h6', 'hr', 'i', 'img', 'li', 'ol', 'p', 'pre', 'span', 'strong', 'sub', 'sup', 'table', 'tbody',
+    'td', 'tfoot', 'th', 'thead', 'tr', 'ul',
+])
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'abbr': {'title'},
+    'code': {'class'},
+    'img': {'alt', 'src', 'title'},
+    'ol': {'start'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+URL_SCHEMES = {'', 'http', 'https', 'mailto'}
+VOID_TAGS = frozenset(['br', 'hr', 'img'])
+# Dropped together with everything inside them
+DROP_CONTENT_TAGS = frozenset(['script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'textarea'])
+
+_URL_NOISE = re.compile(r'[\x00-\x20\x7f]+')
+
+# Source, HTML and hash columns of each rendered model
+RenderedField = namedtuple('RenderedField', ['source', 'html', 'hash'])
+RENDERED_FIELDS = {
+    LearningModule: RenderedField('content', 'content_html', 'content_hash'),
+    FraudScenario: RenderedField('scenario_content', 'scenario_html', 'scenario_hash'),
+}
+
+
+class _Sanitizer(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.open_tags = []
+        self.dropping = None
+        self.drop_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self.dropping:
+            self.drop_depth += tag == self.dropping
+            return
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping, self.drop_depth = tag, 1
+            return
+        if tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_ATTRIBUTES.get(tag, ())
+        rendered = ''.join(
+            f' {name}="{escape(value, quote=True)}"'
+            for name, value in attrs
+            if name in allowed and value is not None and (name not in URL_ATTRIBUTES or _safe_url(value))
+        )
+        self.parts.append(f'<{tag}{rendered}>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        if self.dropping:
+            if tag == self.dropping:
+                self.drop_depth -= 1
+                if not self.drop_depth:
+                    self.dropping = None
+            return
+        if tag not in self.open_tags:
+            return
+        # Close anything left open inside this element first
+        while self.open_tags:
+            closing = self.open_tags.pop()
+            self.parts.append(f'</{closing}>')
+            if closing == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.parts.append(escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        return ''.join(self.parts) + ''.join(f'</{tag}>' for tag in reversed(self.open_tags))
+
+
+def _safe_url(value):
+    return urlsplit(_URL_NOISE.sub('', value)).scheme.lower() in URL_SCHEMES
+
+
+def sanitize(html):
+    """``html`` reduced to ALLOWED_TAGS and ALLOWED_ATTRIBUTES"""
+    sanitizer = _Sanitizer()
+    sanitizer.feed(html)
+    return sanitizer.result()
+
+
+def render(text):
+    """Sanitized HTML of Markdown ``text``"""
+    return sanitize(markdown.markdown(text or '', extensions=MARKDOWN_EXTENSIONS, output_format='html'))
+
+
+def content_hash(text):
+    """Hash identifying ``text`` as rendered by the current renderer"""
+    return hashlib.sha256(f'{RENDERER_VERSION}\0{text or ""}'.encode()).hexdigest()
+
+
+def render_fields(instance, update_fields=None):
+    """Render ``instance``'s content into its HTML column unless the stored hash is current"""
+    field = RENDERED_FIELDS[type(instance)]
+    if update_fields is not None and field.source not in update_fields:
+        return False
+    source = getattr(instance, field.source)
+    expected = content_hash(source)
+    if getattr(instance, field.hash) == expected:
+        return False
+    setattr(instance, field.html, render(source))
+    setattr(instance, field.hash, expected)
+    return True
+
+
+def rendered_html(instance):
+    """
+    Stored HTML of an instance, which may defer its source and HTML columns.
+
+    Reads the cache, then the HTML column. A row whose HTML is missing or
+    stale is rendered and stored once.
+    """
+    model = type(instance)._meta.concrete_model
+    field = RENDERED_FIELDS[model]
+    key = CACHE_KEY.format(model=model._meta.model_name, pk=instance.pk, hash=getattr(instance, field.hash))
+    html = cache.get(key)
+    if html is not None:
+        return html
+
+    row = model.objects.filter(pk=instance.pk).values(field.source, field.html, field.hash).first() or {}
+    html = row.get(field.html, '')
+    expected = content_hash(row.get(field.source))
+    if row and row[field.hash] != expected:
+        html = render(row[field.source])
+        updated = model.objects.filter(pk=instance.pk, **{field.hash: row[field.hash]}).update(
+            **{field.html: html, field.hash: expected}
+        )
+        if updated:
+            # Catalog entries carry the hash that was just replaced
+            invalidate_catalog()
+        key = CACHE_KEY.format(model=model._meta.model_name, pk=instance.pk, hash=expected)
+    cache.set(key, html, CACHE_TIMEOUT)
+    return html
+
+
+def render_stale(force=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Re-render stored HTML whose hash doesn't match its source under the
+    current renderer (every row with ``force``), and drop the cached HTML of
+    each row under its old and new hash. Returns the number of rows
+    rendered per model name.
+    """
+    counts = {}
+    for model, field in RENDERED_FIELDS.items():
+        started = time.perf_counter()
+        rendered = 0
+        last_pk = 0
+        rows = model.objects.order_by('pk').only('pk', field.source, field.hash)
+        while True:
+            batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed, keys = [], []
+            for instance in batch:
+                stored = getattr(instance, field.hash)
+                if force:
+                    setattr(instance, field.hash, '')
+                if render_fields(instance):
+                    changed.append(instance)
+                    # Under force the hash can come out unchanged; drop both keys
+                    keys.extend(
+                        CACHE_KEY.format(model=model._meta.model_name, pk=instance.pk, hash=value)
+                        for value in {stored, getattr(instance, field.hash)}
+                    )
+            with transaction.atomic():
+                model.objects.bulk_update(changed, [field.html, field.hash])
+                if keys:
+                    transaction.on_commit(lambda keys=keys: cache.delete_many(keys))
+            rendered += len(changed)
+        if rendered:
+            invalidate_catalog()
+        counts[model._meta.model_name] = rendered
+        logger.info(
+            'Rendered %d %s rows in %.2fs', rendered, model._meta.verbose_name, time.perf_counter() - started
+        )
+    return counts
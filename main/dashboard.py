@@ -0,0 +1,135 @@
+"""
+Cached dashboard context.
+
+DashboardContext gathers everything the dashboard shows in three queries: the
+profile row joined to its portfolio with the module counts and this month's
+spend as subqueries, the recent transactions and the open goals. The result
+is cached per user in the configured cache backend. Writes that change what
+the dashboard shows call invalidate_dashboard() for the user; price ticks and
+module catalogue changes bump a shared stamp that expires every entry built
+before it.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from main.metrics import record_cache
+from main.models import (
+    ExpenseMonthlySummary, FinancialGoal, LearningModule, UserProfile, UserProgress, VirtualTransaction
+)
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'dashboard:{user_id}'
+STAMP_KEY = 'dashboard:stamp'
+
+
+class DashboardContext:
+    """Builds and caches the dashboard template context for one user"""
+
+    _metrics = {'hits': 0, 'misses': 0, 'invalidations': 0}
+    _metrics_lock = threading.Lock()
+
+    def __init__(self, user):
+        self.user = user
+        self.key = CACHE_KEY.format(user_id=user.pk)
+
+    def get(self):
+        """
+        Return the context dict, from the cache when the entry is current.
+
+        Raises UserProfile.DoesNotExist or VirtualPortfolio.DoesNotExist when
+        the user has no profile or portfolio yet.
+        """
+        cached = cache.get_many([self.key, STAMP_KEY])
+        entry = cached.get(self.key)
+        if entry is not None and entry['built_at'] >= cached.get(STAMP_KEY, 0):
+            self._count('hits')
+            record_cache('dashboard', hit=True)
+            return entry['context']
+
+        self._count('misses')
+        record_cache('dashboard', hit=False)
+        built_at = time.time()
+        context = self.build()
+        logger.debug('Built dashboard context for user %s', self.user.pk)
+        cache.set(
+            self.key, {'built_at': built_at, 'context': context},
+            settings.PAISABUDDY_SETTINGS['DASHBOARD_CACHE_TIMEOUT']
+        )
+        return context
+
+    def build(self):
+        """Compute the context from the database"""
+        today = timezone.localdate()
+        money = DecimalField(max_digits=12, decimal_places=2)
+        completed = UserProgress.objects.filter(
+            user_id=OuterRef('user_id'), is_completed=True
+        ).order_by().values('user_id').annotate(total=Count('id')).values('total')
+        active_modules = LearningModule.objects.filter(is_active=True).order_by().values(
+            'is_active'
+        ).annotate(total=Count('id')).values('total')
+        month_spend = ExpenseMonthlySummary.objects.filter(
+            user_id=OuterRef('user_id'), year=today.year, month=today.month
+        ).order_by().values('user_id').annotate(total=Sum('total_amount')).values('total')
+
+        profile = UserProfile.objects.select_related('user__portfolio').annotate(
+            completed_modules=Coalesce(Subquery(completed, output_field=IntegerField()), Value(0)),
+            total_modules=Coalesce(Subquery(active_modules, output_field=IntegerField()), Value(0)),
+            monthly_expenses=Coalesce(Subquery(month_spend, output_field=money), Value(0), output_field=money),
+        ).get(user_id=self.user.pk)
+        portfolio = profile.user.portfolio
+
+        completed_modules = profile.completed_modules
+        total_modules = profile.total_modules
+        return {
+            'profile': profile,
+            'portfolio': portfolio,
+            'completed_modules': completed_modules,
+            'total_modules': total_modules,
+            'progress_percentage': (completed_modules / total_modules * 100) if total_modules > 0 else 0,
+            'recent_transactions': list(
+                VirtualTransaction.objects.filter(portfolio=portfolio).select_related('stock')[:5]
+            ),
+            'active_goals': list(FinancialGoal.objects.filter(user_id=self.user.pk, is_achieved=False)[:3]),
+            'monthly_expenses': profile.monthly_expenses,
+        }
+
+    @classmethod
+    def _count(cls, name, amount=1):
+        with cls._metrics_lock:
+            cls._metrics[name] += amount
+
+    @classmethod
+    def metrics(cls):
+        """Hit/miss/invalidation counters for this process"""
+        with cls._metrics_lock:
+            metrics = dict(cls._metrics)
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_ratio'] = metrics['hits'] / lookups if lookups else 0.0
+        return metrics
+
+
+def invalidate_dashboard(*user_ids):
+    """Drop cached dashboards once the current transaction commits"""
+    keys = [CACHE_KEY.format(user_id=user_id) for user_id in user_ids]
+    if not keys:
+        return
+
+    def delete():
+        cache.delete_many(keys)
+        DashboardContext._count('invalidations', len(keys))
+
+    transaction.on_commit(delete)
+
+
+def invalidate_all_dashboards():
+    """Expire every cached dashboard, e.g. after prices move"""
+    transaction.on_commit(lambda: cache.set(STAMP_KEY, time.time(), None))
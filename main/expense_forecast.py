@@ -0,0 +1,383 @@
+"""
+Monthly expense forecasts.
+
+Every user's spend per category (grouped by name, as budgets are monthly) is
+a monthly series read from ExpenseMonthlySummary. Each series is modelled by
+additive Holt-Winters exponential smoothing. The model has a level and a
+trend. Once the series covers SEASONAL_MONTHS, it also has a seasonal offset
+per calendar month.
+
+fit_forecasts() fits a batch of users at once. It stacks their series into
+one (series x months) array and runs the smoothing recursion month by month
+for every series and every candidate (alpha, beta, gamma) together. Each
+series keeps the candidate with the smallest one-step-ahead squared error.
+The fitted state, through the last complete month, is stored in
+ExpenseForecast. The nightly forecast_expenses command refits everyone.
+
+Between refits the state is kept current incrementally. The first read
+after a month completes folds that month's totals in with one smoothing
+step, unless the user spent in a category without a forecast, which refits
+the user. An expense written in an earlier month refits its user when the
+transaction commits. Current-month expenses don't change the fit.
+Forecasts and prediction intervals are derived from the stored state and
+cached per user.
+"""
+import logging
+import math
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from main.expense_summary import month_range_q, month_start
+from main.metrics import record_cache
+from main.models import ExpenseForecast, ExpenseMonthlySummary
+
+logger = logging.getLogger(__name__)
+
+HISTORY_MONTHS = 36
+SEASON = 12
+SEASONAL_MONTHS = 2 * SEASON
+HORIZON = 3
+# Fewer one-step errors than this keep DEFAULT_PARAMETERS and a spread-based interval
+MIN_FIT_ERRORS = 3
+DEFAULT_PARAMETERS = (0.4, 0.0, 0.0)
+FALLBACK_SPREAD = 0.25
+INTERVAL = 0.8
+INTERVAL_Z = 1.2816
+UNCATEGORIZED = 'Uncategorized'
+DEFAULT_BATCH_SIZE = 1000
+CACHE_KEY = 'expense_forecast:{user_id}:{month}'
+CACHE_TIMEOUT = 24 * 60 * 60
+
+# Candidate (alpha, beta, gamma); gamma only applies to seasonal series
+GRID = np.array([
+    (alpha, beta, gamma)
+    for alpha in (0.1, 0.2, 0.4, 0.6, 0.8)
+    for beta in (0.0, 0.05, 0.15)
+    for gamma in (0.0, 0.1, 0.3)
+])
+STATE_FIELDS = ['fitted_through', 'level', 'trend', 'seasonal', 'sse', 'errors', 'months', 'total']
+
+
+def month_index(day):
+    """Months since year 0 of the month containing ``day``"""
+    return day.year * 12 + day.month - 1
+
+
+def month_from_index(index):
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def last_complete_month(today=None):
+    """First day of the month before the current one"""
+    return month_start(month_start(today or timezone.localdate()) - timedelta(days=1))
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _cache_key(user_id, today=None):
+    return CACHE_KEY.format(user_id=user_id, month=f'{today or timezone.localdate():%Y-%m}')
+
+
+def smooth(y, level, trend, season, alpha, beta, gamma):
+    """One additive Holt-Winters step, elementwise; returns (error, level, trend, season)"""
+    error = y - (level + trend + season)
+    new_level = alpha * (y - season) + (1 - alpha) * (level + trend)
+    new_trend = beta * (new_level - level) + (1 - beta) * trend
+    new_season = gamma * (y - new_level) + (1 - gamma) * season
+    return error, new_level, new_trend, new_season
+
+
+def load_series(user_ids, through):
+    """
+    Monthly totals of ``user_ids`` by category name over the HISTORY_MONTHS
+    ending at ``through``. Returns ((user_id, category) keys, totals array).
+    """
+    first = month_index(through) - HISTORY_MONTHS + 1
+    rows = ExpenseMonthlySummary.objects.filter(
+        month_range_q(month_from_index(first), through), user_id__in=user_ids
+    ).order_by().values('user_id', 'category__name', 'year', 'month').annotate(
+        amount=Sum('total_amount')
+    ).values_list('user_id', 'category__name', 'year', 'month', 'amount')
+
+    keys, positions, cells = [], {}, []
+    for user_id, name, year, month, amount in rows:
+        key = (user_id, name or UNCATEGORIZED)
+        if key not in positions:
+            positions[key] = len(keys)
+            keys.append(key)
+        cells.append((positions[key], year * 12 + month - 1 - first, float(amount)))
+    totals = np.zeros((len(keys), HISTORY_MONTHS))
+    if cells:
+        series, months, amounts = (np.array(column) for column in zip(*cells))
+        np.add.at(totals, (series, months), amounts)
+    return keys, totals
+
+
+def fit(totals, first_month):
+    """
+    Fit every row of ``totals`` (series x months, oldest first; column 0 is
+    absolute month ``first_month``). Series start at their first month with
+    spending. Returns a dict of per-series arrays: alpha, beta, gamma, level,
+    trend, seasonal (series x 12, by calendar month), sse, errors, months
+    and total.
+    """
+    count, width = totals.shape
+    spending = totals > 0
+    start = np.where(spending.any(axis=1), spending.argmax(axis=1), width - 1)
+    months = width - start
+    is_seasonal = months >= SEASONAL_MONTHS
+    slots = (first_month + np.arange(width)) % SEASON
+
+    # Initial offsets and trend from the first two years: the trend is the
+    # change in the yearly means, the offsets are detrended deviations from them
+    seasonal = np.zeros((count, SEASON))
+    slope = np.zeros(count)
+    if is_seasonal.any():
+        picked = np.flatnonzero(is_seasonal)
+        window = start[picked, None] + np.arange(SEASONAL_MONTHS)
+        years = np.take_along_axis(totals[picked], window, axis=1).reshape(len(picked), 2, SEASON)
+        means = years.mean(axis=2)
+        slope[picked] = (means[:, 1] - means[:, 0]) / SEASON
+        within = np.arange(SEASON) - (SEASON - 1) / 2
+        deviations = years - means[:, :, None] - slope[picked, None, None] * within
+        offsets = np.zeros((len(picked), SEASON))
+        np.put_along_axis(offsets, slots[window[:, :SEASON]], deviations.mean(axis=1), axis=1)
+        seasonal[picked] = offsets
+
+    # Series without seasonality only need the gamma = 0 candidates
+    state = {
+        'alpha': np.zeros(count), 'beta': np.zeros(count), 'gamma': np.zeros(count), 'level': np.zeros(count),
+        'trend': np.zeros(count), 'seasonal': seasonal, 'sse': np.zeros(count),
+    }
+    for group, grid in ((~is_seasonal, GRID[GRID[:, 2] == 0]), (is_seasonal, GRID)):
+        picked = np.flatnonzero(group)
+        if len(picked):
+            fitted = _smooth_grid(totals[picked], start[picked], slots, seasonal[picked], slope[picked], grid)
+            for name, values in fitted.items():
+                state[name][picked] = values
+    state.update(errors=months - 1, months=months, total=totals.sum(axis=1))
+    return state
+
+
+def _smooth_grid(totals, start, slots, seasonal, slope, grid):
+    """Run every series through every candidate of ``grid``; keep the best per series"""
+    count, width = totals.shape
+    rows = np.arange(count)
+    alpha, beta, gamma = grid[:, 0], grid[:, 1], grid[:, 2]
+    level = np.repeat((totals[rows, start] - seasonal[rows, slots[start]])[:, None], len(grid), axis=1)
+    trend = np.repeat(slope[:, None], len(grid), axis=1)
+    sse = np.zeros_like(level)
+    seasons = gamma.any()
+    # (slot, series, candidate), so each month updates one contiguous block
+    season = np.repeat(seasonal.T[:, :, None], len(grid), axis=2) if seasons else None
+    for month in range(1, width):
+        active = (month > start)[:, None]
+        if not active.any():
+            continue
+        slot = slots[month]
+        offset = season[slot] if seasons else seasonal[:, slot, None]
+        error, new_level, new_trend, new_season = smooth(
+            totals[:, month, None], level, trend, offset, alpha, beta, gamma
+        )
+        level = np.where(active, new_level, level)
+        trend = np.where(active, new_trend, trend)
+        if seasons:
+            season[slot] = np.where(active, new_season, offset)
+        sse += np.where(active, error ** 2, 0.0)
+
+    default = np.flatnonzero((grid == DEFAULT_PARAMETERS).all(axis=1))
+    best = sse.argmin(axis=1)
+    if len(default):
+        best = np.where(width - start - 1 < MIN_FIT_ERRORS, default[0], best)
+    return {
+        'alpha': alpha[best],
+        'beta': beta[best],
+        'gamma': gamma[best],
+        'level': level[rows, best],
+        'trend': trend[rows, best],
+        'seasonal': season[:, rows, best].T if seasons else seasonal,
+        'sse': sse[rows, best],
+    }
+
+
+def fit_forecasts(user_ids=None, through=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Refit and store the forecasts of all users (or ``user_ids``) through
+    ``through`` (default: the last complete month). Returns the number of
+    series fitted.
+    """
+    started = time.perf_counter()
+    through = through or last_complete_month()
+    if user_ids is None:
+        user_ids = set(ExpenseMonthlySummary.objects.values_list('user_id', flat=True).distinct())
+        user_ids.update(ExpenseForecast.objects.values_list('user_id', flat=True).distinct())
+    user_ids = sorted(set(user_ids))
+    first_month = month_index(through) - HISTORY_MONTHS + 1
+
+    fitted = 0
+    for chunk in _chunks(user_ids, batch_size):
+        keys, totals = load_series(chunk, through)
+        state = {name: values.tolist() for name, values in fit(totals, first_month).items()}
+        forecasts = [
+            ExpenseForecast(
+                user_id=user_id, category=category, fitted_through=through,
+                **{name: state[name][position] for name in state},
+            )
+            for position, (user_id, category) in enumerate(keys)
+        ]
+        with transaction.atomic():
+            ExpenseForecast.objects.filter(user_id__in=chunk).delete()
+            ExpenseForecast.objects.bulk_create(forecasts, batch_size=batch_size)
+        cache.delete_many([_cache_key(user_id) for user_id in chunk])
+        fitted += len(forecasts)
+
+    logger.info(
+        'Fitted %d expense series of %d users through %s in %.2fs',
+        fitted, len(user_ids), f'{through:%Y-%m}', time.perf_counter() - started
+    )
+    return fitted
+
+
+def refit_on_commit(user_id):
+    """Refit one user's forecasts once the current transaction commits"""
+    transaction.on_commit(lambda: fit_forecasts([user_id]))
+
+
+def advance(forecast, amounts):
+    """Fold the monthly ``amounts`` after ``forecast.fitted_through`` into its state"""
+    current = month_index(forecast.fitted_through)
+    for amount in amounts:
+        current += 1
+        slot = current % SEASON
+        error, forecast.level, forecast.trend, forecast.seasonal[slot] = smooth(
+            amount, forecast.level, forecast.trend, forecast.seasonal[slot],
+            forecast.alpha, forecast.beta, forecast.gamma
+        )
+        forecast.sse += error ** 2
+        forecast.errors += 1
+        forecast.months += 1
+        forecast.total += amount
+    forecast.fitted_through = month_from_index(current)
+
+
+def _bring_up_to_date(user_id, forecasts, through):
+    """
+    Advance one user's stale forecasts through ``through`` and save them.
+
+    Returns False, saving nothing, if the user spent in a category that has
+    no forecast yet (or has no forecasts at all); fit_forecasts() covers it.
+    """
+    stale = [forecast for forecast in forecasts if forecast.fitted_through < through]
+    if forecasts and not stale:
+        return True
+    if stale:
+        first = month_index(min(forecast.fitted_through for forecast in stale)) + 1
+    else:
+        first = month_index(through) - HISTORY_MONTHS + 1
+    rows = ExpenseMonthlySummary.objects.filter(
+        month_range_q(month_from_index(first), through), user_id=user_id
+    ).order_by().values('category__name', 'year', 'month').annotate(
+        amount=Sum('total_amount')
+    ).values_list('category__name', 'year', 'month', 'amount')
+    amounts = {}
+    for name, year, month, amount in rows:
+        key = (name or UNCATEGORIZED, year * 12 + month - 1)
+        amounts[key] = amounts.get(key, 0.0) + float(amount)
+    categories = {forecast.category for forecast in forecasts}
+    if any(category not in categories for category, _ in amounts):
+        return False
+
+    last = month_index(through)
+    for forecast in stale:
+        advance(forecast, [
+            amounts.get((forecast.category, month), 0.0)
+            for month in range(month_index(forecast.fitted_through) + 1, last + 1)
+        ])
+    ExpenseForecast.objects.bulk_update(stale, STATE_FIELDS)
+    return True
+
+
+def predict(forecast, horizon=HORIZON):
+    """Point forecasts with INTERVAL prediction bounds for the months after fitted_through"""
+    if forecast.errors >= MIN_FIT_ERRORS:
+        variance = forecast.sse / forecast.errors
+    else:
+        variance = (FALLBACK_SPREAD * max(forecast.level, 0.0)) ** 2
+    current = month_index(forecast.fitted_through)
+    spread = 1.0
+    months = []
+    for step in range(1, horizon + 1):
+        if step > 1:
+            weight = forecast.alpha * (1 + (step - 1) * forecast.beta)
+            if (step - 1) % SEASON == 0:
+                weight += forecast.gamma
+            spread += weight ** 2
+        amount = forecast.level + step * forecast.trend + forecast.seasonal[(current + step) % SEASON]
+        margin = INTERVAL_Z * math.sqrt(variance * spread)
+        months.append({
+            'month': f'{month_from_index(current + step):%Y-%m}',
+            'amount': round(max(amount, 0.0), 2),
+            'lower': round(max(amount - margin, 0.0), 2),
+            'upper': round(max(amount + margin, 0.0), 2),
+        })
+    return months
+
+
+def _prediction(forecast):
+    months = predict(forecast)
+    upcoming = months[0]
+    level = forecast.level
+    season = forecast.seasonal[(month_index(forecast.fitted_through) + 1) % SEASON]
+    half_width = (upcoming['upper'] - upcoming['lower']) / 2
+    return {
+        'category': forecast.category,
+        'historical_avg': round(forecast.total / forecast.months, 2) if forecast.months else 0.0,
+        'predicted_amount': upcoming['amount'],
+        'lower': upcoming['lower'],
+        'upper': upcoming['upper'],
+        'seasonal_factor': round(1 + season / level, 2) if level > 0 else 1.0,
+        # Share of the forecast not swallowed by its interval
+        'confidence': round(min(max(1 - half_width / upcoming['amount'], 0.0), 1.0), 2) if upcoming['amount'] else 0.0,
+        'forecast': months,
+    }
+
+
+def get_forecasts(user_id):
+    """
+    Forecasts of a user's spending per category from the stored state.
+
+    Returns a dict with ``predictions`` (largest first), ``fitted_through``
+    and ``months_analyzed``; cached per user for the month.
+    """
+    today = timezone.localdate()
+    key = _cache_key(user_id, today)
+    payload = cache.get(key)
+    record_cache('expense_forecast', hit=payload is not None)
+    if payload is not None:
+        return payload
+
+    through = last_complete_month(today)
+    forecasts = list(ExpenseForecast.objects.filter(user_id=user_id))
+    if not _bring_up_to_date(user_id, forecasts, through):
+        fit_forecasts([user_id], through)
+        forecasts = list(ExpenseForecast.objects.filter(user_id=user_id))
+    predictions = sorted(
+        (_prediction(forecast) for forecast in forecasts), key=lambda row: row['predicted_amount'], reverse=True
+    )
+    payload = {
+        'predictions': predictions,
+        'fitted_through': f'{through:%Y-%m}' if forecasts else None,
+        'months_analyzed': max((forecast.months for forecast in forecasts), default=0),
+        'interval': INTERVAL,
+    }
+    cache.set(key, payload, CACHE_TIMEOUT)
+    return payload
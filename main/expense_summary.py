@@ -0,0 +1,191 @@
+"""
+Maintenance of the per-user monthly expense summary table.
+
+ExpenseMonthlySummary holds one row per (user, year, month, category) so views
+can read monthly and per-category totals without scanning Expense rows.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum, Value, DecimalField
+from django.db.models.functions import Cast, ExtractMonth, ExtractYear, Greatest, Least
+
+from main.models import Expense, ExpenseMonthlySummary
+
+
+def month_start(day):
+    """First day of the month containing ``day``"""
+    return day.replace(day=1)
+
+
+def recent_months(today, count=6):
+    """First days of the last ``count`` months, oldest first"""
+    months = []
+    current = month_start(today)
+    for _ in range(count):
+        months.append(current)
+        current = month_start(current - timedelta(days=1))
+    months.reverse()
+    return months
+
+
+def month_range_q(first, last):
+    """Filter summary rows whose (year, month) falls between two dates inclusive"""
+    after_start = Q(year__gt=first.year) | Q(year=first.year, month__gte=first.month)
+    before_end = Q(year__lt=last.year) | Q(year=last.year, month__lte=last.month)
+    return after_start & before_end
+
+
+def monthly_totals(user, months):
+    """Map each first-of-month date in ``months`` to the user's total spend"""
+    if not months:
+        return {}
+    rows = ExpenseMonthlySummary.objects.filter(
+        month_range_q(min(months), max(months)), user=user
+    ).values('year', 'month').annotate(total=Sum('total_amount'))
+    totals = {date(row['year'], row['month'], 1): row['total'] for row in rows}
+    return {month: totals.get(month) or Decimal('0') for month in months}
+
+
+def _bucket(user_id, expense_date, category_id):
+    return {
+        'user_id': user_id,
+        'year': expense_date.year,
+        'month': expense_date.month,
+        'category_id': category_id,
+    }
+
+
+def _amount(value):
+    # Cast so SQLite compares the parameter numerically rather than as text
+    return Cast(Value(value), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def refresh_summary_bucket(user_id, expense_date, category_id):
+    """Recompute one summary row from the Expense rows it covers"""
+    bucket = _bucket(user_id, expense_date, category_id)
+    first = month_start(expense_date)
+    last = month_start(first + timedelta(days=31)) - timedelta(days=1)
+    stats = Expense.objects.filter(
+        user_id=user_id, category_id=category_id, date__gte=first, date__lte=last
+    ).aggregate(
+        total=Sum('amount'), count=Count('id'), low=Min('amount'), high=Max('amount')
+    )
+    if not stats['count']:
+        ExpenseMonthlySummary.objects.filter(**bucket).delete()
+        return
+    ExpenseMonthlySummary.objects.update_or_create(
+        **bucket,
+        defaults={
+            'total_amount': stats['total'],
+            'expense_count': stats['count'],
+            'min_amount': stats['low'],
+            'max_amount': stats['high'],
+        }
+    )
+
+
+def add_to_summary(user_id, expense_date, category_id, amount):
+    """Fold a new expense amount into its summary row"""
+    bucket = _bucket(user_id, expense_date, category_id)
+    with transaction.atomic():
+        summary, created = ExpenseMonthlySummary.objects.select_for_update().get_or_create(
+            **bucket,
+            defaults={
+                'total_amount': amount,
+                'expense_count': 1,
+                'min_amount': amount,
+                'max_amount': amount,
+            }
+        )
+        if not created:
+            ExpenseMonthlySummary.objects.filter(pk=summary.pk).update(
+                total_amount=F('total_amount') + amount,
+                expense_count=F('expense_count') + 1,
+                min_amount=Least('min_amount', _amount(amount)),
+                max_amount=Greatest('max_amount', _amount(amount)),
+            )
+
+
+def remove_from_summary(user_id, expense_date, category_id, amount):
+    """Take an expense amount out of its summary row"""
+    bucket = _bucket(user_id, expense_date, category_id)
+    with transaction.atomic():
+        summary = ExpenseMonthlySummary.objects.select_for_update().filter(**bucket).first()
+        if summary is None:
+            return
+        # Removing the last expense or a min/max value needs a rescan of the bucket
+        if summary.expense_count <= 1 or amount in (summary.min_amount, summary.max_amount):
+            refresh_summary_bucket(user_id, expense_date, category_id)
+            return
+        ExpenseMonthlySummary.objects.filter(pk=summary.pk).update(
+            total_amount=F('total_amount') - amount,
+            expense_count=F('expense_count') - 1,
+        )
+
+
+def update_summary(previous, current):
+    """Move an edited expense from its previous summary state to its current one"""
+    old_bucket = (previous['user_id'], month_start(previous['date']), previous['category_id'])
+    new_bucket = (current['user_id'], month_start(current['date']), current['category_id'])
+    if old_bucket != new_bucket:
+        remove_from_summary(previous['user_id'], previous['date'], previous['category_id'], previous['amount'])
+        add_to_summary(current['user_id'], current['date'], current['category_id'], current['amount'])
+        return
+
+    if previous['amount'] == current['amount']:
+        return
+
+    bucket = _bucket(current['user_id'], current['date'], current['category_id'])
+    with transaction.atomic():
+        summary = ExpenseMonthlySummary.objects.select_for_update().filter(**bucket).first()
+        if summary is None or previous['amount'] in (summary.min_amount, summary.max_amount):
+            refresh_summary_bucket(current['user_id'], current['date'], current['category_id'])
+            return
+        ExpenseMonthlySummary.objects.filter(pk=summary.pk).update(
+            total_amount=F('total_amount') + (current['amount'] - previous['amount']),
+            min_amount=Least('min_amount', _amount(current['amount'])),
+            max_amount=Greatest('max_amount', _amount(current['amount'])),
+        )
+
+
+def rebuild_expense_summaries(user_ids=None, batch_size=1000):
+    """Rebuild summary rows from scratch, for all users or the given ids"""
+    summaries = ExpenseMonthlySummary.objects.all()
+    expenses = Expense.objects.all()
+    if user_ids is not None:
+        summaries = summaries.filter(user_id__in=user_ids)
+        expenses = expenses.filter(user_id__in=user_ids)
+
+    rows = expenses.annotate(
+        summary_year=ExtractYear('date'),
+        summary_month=ExtractMonth('date'),
+    ).order_by().values('user_id', 'summary_year', 'summary_month', 'category_id').annotate(
+        total=Sum('amount'), count=Count('id'), low=Min('amount'), high=Max('amount')
+    )
+    objs = (
+        ExpenseMonthlySummary(
+            user_id=row['user_id'],
+            year=row['summary_year'],
+            month=row['summary_month'],
+            category_id=row['category_id'],
+            total_amount=row['total'],
+            expense_count=row['count'],
+            min_amount=row['low'],
+            max_amount=row['high'],
+        )
+        for row in rows.iterator()
+    )
+
+    created = 0
+    with transaction.atomic():
+        summaries.delete()
+        while True:
+            batch = list(islice(objs, batch_size))
+            if not batch:
+                break
+            ExpenseMonthlySummary.objects.bulk_create(batch, batch_size=batch_size)
+            created += len(batch)
+    return created
@@ -0,0 +1,148 @@
+"""
+Cached leaderboard snapshots.
+
+A snapshot holds the top of the leaderboard plus a compact points -> rank
+lookup (distinct point values with cumulative counts), so any user's rank is a
+binary search instead of a COUNT(*) query. Snapshots live in the configured
+Django cache for LEADERBOARD_UPDATE_INTERVAL seconds and are dropped whenever
+points are awarded.
+"""
+import time
+from bisect import bisect_right
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from main.metrics import record_cache
+from main.models import PointsLedger, UserProfile
+
+WINDOWS = ('all', 'weekly', 'monthly')
+TOP_N = 20
+CACHE_KEY = 'leaderboard:{window}'
+
+
+def window_start(window, now=None):
+    """Start of the current weekly/monthly window, None for all-time"""
+    if window == 'all':
+        return None
+    today = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == 'weekly':
+        return today - timedelta(days=today.weekday())
+    if window == 'monthly':
+        return today.replace(day=1)
+    raise ValueError(f'Unknown leaderboard window: {window}')
+
+
+def _window_scores(since):
+    """Points earned per user since ``since``, from the points ledger"""
+    return dict(
+        # Opening balances carry points earned before the ledger existed
+        PointsLedger.objects.filter(created_at__gte=since).exclude(
+            source='opening_balance'
+        ).order_by().values('user_id').annotate(points=Sum('points')).values_list('user_id', 'points')
+    )
+
+
+def _rank_table(counts):
+    """Build the (distinct points ascending, users at or below) lookup"""
+    points, at_or_below = [], []
+    running = 0
+    for value, count in sorted(counts.items()):
+        running += count
+        points.append(value)
+        at_or_below.append(running)
+    return points, at_or_below
+
+
+def build_snapshot(window='all'):
+    """Compute a leaderboard snapshot from the database"""
+    since = window_start(window)
+    if since is None:
+        counts = dict(
+            UserProfile.objects.order_by().values('total_points').annotate(
+                users=Count('id')
+            ).values_list('total_points', 'users')
+        )
+        top = list(
+            UserProfile.objects.order_by('-total_points', 'user_id').values(
+                'user_id', 'user__username', 'total_points', 'level'
+            )[:TOP_N]
+        )
+        scores = None
+    else:
+        scores = _window_scores(since)
+        counts = {}
+        for value in scores.values():
+            counts[value] = counts.get(value, 0) + 1
+        leaders = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:TOP_N]
+        profiles = {
+            row['user_id']: row for row in UserProfile.objects.filter(
+                user_id__in=[user_id for user_id, _ in leaders]
+            ).values('user_id', 'user__username', 'level')
+        }
+        top = [
+            {
+                'user_id': user_id,
+                'user__username': profiles.get(user_id, {}).get('user__username', ''),
+                'total_points': value,
+                'level': profiles.get(user_id, {}).get('level', 1),
+            }
+            for user_id, value in leaders
+        ]
+
+    points, at_or_below = _rank_table(counts)
+    snapshot = {
+        'window': window,
+        'since': since,
+        'built_at': time.time(),
+        'points': points,
+        'at_or_below': at_or_below,
+        'total': at_or_below[-1] if at_or_below else 0,
+        'scores': scores,
+    }
+    snapshot['top'] = [
+        {
+            'rank': rank_for_points(snapshot, row['total_points']),
+            'user_id': row['user_id'],
+            'username': row['user__username'],
+            'total_points': row['total_points'],
+            'level': row['level'],
+        }
+        for row in top
+    ]
+    return snapshot
+
+
+def get_snapshot(window='all'):
+    """Return the cached snapshot for ``window``, rebuilding it when missing"""
+    if window not in WINDOWS:
+        raise ValueError(f'Unknown leaderboard window: {window}')
+    key = CACHE_KEY.format(window=window)
+    snapshot = cache.get(key)
+    record_cache('leaderboard', hit=snapshot is not None)
+    if snapshot is None:
+        snapshot = build_snapshot(window)
+        cache.set(key, snapshot, settings.PAISABUDDY_SETTINGS['LEADERBOARD_UPDATE_INTERVAL'])
+    return snapshot
+
+
+def rank_for_points(snapshot, points):
+    """1-based competition rank of a score in ``snapshot`` (ties share a rank)"""
+    index = bisect_right(snapshot['points'], points)
+    at_or_below = snapshot['at_or_below'][index - 1] if index else 0
+    return snapshot['total'] - at_or_below + 1
+
+
+def user_rank(snapshot, user_id, total_points):
+    """Rank of a user; ``total_points`` is used for the all-time window"""
+    if snapshot['scores'] is None:
+        return rank_for_points(snapshot, total_points)
+    return rank_for_points(snapshot, snapshot['scores'].get(user_id, 0))
+
+
+def invalidate_leaderboard():
+    """Drop cached snapshots after points change"""
+    cache.delete_many([CACHE_KEY.format(window=window) for window in WINDOWS])
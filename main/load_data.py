@@ -0,0 +1,475 @@
+"""
+Synthetic, reproducible load data for performance work.
+
+generate_load_data() creates users with profiles, portfolios, trade
+histories and holdings, monthly budgets with categories and expenses,
+module and fraud-scenario progress and the matching points ledger, on top of
+a large Stock universe. Every user's data is drawn from its own RNG seeded
+from (seed, user index), so the same seed gives the same dataset whatever the
+chunk size. Users are written in chunks with bulk_create. Derived state
+(profile points, holdings, portfolio values, budget spend, expense summaries)
+is computed alongside and matches what the app would maintain itself;
+expense forecasts are fitted once all users are written.
+"""
+import hashlib
+import random
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from main.catalog import invalidate_catalog
+from main.content import render_fields
+from main.dashboard import invalidate_all_dashboards
+from main.expense_forecast import fit_forecasts
+from main.expense_summary import month_start, recent_months
+from main.leaderboard import invalidate_leaderboard
+from main.models import (
+    Budget, BudgetCategory, Expense, ExpenseMonthlySummary, FinancialGoal, FraudScenario, Holding, LearningModule,
+    PointsLedger, Quiz, QuizQuestion, Stock, User, UserFraudProgress, UserProfile, UserProgress,
+    VirtualPortfolio, VirtualTransaction
+)
+from main.quotes import invalidate_quotes
+from main.stock_search import invalidate_stock_index
+
+SECTORS = [
+    'Banking', 'IT', 'Pharma', 'FMCG', 'Auto', 'Energy', 'Metals', 'Telecom', 'Realty', 'Infra'
+]
+OCCUPATIONS = ['Student', 'Engineer', 'Designer', 'Analyst', 'Teacher', 'Freelancer', 'Founder', '']
+EXPERIENCE = ['beginner', 'beginner', 'intermediate', 'advanced']
+FRAUD_TYPES = ['phishing', 'upi_fraud', 'fake_investment', 'identity_theft', 'lottery_scam']
+DIFFICULTIES = ['beginner', 'intermediate', 'advanced']
+QUESTIONS_PER_QUIZ = 5
+# Median spend per expense (INR) by category
+CATEGORY_SPEND = {
+    'Food & Dining': 350, 'Transportation': 150, 'Shopping': 1200, 'Entertainment': 500,
+    'Bills & Utilities': 1800, 'Healthcare': 900, 'Education': 2500, 'Travel': 3000, 'Other': 400,
+}
+CENT = Decimal('0.01')
+
+
+class LoadStats:
+    """Rows written and time spent per model"""
+
+    def __init__(self):
+        self.rows = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.started = time.perf_counter()
+
+    def bulk_create(self, model, objs, batch_size, keep_timestamps=False, **kwargs):
+        started = time.perf_counter()
+        if keep_timestamps:
+            insert_as_given(model, objs, batch_size)
+        else:
+            model.objects.bulk_create(objs, batch_size=batch_size, **kwargs)
+        self.rows[model.__name__] += len(objs)
+        self.seconds[model.__name__] += time.perf_counter() - started
+
+    @property
+    def total_rows(self):
+        return sum(self.rows.values())
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def report(self):
+        """One line per model plus a total, each with rows/second"""
+        lines = []
+        for name in sorted(self.rows, key=lambda name: -self.rows[name]):
+            seconds = self.seconds[name]
+            rate = self.rows[name] / seconds if seconds else 0
+            lines.append(f'{name:<20} {self.rows[name]:>12,} rows {seconds:>9.2f}s {rate:>12,.0f} rows/s')
+        elapsed = self.elapsed
+        lines.append(
+            f'{"Total":<20} {self.total_rows:>12,} rows {elapsed:>9.2f}s '
+            f'{self.total_rows / elapsed if elapsed else 0:>12,.0f} rows/s'
+        )
+        return lines
+
+
+def insert_as_given(model, objs, batch_size):
+    """
+    bulk_create that stores auto_now/auto_now_add fields as set on ``objs``.
+
+    bulk_create stamps those fields with the current time. A raw insert, the
+    path fixtures load through, writes the generated values instead without
+    touching the fields, so concurrent saves in the process are unaffected.
+    No signals are sent, as with bulk_create.
+    """
+    connection = connections[router.db_for_write(model)]
+    fields = model._meta.concrete_fields
+    without_pk = [field for field in fields if field is not model._meta.auto_field]
+    for group, group_fields in (
+        ([obj for obj in objs if obj.pk is not None], fields),
+        ([obj for obj in objs if obj.pk is None], without_pk),
+    ):
+        size = min(batch_size, connection.ops.bulk_batch_size(group_fields, group) or batch_size)
+        for start in range(0, len(group), size):
+            model._base_manager._insert(
+                group[start:start + size], fields=group_fields, raw=True, using=connection.alias
+            )
+
+
+def _money(value):
+    return Decimal(value).quantize(CENT)
+
+
+def _aware(day, rng):
+    # Built in UTC directly; make_aware per row is the slowest part of generation
+    moment = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    return moment + timedelta(seconds=rng.randrange(3 * 3600, 18 * 3600))
+
+
+def ensure_stock_universe(count, seed, stats, batch_size):
+    """Top up the active Stock universe to ``count`` synthetic symbols"""
+    existing = Stock.objects.filter(is_active=True).count()
+    rng = random.Random(f'{seed}:stocks')
+    new = []
+    for index in range(existing, count):
+        price = _money(rng.lognormvariate(5.5, 1.0) + 5)
+        new.append(Stock(
+            symbol=f'SYN{index:06d}',
+            company_name=f'Synthetic {SECTORS[index % len(SECTORS)]} Ltd {index}',
+            sector=SECTORS[index % len(SECTORS)],
+            current_price=price,
+            previous_close=_money(price * Decimal(rng.uniform(0.95, 1.05))),
+            market_cap=int(price * rng.randrange(10 ** 6, 10 ** 9)),
+        ))
+    if new:
+        stats.bulk_create(Stock, new, batch_size, ignore_conflicts=True)
+        invalidate_stock_index()
+        invalidate_quotes()
+    return list(Stock.objects.filter(is_active=True).order_by('id').values_list('id', 'current_price'))
+
+
+def _rendered(objs):
+    # bulk_create skips the pre_save hook that renders content
+    for obj in objs:
+        render_fields(obj)
+    return objs
+
+
+def ensure_catalog(modules, scenarios, seed, stats, batch_size):
+    """Use the active learning modules and fraud scenarios, creating some (with quizzes) when there are none"""
+    rng = random.Random(f'{seed}:catalog')
+    created = False
+    if not LearningModule.objects.filter(is_active=True).exists():
+        stats.bulk_create(LearningModule, _rendered([
+            LearningModule(
+                title=f'Load module {index}', description='Synthetic module', content='Synthetic content',
+                difficulty_level=DIFFICULTIES[index % 3], points_reward=rng.choice([10, 15, 20, 25]),
+                estimated_time=rng.randrange(5, 45), order=index,
+            ) for index in range(modules)
+        ]), batch_size)
+        module_ids = LearningModule.objects.filter(is_active=True).order_by('id').values_list('id', flat=True)
+        stats.bulk_create(Quiz, [
+            Quiz(module_id=module_id, title=f'Load quiz {index}', passing_score=60)
+            for index, module_id in enumerate(module_ids)
+        ], batch_size)
+        stats.bulk_create(QuizQuestion, [
+            QuizQuestion(
+                quiz_id=quiz_id, question_text=f'Synthetic question {number}', option_a='A', option_b='B',
+                option_c='C', option_d='D', correct_answer=rng.choice('ABCD'),
+            )
+            for quiz_id in Quiz.objects.filter(module_id__in=module_ids).order_by('id').values_list('id', flat=True)
+            for number in range(QUESTIONS_PER_QUIZ)
+        ], batch_size)
+        created = True
+    if not FraudScenario.objects.filter(is_active=True).exists():
+        stats.bulk_create(FraudScenario, _rendered([
+            FraudScenario(
+                title=f'Load scenario {index}', description='Synthetic scenario',
+                scenario_content='Synthetic content', fraud_type=FRAUD_TYPES[index % len(FRAUD_TYPES)],
+                correct_action='Report it', points_reward=rng.choice([15, 20, 25]),
+                difficulty_level=DIFFICULTIES[index % 3],
+            ) for index in range(scenarios)
+        ]), batch_size)
+        created = True
+    if created:
+        invalidate_catalog()
+    return (
+        list(LearningModule.objects.filter(is_active=True).order_by('id').values_list('id', 'points_reward')),
+        list(FraudScenario.objects.filter(is_active=True).order_by('id').values_list('id', 'points_reward')),
+    )
+
+
+class UserPlan:
+    """Everything generated for one user before ids are known"""
+
+    def __init__(self, index, seed, options, stocks, modules, scenarios, as_of):
+        self.rng = rng = random.Random(seed * 1_000_003 + index)
+        self.index = index
+        self.username = f"{options['prefix']}{index:07d}"
+        # Keeps generated primary keys unique across prefixes that share a seed
+        self.id_salt = int.from_bytes(hashlib.blake2b(options['prefix'].encode(), digest_size=16).digest(), 'big')
+        self.engagement = rng.betavariate(2, 3)
+        self.income = _money(rng.choice([15000, 25000, 40000, 60000, 90000, 150000]) * rng.uniform(0.8, 1.2))
+        self.plan_learning(modules, scenarios, as_of)
+        self.plan_trades(options['trades_per_user'], stocks, as_of)
+        self.plan_budgets(options['months'], options['expenses_per_user'], as_of)
+
+    def user(self, joined):
+        rng = self.rng
+        return User(
+            username=self.username,
+            email=f'{self.username}@load.test',
+            password='!',
+            age=rng.randrange(16, 36),
+            occupation=rng.choice(OCCUPATIONS),
+            monthly_income=self.income,
+            financial_experience=rng.choice(EXPERIENCE),
+            date_joined=joined,
+        )
+
+    def plan_learning(self, modules, scenarios, as_of):
+        rng = self.rng
+        self.progress = []
+        self.fraud = []
+        self.ledger = []
+        for module_id, points in modules:
+            if rng.random() > self.engagement + 0.1:
+                continue
+            completed = rng.random() < 0.8
+            when = _aware(as_of - timedelta(days=rng.randrange(0, 180)), rng)
+            self.progress.append((module_id, completed, when, rng.randrange(5, 60)))
+            if completed:
+                self.ledger.append((f'module:{module_id}', points, when))
+        for scenario_id, points in scenarios:
+            if rng.random() > self.engagement:
+                continue
+            correct = rng.random() < 0.6
+            when = _aware(as_of - timedelta(days=rng.randrange(0, 180)), rng)
+            self.fraud.append((scenario_id, correct, when))
+            if correct:
+                self.ledger.append((f'fraud_scenario:{scenario_id}', points, when))
+        self.total_points = sum(points for _, points, _ in self.ledger)
+
+    def plan_trades(self, count, stocks, as_of):
+        rng = self.rng
+        cash = Decimal(str(settings.PAISABUDDY_SETTINGS['INITIAL_VIRTUAL_CASH'])).quantize(CENT)
+        positions = {}
+        self.trades = []
+        # Users pick a handful of names, skewed towards the oldest (largest) stocks
+        picks = [stocks[int(len(stocks) * rng.random() ** 3)] for _ in range(8)] if stocks else []
+        days = sorted(rng.randrange(0, 180) for _ in range(count if picks else 0))
+        for days_ago in reversed(days):
+            stock_id, current_price = rng.choice(picks)
+            price = _money(current_price * Decimal(rng.uniform(0.8, 1.2)))
+            held = positions.get(stock_id)
+            if held and held[0] > 0 and rng.random() < 0.3:
+                quantity = rng.randrange(1, held[0] + 1)
+                cost_basis = held[2] * quantity
+                positions[stock_id] = (held[0] - quantity, held[1] - cost_basis, held[2])
+                cash += price * quantity
+                kind = 'sell'
+            else:
+                quantity = rng.randrange(1, 20)
+                if price * quantity > cash:
+                    continue
+                held_quantity, invested, _ = held or (0, Decimal('0'), price)
+                invested += price * quantity
+                held_quantity += quantity
+                positions[stock_id] = (held_quantity, invested, (invested / held_quantity).quantize(CENT))
+                cash -= price * quantity
+                kind = 'buy'
+            self.trades.append((
+                uuid.UUID(int=rng.getrandbits(128) ^ self.id_salt, version=4), stock_id, kind, quantity, price,
+                _aware(as_of - timedelta(days=days_ago), rng)
+            ))
+        prices = dict(stocks)
+        self.holdings = [
+            (stock_id, quantity, average, invested, prices[stock_id] * quantity)
+            for stock_id, (quantity, invested, average) in positions.items() if quantity > 0
+        ]
+        self.cash = cash
+        self.invested = sum(holding[3] for holding in self.holdings)
+        self.value = sum(holding[4] for holding in self.holdings)
+
+    def plan_budgets(self, months, expenses, as_of):
+        rng = self.rng
+        names = settings.PAISABUDDY_SETTINGS['DEFAULT_BUDGET_CATEGORIES']
+        self.budgets = []
+        current = month_start(as_of)
+        for first in recent_months(as_of, months):
+            last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            categories = rng.sample(names, rng.randrange(4, min(7, len(names)) + 1))
+            self.budgets.append({
+                'first': first, 'last': last, 'active': first == current,
+                'total': _money(self.income * Decimal(rng.uniform(0.4, 0.8))),
+                'categories': {name: Decimal('0') for name in categories},
+                'expenses': [],
+            })
+        for _ in range(expenses):
+            budget = rng.choice(self.budgets)
+            end = min(budget['last'], as_of)
+            day = budget['first'] + timedelta(days=rng.randrange(0, (end - budget['first']).days + 1))
+            name = rng.choice(list(budget['categories']))
+            amount = _money(max(10.0, rng.lognormvariate(0, 0.6) * CATEGORY_SPEND.get(name, 400)))
+            budget['categories'][name] += amount
+            budget['expenses'].append((name, amount, day, rng.random() < 0.1))
+        for budget in self.budgets:
+            spent = sum(budget['categories'].values())
+            share = {name: amount / spent for name, amount in budget['categories'].items()} if spent else {
+                name: Decimal(1) / len(budget['categories']) for name in budget['categories']
+            }
+            budget['allocated'] = {name: _money(budget['total'] * part) for name, part in share.items()}
+
+
+def _write_chunk(plans, as_of, stats, batch_size):
+    """Insert one chunk of planned users and everything that hangs off them"""
+    per_level = settings.PAISABUDDY_SETTINGS['POINTS_PER_LEVEL']
+    joined = timezone.make_aware(datetime.combine(as_of - timedelta(days=365), datetime.min.time()))
+    stats.bulk_create(User, [plan.user(joined) for plan in plans], batch_size)
+    user_ids = dict(User.objects.filter(username__in=[plan.username for plan in plans]).values_list('username', 'id'))
+    for plan in plans:
+        plan.user_id = user_ids[plan.username]
+
+    stats.bulk_create(UserProfile, [
+        UserProfile(
+            user_id=plan.user_id, total_points=plan.total_points, level=plan.total_points // per_level + 1,
+            streak_days=plan.rng.randrange(0, 31) if plan.ledger else 0,
+            last_activity=max((when for _, _, when in plan.ledger), default=joined),
+        ) for plan in plans
+    ], batch_size, keep_timestamps=True)
+    stats.bulk_create(VirtualPortfolio, [
+        VirtualPortfolio(
+            user_id=plan.user_id, virtual_cash=plan.cash, total_invested=plan.invested,
+            current_value=plan.value, profit_loss=plan.value - plan.invested,
+        ) for plan in plans
+    ], batch_size)
+    portfolio_ids = dict(VirtualPortfolio.objects.filter(user_id__in=user_ids.values()).values_list('user_id', 'id'))
+
+    stats.bulk_create(VirtualTransaction, [
+        VirtualTransaction(
+            id=trade_id, portfolio_id=portfolio_ids[plan.user_id], stock_id=stock_id, transaction_type=kind,
+            quantity=quantity, price_per_share=price, total_amount=price * quantity, timestamp=when,
+        )
+        for plan in plans for trade_id, stock_id, kind, quantity, price, when in plan.trades
+    ], batch_size, keep_timestamps=True)
+    stats.bulk_create(Holding, [
+        Holding(
+            portfolio_id=portfolio_ids[plan.user_id], stock_id=stock_id, quantity=quantity,
+            average_price=average, invested_amount=invested, current_value=value,
+        )
+        for plan in plans for stock_id, quantity, average, invested, value in plan.holdings
+    ], batch_size)
+
+    stats.bulk_create(UserProgress, [
+        UserProgress(
+            user_id=plan.user_id, module_id=module_id, is_completed=completed,
+            completion_date=when if completed else None, time_spent=minutes,
+        )
+        for plan in plans for module_id, completed, when, minutes in plan.progress
+    ], batch_size)
+    stats.bulk_create(UserFraudProgress, [
+        UserFraudProgress(
+            user_id=plan.user_id, scenario_id=scenario_id, is_completed=True, user_response='Synthetic response',
+            is_correct=correct, completion_date=when,
+        )
+        for plan in plans for scenario_id, correct, when in plan.fraud
+    ], batch_size)
+    stats.bulk_create(PointsLedger, [
+        PointsLedger(user_id=plan.user_id, points=points, source=source, created_at=when)
+        for plan in plans for source, points, when in plan.ledger
+    ], batch_size, keep_timestamps=True)
+    stats.bulk_create(FinancialGoal, [
+        FinancialGoal(
+            user_id=plan.user_id, title=f'Goal {number + 1}', goal_type=plan.rng.choice(FinancialGoal.GOAL_TYPES)[0],
+            target_amount=_money(plan.income * plan.rng.randrange(2, 12)),
+            saved_amount=_money(plan.income * Decimal(plan.rng.uniform(0, 2))),
+            target_date=as_of + timedelta(days=plan.rng.randrange(30, 720)),
+        )
+        for plan in plans for number in range(plan.rng.randrange(0, 3))
+    ], batch_size)
+
+    stats.bulk_create(Budget, [
+        Budget(
+            user_id=plan.user_id, name=budget['first'].strftime('%B %Y'), total_amount=budget['total'],
+            spent_amount=sum(budget['categories'].values()), start_date=budget['first'],
+            end_date=budget['last'], is_active=budget['active'],
+        )
+        for plan in plans for budget in plan.budgets
+    ], batch_size)
+    budget_ids = {
+        (user_id, start): budget_id for budget_id, user_id, start in Budget.objects.filter(
+            user_id__in=user_ids.values()
+        ).values_list('id', 'user_id', 'start_date')
+    }
+    stats.bulk_create(BudgetCategory, [
+        BudgetCategory(
+            budget_id=budget_ids[plan.user_id, budget['first']], name=name,
+            allocated_amount=budget['allocated'][name], spent_amount=spent,
+        )
+        for plan in plans for budget in plan.budgets for name, spent in budget['categories'].items()
+    ], batch_size)
+    category_ids = {
+        (budget_id, name): category_id for category_id, budget_id, name in BudgetCategory.objects.filter(
+            budget_id__in=budget_ids.values()
+        ).values_list('id', 'budget_id', 'name')
+    }
+    expenses = []
+    # Budgets are monthly, so each category's expenses form one summary bucket
+    summaries = []
+    for plan in plans:
+        for budget in plan.budgets:
+            budget_id = budget_ids[plan.user_id, budget['first']]
+            buckets = defaultdict(list)
+            for name, amount, day, recurring in budget['expenses']:
+                category_id = category_ids[budget_id, name]
+                buckets[category_id].append(amount)
+                expenses.append(Expense(
+                    user_id=plan.user_id, category_id=category_id, description=name,
+                    amount=amount, date=day, is_recurring=recurring, created_at=_aware(day, plan.rng),
+                ))
+            summaries.extend(
+                ExpenseMonthlySummary(
+                    user_id=plan.user_id, year=budget['first'].year, month=budget['first'].month,
+                    category_id=category_id, total_amount=sum(amounts), expense_count=len(amounts),
+                    min_amount=min(amounts), max_amount=max(amounts),
+                )
+                for category_id, amounts in buckets.items()
+            )
+    stats.bulk_create(Expense, expenses, batch_size, keep_timestamps=True)
+    stats.bulk_create(ExpenseMonthlySummary, summaries, batch_size)
+
+
+def generate_load_data(users, seed=42, expenses_per_user=100, trades_per_user=20, months=6, stocks=2000,
+                       modules=20, scenarios=10, chunk_size=500, batch_size=2000, prefix=None, as_of=None,
+                       progress=None):
+    """
+    Generate ``users`` synthetic users and their data; returns a LoadStats.
+
+    ``progress`` is called with (users_done, stats) after every chunk.
+    """
+    as_of = as_of or timezone.localdate()
+    options = {
+        'prefix': prefix if prefix is not None else f'load{seed}_',
+        'expenses_per_user': expenses_per_user,
+        'trades_per_user': trades_per_user,
+        'months': months,
+    }
+    stats = LoadStats()
+    with transaction.atomic():
+        stock_universe = ensure_stock_universe(stocks, seed, stats, batch_size)
+        module_catalog, scenario_catalog = ensure_catalog(modules, scenarios, seed, stats, batch_size)
+
+    for start in range(0, users, chunk_size):
+        plans = [
+            UserPlan(index, seed, options, stock_universe, module_catalog, scenario_catalog, as_of)
+            for index in range(start, min(start + chunk_size, users))
+        ]
+        with transaction.atomic():
+            _write_chunk(plans, as_of, stats, batch_size)
+        if progress:
+            progress(start + len(plans), stats)
+
+    fit_forecasts(batch_size=chunk_size)
+    invalidate_leaderboard()
+    invalidate_all_dashboards()
+    return stats
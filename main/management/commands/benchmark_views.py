@@ -0,0 +1,125 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from main.benchmark import (
+    DEFAULT_ITERATIONS, DEFAULT_WARMUP, ROUTES, benchmark_meta, compare_results, run_benchmarks,
+    uncovered_routes
+)
+from main.load_data import generate_load_data
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every routed view with the test client: p50/p95 latency, SQL query count and '
+        'peak memory per route. By default each --sizes fixture is seeded into a throwaway test '
+        'database; --existing benchmarks the configured database instead. --output writes a JSON '
+        'baseline and --compare fails when a route regresses against one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[100, 1000],
+            help='Fixture sizes in users, seeded cumulatively (default: 100 1000)'
+        )
+        parser.add_argument(
+            '--existing', action='store_true',
+            help='Benchmark the configured database as-is instead of seeding fixtures'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Fixture seed (default: 42)')
+        parser.add_argument(
+            '--iterations', type=int, default=DEFAULT_ITERATIONS,
+            help=f'Measured requests per route (default: {DEFAULT_ITERATIONS})'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=DEFAULT_WARMUP,
+            help=f'Unmeasured requests per route first (default: {DEFAULT_WARMUP})'
+        )
+        parser.add_argument(
+            '--route', action='append', dest='routes',
+            help=f'Only this route label (repeatable): {", ".join(route.label for route in ROUTES)}'
+        )
+        parser.add_argument('--output', help='Write results to this JSON file')
+        parser.add_argument('--compare', help='Baseline JSON file to compare against')
+        parser.add_argument(
+            '--latency-threshold', type=float, default=0.5,
+            help='Allowed relative p50 latency growth (default: 0.5)'
+        )
+        parser.add_argument(
+            '--memory-threshold', type=float, default=0.25,
+            help='Allowed relative peak memory growth (default: 0.25)'
+        )
+        parser.add_argument(
+            '--query-threshold', type=int, default=0,
+            help='Allowed extra queries per request (default: 0)'
+        )
+
+    def handle(self, *args, **options):
+        missing = uncovered_routes()
+        if missing:
+            raise CommandError(
+                f'Routes without a benchmark: {", ".join(missing)}; add them to main.benchmark.ROUTES '
+                'or SKIPPED_ROUTES'
+            )
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as stream:
+                    baseline = json.load(stream)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read baseline {options["compare"]}: {e}')
+
+        results = {'meta': benchmark_meta(options['iterations'], options['warmup']), 'sizes': {}}
+        if options['existing']:
+            results['sizes']['existing'] = self.run(options)
+        else:
+            self.run_fixtures(results, options)
+
+        if options['output']:
+            with open(options['output'], 'w') as stream:
+                json.dump(results, stream, indent=2, sort_keys=True)
+                stream.write('\n')
+            self.stdout.write(f'Wrote {options["output"]}')
+
+        if baseline is not None:
+            regressions = compare_results(
+                baseline, results,
+                latency_threshold=options['latency_threshold'],
+                memory_threshold=options['memory_threshold'],
+                query_threshold=options['query_threshold'],
+            )
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError(f'{len(regressions)} regressions against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["compare"]}'))
+
+    def run_fixtures(self, results, options):
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            seeded = 0
+            for size in sorted(set(options['sizes'])):
+                self.stdout.write(f'Seeding {size:,} users...')
+                generate_load_data(size - seeded, seed=options['seed'], prefix=f'bench{size}_')
+                seeded = size
+                results['sizes'][str(size)] = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run(self, options):
+        result = run_benchmarks(options['iterations'], options['warmup'], options['routes'])
+        self.stdout.write(f"{result['users']:,} users")
+        self.stdout.write(f'{"route":<28} {"status":>7} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8} {"mem KB":>9}')
+        for label, row in result['routes'].items():
+            status = ','.join(str(code) for code in row['status'])
+            self.stdout.write(
+                f'{label:<28} {status:>7} {row["p50_ms"]:>9.2f} {row["p95_ms"]:>9.2f} '
+                f'{row["queries"]:>8} {row["memory_kb"]:>9.1f}'
+            )
+        return result
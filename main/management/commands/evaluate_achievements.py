@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from main.achievements import evaluate_all
+
+
+class Command(BaseCommand):
+    help = 'Evaluate every active achievement rule for every user (backfill after rule changes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Users evaluated per metric query (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        considered = evaluate_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Checked {considered} earned achievements'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from main.expense_forecast import DEFAULT_BATCH_SIZE, fit_forecasts, month_start
+
+
+class Command(BaseCommand):
+    help = 'Refit the monthly expense forecasts of every user (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--through',
+            help='Last month to fit as YYYY-MM-DD (default: the last complete month)'
+        )
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='Only refit this user id (repeatable)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Users fitted together per array batch (default: {DEFAULT_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        through = None
+        if options['through']:
+            through = parse_date(options['through'])
+            if through is None:
+                raise CommandError(f"Invalid --through: {options['through']}")
+            through = month_start(through)
+        fitted = fit_forecasts(user_ids=options['user_ids'], through=through, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Fitted {fitted} expense series'))
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.pricing import DEFAULT_BATCH_SIZE, TickError, apply_ticks, read_ticks
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply stock price ticks from CSV/JSON files or stdin and revalue holdings. '
+        'CSV columns: symbol,price[,timestamp]. JSON: a list of tick objects or a '
+        '{"SYMBOL": price} mapping. Budget: a 5,000-symbol file against 100k '
+        'portfolios should finish within 30 seconds on SQLite.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sources', nargs='*', default=['-'],
+            help='Tick files to read; "-" (the default) reads stdin'
+        )
+        parser.add_argument(
+            '--format', choices=['csv', 'json', 'jsonl'],
+            help='Tick format; inferred from the file extension when omitted (stdin defaults to csv)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Rows per bulk update batch (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--watch', action='store_true',
+            help='Re-read the sources every STOCK_DATA_REFRESH_INTERVAL seconds'
+        )
+
+    def handle(self, *args, **options):
+        sources = options['sources']
+        if options['watch'] and '-' in sources:
+            raise CommandError('--watch needs file sources, not stdin')
+
+        interval = settings.PAISABUDDY_SETTINGS['STOCK_DATA_REFRESH_INTERVAL']
+        while True:
+            self.ingest(sources, options['format'], options['batch_size'])
+            if not options['watch']:
+                break
+            time.sleep(interval)
+
+    def ingest(self, sources, fmt, batch_size):
+        ticks = []
+        for source in sources:
+            source_format = fmt or self.infer_format(source)
+            try:
+                if source == '-':
+                    ticks.extend(read_ticks(sys.stdin, source_format))
+                else:
+                    with open(source, newline='') as stream:
+                        ticks.extend(read_ticks(stream, source_format))
+            except OSError as e:
+                raise CommandError(f'Cannot read {source}: {e}')
+            except (TickError, ValueError) as e:
+                raise CommandError(f'{source}: {e}')
+
+        stats = apply_ticks(ticks, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {stats['stocks_updated']} of {stats['symbols']} symbols "
+            f"({stats['sessions_rotated']} new sessions, {stats['unknown_symbols']} unknown, "
+            f"{stats['stale_ticks']} stale); revalued {stats['holdings_revalued']} holdings and "
+            f"{stats['portfolios_revalued']} portfolios in {stats['total_seconds']:.2f}s "
+            f"(prices {stats['apply_seconds']:.2f}s, revaluation {stats['revalue_seconds']:.2f}s)"
+        ))
+
+    @staticmethod
+    def infer_format(source):
+        extension = os.path.splitext(source)[1].lower()
+        return {'.json': 'json', '.jsonl': 'jsonl'}.get(extension, 'csv')
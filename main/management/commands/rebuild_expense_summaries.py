@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from main.expense_summary import rebuild_expense_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ExpenseMonthlySummary table from Expense rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='Only rebuild summaries for this user id (repeatable)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows per bulk insert (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        created = rebuild_expense_summaries(
+            user_ids=options['user_ids'], batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} expense summary rows'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from main.points import reconcile_points
+
+
+class Command(BaseCommand):
+    help = 'Check UserProfile.total_points against the PointsLedger'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Reset mismatched profile totals to the ledger total'
+        )
+
+    def handle(self, *args, **options):
+        mismatches = reconcile_points(fix=options['fix'])
+        for user_id, profile_points, ledger_points in mismatches:
+            self.stdout.write(f'user {user_id}: profile {profile_points}, ledger {ledger_points}')
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('All profiles match the points ledger'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(mismatches)} profiles'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(mismatches)} profiles differ from the ledger'))
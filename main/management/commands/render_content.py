@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from main.content import DEFAULT_BATCH_SIZE, RENDERER_VERSION, render_stale
+
+
+class Command(BaseCommand):
+    help = 'Re-render stored module and scenario HTML that is missing or was rendered by an older renderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-render every row, not just stale ones')
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Rows per query and bulk update (default: {DEFAULT_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        counts = render_stale(force=options['all'], batch_size=options['batch_size'])
+        summary = ', '.join(f'{count} {model}' for model, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Rendered {summary} rows (renderer version {RENDERER_VERSION})'))
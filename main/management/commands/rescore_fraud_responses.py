@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from main.red_flags import DEFAULT_BATCH_SIZE, rescore_responses
+
+
+class Command(BaseCommand):
+    help = "Re-grade stored fraud scenario responses against the scenarios' current red flags"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', type=int, action='append', dest='scenario_ids',
+            help='Only re-grade this scenario id (repeatable; default: all)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Responses per query and bulk update (default: {DEFAULT_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        counts = rescore_responses(scenario_ids=options['scenario_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-scored {counts['checked']} responses: {counts['now_correct']} now correct, "
+            f"{counts['now_incorrect']} now incorrect"
+        ))
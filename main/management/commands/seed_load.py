@@ -0,0 +1,86 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.load_data import generate_load_data
+from main.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a reproducible synthetic dataset for performance work: users with profiles, '
+        'portfolios, trade histories, budgets, expenses, learning and fraud progress, and a '
+        'large Stock universe. Rows are written in chunks with bulk_create and throughput is reported.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Users to create (default: 1000)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+        parser.add_argument(
+            '--expenses-per-user', type=int, default=100, help='Expenses per user (default: 100)'
+        )
+        parser.add_argument(
+            '--trades-per-user', type=int, default=20, help='Trades attempted per user (default: 20)'
+        )
+        parser.add_argument(
+            '--months', type=int, default=6, help='Months of budgets and expenses (default: 6)'
+        )
+        parser.add_argument(
+            '--stocks', type=int, default=2000, help='Size of the active Stock universe (default: 2000)'
+        )
+        parser.add_argument(
+            '--modules', type=int, default=20,
+            help='Learning modules to create when none exist (default: 20)'
+        )
+        parser.add_argument(
+            '--scenarios', type=int, default=10,
+            help='Fraud scenarios to create when none exist (default: 10)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500, help='Users per transaction (default: 500)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000, help='Rows per bulk_create batch (default: 2000)'
+        )
+        parser.add_argument(
+            '--prefix', help='Username prefix (default: load<seed>_)'
+        )
+        parser.add_argument(
+            '--as-of', type=date.fromisoformat,
+            help='Date the dataset ends on, YYYY-MM-DD (default: today); fix it for identical reruns'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 0 or options['chunk_size'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--users must be >= 0 and --chunk-size/--batch-size >= 1')
+        prefix = options['prefix'] if options['prefix'] is not None else f"load{options['seed']}_"
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f'Users with prefix "{prefix}" already exist; use another --seed or --prefix')
+
+        def progress(done, stats):
+            elapsed = stats.elapsed
+            self.stdout.write(
+                f"{done:,}/{options['users']:,} users, {stats.total_rows:,} rows, "
+                f"{stats.total_rows / elapsed if elapsed else 0:,.0f} rows/s"
+            )
+
+        stats = generate_load_data(
+            options['users'],
+            seed=options['seed'],
+            expenses_per_user=options['expenses_per_user'],
+            trades_per_user=options['trades_per_user'],
+            months=options['months'],
+            stocks=options['stocks'],
+            modules=options['modules'],
+            scenarios=options['scenarios'],
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            prefix=prefix,
+            as_of=options['as_of'],
+            progress=progress,
+        )
+        for line in stats.report():
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {options["users"]:,} users; run evaluate_achievements to award achievements'
+        ))
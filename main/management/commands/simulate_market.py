@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from main.simulator import MarketSimulator
+
+
+class Command(BaseCommand):
+    help = (
+        'Move all active Stock prices with a correlated geometric Brownian motion. Every step is '
+        'persisted through the regular tick ingestion path (revaluation, price history, caches).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--steps', type=int, help='Ticks to simulate (default: run until interrupted)')
+        parser.add_argument(
+            '--interval', type=float, default=1.0, help='Wall-clock seconds between ticks (default: 1.0)'
+        )
+        parser.add_argument('--seed', type=int, help='Random seed for a reproducible path')
+        parser.add_argument('--drift', type=float, help='Annual drift (default: SIMULATOR DRIFT)')
+        parser.add_argument('--volatility', type=float, help='Annual volatility for every sector')
+        parser.add_argument('--market-correlation', type=float, help='Correlation shared by all stocks')
+        parser.add_argument('--sector-correlation', type=float, help='Extra correlation within a sector')
+        parser.add_argument('--tick-seconds', type=float, help='Simulated market seconds per tick')
+        parser.add_argument('--batch-size', type=int, help='Stocks per select/update batch')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only time the NumPy steps; nothing is written'
+        )
+
+    def handle(self, *args, **options):
+        overrides = {
+            key: options[option] for key, option in [
+                ('DRIFT', 'drift'), ('MARKET_CORRELATION', 'market_correlation'),
+                ('SECTOR_CORRELATION', 'sector_correlation'), ('TICK_SECONDS', 'tick_seconds'),
+            ] if options[option] is not None
+        }
+        if options['volatility'] is not None:
+            overrides.update(VOLATILITY=options['volatility'], SECTOR_VOLATILITY={})
+        try:
+            simulator = MarketSimulator.from_database(seed=options['seed'], **overrides)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not len(simulator):
+            raise CommandError('No active stocks to simulate')
+
+        if options['dry_run']:
+            timings = []
+            for _ in range(options['steps'] or 100):
+                started = time.perf_counter()
+                simulator.step()
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(self.style.SUCCESS(
+                f'Stepped {len(simulator)} stocks {len(timings)} times: median '
+                f'{np.median(timings) * 1000:.2f}ms, max {max(timings) * 1000:.2f}ms per tick'
+            ))
+            return
+
+        self.stdout.write(f'Simulating {len(simulator)} stocks every {options["interval"]}s (Ctrl+C to stop)')
+        try:
+            steps = simulator.run(
+                steps=options['steps'], interval=options['interval'],
+                batch_size=options['batch_size'],
+            )
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
+            return
+        self.stdout.write(self.style.SUCCESS(f'Simulated {steps} ticks'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from main.snapshots import DEFAULT_BATCH_SIZE, take_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Record (or refresh) the PortfolioSnapshot row of every portfolio for a day'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Day to record as YYYY-MM-DD (default: today); values are always current'
+        )
+        parser.add_argument(
+            '--portfolio', type=int, action='append', dest='portfolio_ids',
+            help='Only snapshot this portfolio id (repeatable)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Portfolios per query and bulk write (default: {DEFAULT_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        day = None
+        if options['date']:
+            day = parse_date(options['date'])
+            if day is None:
+                raise CommandError(f"Invalid --date: {options['date']}")
+        created, updated = take_snapshots(
+            day=day, portfolio_ids=options['portfolio_ids'], batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Recorded {created} new and refreshed {updated} portfolio snapshots'))
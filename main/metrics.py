@@ -0,0 +1,298 @@
+"""
+Prometheus-style request metrics.
+
+MetricsMiddleware records per URL name request counts, a latency histogram,
+DB query counts and time, and a response size histogram. Other code
+records cache lookups with record_cache(). Samples are aggregated in a
+process-local registry under one lock.
+
+With PAISABUDDY_SETTINGS['METRICS_DIR'] set, every worker process snapshots
+its registry to its own JSON file in that directory, at most once every
+METRICS_FLUSH_INTERVAL seconds. The /metrics/ view sums all snapshots, so
+any WSGI/ASGI worker can answer a scrape. A snapshot whose worker is gone
+and which is older than METRICS_SNAPSHOT_TTL seconds is deleted on the next
+scrape; Prometheus sees its counters drop as a reset.
+
+The view answers staff users and requests carrying
+``Authorization: Bearer <METRICS_TOKEN>``.
+"""
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+
+PREFIX = 'paisabuddy'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# name: (type, help, buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests by URL name, method and status', None),
+    'http_request_duration_seconds': ('histogram', 'Request latency by URL name', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('histogram', 'Response body size by URL name', SIZE_BUCKETS),
+    'db_queries_per_request': ('histogram', 'SQL queries per request by URL name', QUERY_BUCKETS),
+    'db_queries_total': ('counter', 'SQL queries by URL name', None),
+    'db_query_seconds_total': ('counter', 'Time spent in SQL by URL name', None),
+    'cache_requests_total': ('counter', 'Application cache lookups by cache and result', None),
+}
+
+
+class Registry:
+    """Process-local counters and histograms keyed by (metric, label pairs)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # Per-bucket (not cumulative) counts, the last one being +Inf
+                histogram = self.histograms[key] = {'buckets': [0] * (len(buckets) + 1), 'sum': 0, 'count': 0}
+            histogram['buckets'][bisect_left(buckets, value)] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        """JSON-ready copy of the registry"""
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, list(labels), dict(histogram, buckets=list(histogram['buckets']))]
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+registry = Registry()
+_process_file = None
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+
+
+def _metrics_dir():
+    return settings.PAISABUDDY_SETTINGS.get('METRICS_DIR')
+
+
+def _snapshot_path(directory):
+    global _process_file
+    if _process_file is None or os.path.dirname(_process_file) != directory:
+        # pid plus start time, so a recycled pid never overwrites another worker's counters
+        _process_file = os.path.join(directory, f'{os.getpid()}-{time.time_ns()}.json')
+    return _process_file
+
+
+def flush(force=False):
+    """Write this process's snapshot to METRICS_DIR when the interval has passed"""
+    global _last_flush
+    directory = _metrics_dir()
+    if not directory:
+        return
+    now = time.monotonic()
+    interval = settings.PAISABUDDY_SETTINGS.get('METRICS_FLUSH_INTERVAL', 5)
+    if not force and now - _last_flush < interval:
+        return
+    if not _flush_lock.acquire(blocking=force):
+        return
+    try:
+        _last_flush = now
+        os.makedirs(directory, exist_ok=True)
+        path = _snapshot_path(directory)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as stream:
+            json.dump(registry.snapshot(), stream)
+        os.replace(tmp, path)
+    finally:
+        _flush_lock.release()
+
+
+def _pid_running(pid):
+    if os.name != 'posix':
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _expired(entry, ttl):
+    """Whether a snapshot (or leftover temp file) belongs to a worker that is gone"""
+    try:
+        if time.time() - entry.stat().st_mtime <= ttl:
+            return False
+    except FileNotFoundError:
+        return False
+    pid = entry.name.split('-', 1)[0]
+    return not (pid.isdigit() and _pid_running(int(pid)))
+
+
+def collect():
+    """Merged snapshot of every process (or just this one without METRICS_DIR)"""
+    directory = _metrics_dir()
+    if not directory:
+        return [registry.snapshot()]
+    flush(force=True)
+    ttl = settings.PAISABUDDY_SETTINGS.get('METRICS_SNAPSHOT_TTL', 3600)
+    snapshots = []
+    for entry in os.scandir(directory):
+        if entry.path != _process_file and _expired(entry, ttl):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            continue
+        if not entry.name.endswith('.json'):
+            continue
+        try:
+            with open(entry.path) as stream:
+                snapshots.append(json.load(stream))
+        except (OSError, ValueError):
+            # A snapshot being replaced mid-read is picked up on the next scrape
+            continue
+    return snapshots
+
+
+def _merge(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, histogram in snapshot['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.setdefault(
+                key, {'buckets': [0] * len(histogram['buckets']), 'sum': 0, 'count': 0}
+            )
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+            merged['sum'] += histogram['sum']
+            merged['count'] += histogram['count']
+    return counters, histograms
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots=None):
+    """Prometheus text exposition format (0.0.4)"""
+    counters, histograms = _merge(collect() if snapshots is None else snapshots)
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        full_name = f'{PREFIX}_{name}'
+        lines.append(f'# HELP {full_name} {help_text}')
+        lines.append(f'# TYPE {full_name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{full_name}{_label_text(labels)} {_number(value)}')
+            continue
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], histogram['buckets']):
+                cumulative += count
+                lines.append(f'{full_name}_bucket{_label_text(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{full_name}_sum{_label_text(labels)} {_number(histogram["sum"])}')
+            lines.append(f'{full_name}_count{_label_text(labels)} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def is_authorized(request):
+    """Whether ``request`` may scrape metrics"""
+    token = settings.PAISABUDDY_SETTINGS.get('METRICS_TOKEN')
+    if token and hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()
+    ):
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def record_cache(cache_name, hit):
+    """Count one application cache lookup"""
+    registry.inc('cache_requests_total', (('cache', cache_name), ('result', 'hit' if hit else 'miss')))
+
+
+class _QueryTimer:
+    """connection.execute_wrapper that counts queries and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Records request metrics labelled by the resolved URL name"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = _QueryTimer()
+        started = time.perf_counter()
+        wrappers = [connection.execute_wrapper(timer) for connection in connections.all()]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        try:
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        labels = (('view', view),)
+        registry.inc('http_requests_total', labels + (('method', request.method), ('status', response.status_code)))
+        registry.observe('http_request_duration_seconds', labels, elapsed)
+        registry.observe('db_queries_per_request', labels, timer.count)
+        registry.inc('db_queries_total', labels, timer.count)
+        registry.inc('db_query_seconds_total', labels, timer.seconds)
+        if not response.streaming:
+            registry.observe('http_response_size_bytes', labels, len(response.content))
+        flush()
+        return response
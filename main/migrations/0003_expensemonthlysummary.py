@@ -0,0 +1,61 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.functions
+import django.db.models.deletion
+
+
+def build_summaries(apps, schema_editor):
+    Expense = apps.get_model('main', 'Expense')
+    ExpenseMonthlySummary = apps.get_model('main', 'ExpenseMonthlySummary')
+    rows = Expense.objects.annotate(
+        summary_year=models.functions.ExtractYear('date'),
+        summary_month=models.functions.ExtractMonth('date'),
+    ).order_by().values('user_id', 'summary_year', 'summary_month', 'category_id').annotate(
+        total=models.Sum('amount'),
+        count=models.Count('id'),
+        low=models.Min('amount'),
+        high=models.Max('amount'),
+    )
+    ExpenseMonthlySummary.objects.bulk_create([
+        ExpenseMonthlySummary(
+            user_id=row['user_id'],
+            year=row['summary_year'],
+            month=row['summary_month'],
+            category_id=row['category_id'],
+            total_amount=row['total'],
+            expense_count=row['count'],
+            min_amount=row['low'],
+            max_amount=row['high'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_auto_20250921_0251'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('expense_count', models.IntegerField(default=0)),
+                ('min_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('max_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='main.budgetcategory')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expense_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'year', 'month', 'category')},
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Databases that applied this migration under its generated name
+    replaces = [('main', '0004_auto_20261017_1145')]
+
+    dependencies = [
+        ('main', '0003_expensemonthlysummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='virtualtransaction',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='virtualtransaction',
+            unique_together={('portfolio', 'idempotency_key')},
+        ),
+    ]
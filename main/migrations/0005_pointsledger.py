@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def open_balances(apps, schema_editor):
+    # Points awarded before the ledger existed become one opening entry per user
+    UserProfile = apps.get_model('main', 'UserProfile')
+    PointsLedger = apps.get_model('main', 'PointsLedger')
+    PointsLedger.objects.bulk_create([
+        PointsLedger(user_id=user_id, points=points, source='opening_balance',
+                     description='Points earned before the ledger')
+        for user_id, points in UserProfile.objects.exclude(total_points=0).values_list('user_id', 'total_points')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_transaction_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField()),
+                ('source', models.CharField(help_text='Award source key, e.g. module:3', max_length=100)),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_ledger', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'unique_together': {('user', 'source')},
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
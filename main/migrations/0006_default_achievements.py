@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:05
+
+from django.db import migrations
+
+# The achievements user_achievements used to hardcode, as Achievement rules
+DEFAULT_ACHIEVEMENTS = [
+    ('First Steps', 'Complete your first learning module', '👣', 'modules_completed', 1),
+    ('Learning Enthusiast', 'Complete 5 learning modules', '📚', 'modules_completed', 5),
+    ('Knowledge Seeker', 'Complete 10 learning modules', '🎓', 'modules_completed', 10),
+    ('Point Collector', 'Earn 100 points', '⭐', 'points_earned', 100),
+    ('High Achiever', 'Earn 500 points', '🌟', 'points_earned', 500),
+    ('Master Learner', 'Earn 1000 points', '🏆', 'points_earned', 1000),
+    ('Week Warrior', 'Keep a 7 day learning streak', '🔥', 'streak_days', 7),
+    ('Monthly Master', 'Keep a 30 day learning streak', '📅', 'streak_days', 30),
+    ('Profit Maker', 'Make a profit on your virtual portfolio', '📈', 'portfolio_profit', 1),
+    ('Investment Growth', 'Grow your virtual portfolio profit to ₹10,000', '💰', 'portfolio_profit', 10000),
+]
+
+
+def create_achievements(apps, schema_editor):
+    Achievement = apps.get_model('main', 'Achievement')
+    for name, description, icon, condition_type, condition_value in DEFAULT_ACHIEVEMENTS:
+        Achievement.objects.get_or_create(name=name, defaults={
+            'description': description,
+            'icon': icon,
+            'condition_type': condition_type,
+            'condition_value': condition_value,
+        })
+
+
+def remove_achievements(apps, schema_editor):
+    Achievement = apps.get_model('main', 'Achievement')
+    Achievement.objects.filter(name__in=[row[0] for row in DEFAULT_ACHIEVEMENTS]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_pointsledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_achievements, remove_achievements),
+    ]
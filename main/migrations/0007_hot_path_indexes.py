@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_default_achievements'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', 'start_date', 'end_date'], name='budget_active_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['user', 'date'], name='expense_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pointsledger',
+            index=models.Index(fields=['created_at'], name='ledger_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['symbol'], name='stock_active_symbol_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['-total_points', 'user'], name='profile_points_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=models.Index(condition=models.Q(('is_completed', True)), fields=['user'], name='progress_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='virtualtransaction',
+            index=models.Index(fields=['portfolio', '-timestamp'], name='vtxn_portfolio_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('cash', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('invested', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('market_value', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('net_worth', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('profit_loss', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='main.virtualportfolio')),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='portfoliosnapshot',
+            index=models.Index(fields=['date'], name='snapshot_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='portfoliosnapshot',
+            unique_together={('portfolio', 'date')},
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_portfoliosnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=100)),
+                ('fitted_through', models.DateField(help_text='First day of the last month folded into the state')),
+                ('alpha', models.FloatField()),
+                ('beta', models.FloatField()),
+                ('gamma', models.FloatField()),
+                ('level', models.FloatField()),
+                ('trend', models.FloatField()),
+                ('seasonal', models.JSONField(default=list, help_text='Offset per calendar month, January first')),
+                ('sse', models.FloatField(default=0)),
+                ('errors', models.IntegerField(default=0)),
+                ('months', models.IntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expense_forecasts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'category')},
+            },
+        ),
+    ]
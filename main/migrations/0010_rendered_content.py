@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_expenseforecast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fraudscenario',
+            name='scenario_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='fraudscenario',
+            name='scenario_html',
+            field=models.TextField(blank=True, editable=False, help_text='Sanitized HTML rendered from scenario_content'),
+        ),
+        migrations.AddField(
+            model_name='learningmodule',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='learningmodule',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False, help_text='Sanitized HTML rendered from content'),
+        ),
+    ]
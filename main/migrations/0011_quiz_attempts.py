@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_rendered_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprogress',
+            name='quiz_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='userprogress',
+            name='quiz_score',
+            field=models.IntegerField(blank=True, help_text='Best quiz percentage', null=True),
+        ),
+        migrations.CreateModel(
+            name='QuizAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveSmallIntegerField()),
+                ('answers', models.TextField(help_text="Chosen option per question in question order, '-' when unanswered")),
+                ('score', models.PositiveSmallIntegerField(help_text='Correct answers')),
+                ('percentage', models.FloatField()),
+                ('passed', models.BooleanField()),
+                ('submitted_at', models.DateTimeField(auto_now_add=True)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='main.quiz')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'quiz', 'number')},
+            },
+        ),
+    ]
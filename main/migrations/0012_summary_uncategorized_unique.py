@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:22
+
+from django.db import migrations, models
+
+
+def merge_uncategorized_duplicates(apps, schema_editor):
+    ExpenseMonthlySummary = apps.get_model('main', 'ExpenseMonthlySummary')
+    duplicates = ExpenseMonthlySummary.objects.filter(category__isnull=True).order_by().values(
+        'user_id', 'year', 'month'
+    ).annotate(rows=models.Count('id')).filter(rows__gt=1)
+    for bucket in duplicates:
+        rows = list(ExpenseMonthlySummary.objects.filter(
+            category__isnull=True, user_id=bucket['user_id'], year=bucket['year'], month=bucket['month']
+        ).order_by('id'))
+        keep = rows[0]
+        keep.total_amount = sum(row.total_amount for row in rows)
+        keep.expense_count = sum(row.expense_count for row in rows)
+        keep.min_amount = min(row.min_amount for row in rows)
+        keep.max_amount = max(row.max_amount for row in rows)
+        keep.save()
+        ExpenseMonthlySummary.objects.filter(pk__in=[row.pk for row in rows[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_quiz_attempts'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_uncategorized_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='expensemonthlysummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('user', 'year', 'month'), name='summary_uncategorized_unique'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:26
+
+from django.db import migrations, models
+
+
+def restore_investment_growth(apps, schema_editor):
+    # 0006 seeded this rule as profit >= 10,000; the original check was
+    # portfolio value above ₹1,10,000. Rules edited since are left alone.
+    Achievement = apps.get_model('main', 'Achievement')
+    Achievement.objects.filter(
+        name='Investment Growth', condition_type='portfolio_profit', condition_value=10000
+    ).update(
+        description='Grow your virtual portfolio value past ₹1,10,000',
+        condition_type='portfolio_value',
+        condition_value=110000,
+    )
+
+
+def revert_investment_growth(apps, schema_editor):
+    Achievement = apps.get_model('main', 'Achievement')
+    Achievement.objects.filter(
+        name='Investment Growth', condition_type='portfolio_value', condition_value=110000
+    ).update(
+        description='Grow your virtual portfolio profit to ₹10,000',
+        condition_type='portfolio_profit',
+        condition_value=10000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_summary_uncategorized_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_investment_growth, revert_investment_growth),
+        migrations.AlterField(
+            model_name='achievement',
+            name='condition_type',
+            field=models.CharField(choices=[('modules_completed', 'Modules Completed'), ('points_earned', 'Points Earned'), ('streak_days', 'Streak Days'), ('portfolio_profit', 'Portfolio Profit'), ('portfolio_value', 'Portfolio Value'), ('budget_followed', 'Budget Followed')], max_length=50),
+        ),
+    ]
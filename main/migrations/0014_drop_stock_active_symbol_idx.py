@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:26
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_investment_growth_value'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='stock',
+            name='stock_active_symbol_idx',
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
@@ -33,9 +34,33 @@ class UserProfile(models.Model):
     streak_days = models.IntegerField(default=0)
     last_activity = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Leaderboard ordering and points histogram
+            models.Index(fields=['-total_points', 'user'], name='profile_points_rank_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+class PointsLedger(models.Model):
+    """Point award events; UserProfile.total_points is their running total"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='points_ledger')
+    points = models.IntegerField()
+    source = models.CharField(max_length=100, help_text="Award source key, e.g. module:3")
+    description = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['user', 'source']
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='ledger_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} +{self.points} ({self.source})"
+
 class Achievement(models.Model):
     """Achievements for gamification"""
     name = models.CharField(max_length=100)
@@ -49,6 +74,7 @@ class Achievement(models.Model):
             ('points_earned', 'Points Earned'),
             ('streak_days', 'Streak Days'),
             ('portfolio_profit', 'Portfolio Profit'),
+            ('portfolio_value', 'Portfolio Value'),
             ('budget_followed', 'Budget Followed')
         ]
     )
@@ -75,6 +101,8 @@ class LearningModule(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     content = models.TextField()
+    content_html = models.TextField(blank=True, editable=False, help_text="Sanitized HTML rendered from content")
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
     difficulty_level = models.CharField(
         max_length=20,
         choices=[
@@ -121,17 +149,38 @@ class QuizQuestion(models.Model):
     def __str__(self):
         return f"Q: {self.question_text[:50]}..."
 
+class QuizAttempt(models.Model):
+    """One graded quiz submission"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='attempts')
+    number = models.PositiveSmallIntegerField()
+    answers = models.TextField(help_text="Chosen option per question in question order, '-' when unanswered")
+    score = models.PositiveSmallIntegerField(help_text="Correct answers")
+    percentage = models.FloatField()
+    passed = models.BooleanField()
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['user', 'quiz', 'number']
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.quiz.title} #{self.number}"
+
 class UserProgress(models.Model):
     """Track user progress through modules"""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     module = models.ForeignKey(LearningModule, on_delete=models.CASCADE)
     is_completed = models.BooleanField(default=False)
     completion_date = models.DateTimeField(null=True, blank=True)
-    quiz_score = models.IntegerField(null=True, blank=True)
+    quiz_score = models.IntegerField(null=True, blank=True, help_text="Best quiz percentage")
+    quiz_attempts = models.PositiveSmallIntegerField(default=0)
     time_spent = models.IntegerField(default=0, help_text="Time spent in minutes")
     
     class Meta:
         unique_together = ['user', 'module']
+        indexes = [
+            models.Index(fields=['user'], condition=Q(is_completed=True), name='progress_completed_idx'),
+        ]
 
 class VirtualPortfolio(models.Model):
     """Virtual portfolio for stock simulation"""
@@ -173,10 +222,15 @@ class VirtualTransaction(models.Model):
     quantity = models.IntegerField(validators=[MinValueValidator(1)])
     price_per_share = models.DecimalField(max_digits=10, decimal_places=2)
     total_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
     timestamp = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-timestamp']
+        unique_together = ['portfolio', 'idempotency_key']
+        indexes = [
+            models.Index(fields=['portfolio', '-timestamp'], name='vtxn_portfolio_recent_idx'),
+        ]
 
 class Holding(models.Model):
     """User's current stock holdings"""
@@ -190,6 +244,27 @@ class Holding(models.Model):
     class Meta:
         unique_together = ['portfolio', 'stock']
 
+class PortfolioSnapshot(models.Model):
+    """End-of-day (or latest price batch of the day) values of a portfolio"""
+    portfolio = models.ForeignKey(VirtualPortfolio, on_delete=models.CASCADE, related_name='snapshots')
+    date = models.DateField()
+    cash = models.DecimalField(max_digits=12, decimal_places=2)
+    invested = models.DecimalField(max_digits=12, decimal_places=2)
+    market_value = models.DecimalField(max_digits=12, decimal_places=2)
+    net_worth = models.DecimalField(max_digits=12, decimal_places=2)
+    profit_loss = models.DecimalField(max_digits=12, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['portfolio', 'date']
+        ordering = ['date']
+        indexes = [
+            models.Index(fields=['date'], name='snapshot_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.portfolio} on {self.date}"
+
 class Budget(models.Model):
     """User budget management"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets')
@@ -200,6 +275,14 @@ class Budget(models.Model):
     end_date = models.DateField()
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'start_date', 'end_date'], condition=Q(is_active=True),
+                name='budget_active_period_idx'
+            ),
+        ]
 
 class BudgetCategory(models.Model):
     """Budget categories"""
@@ -217,12 +300,68 @@ class Expense(models.Model):
     date = models.DateField()
     is_recurring = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='expense_user_date_idx'),
+        ]
+
+class ExpenseMonthlySummary(models.Model):
+    """Per-user monthly expense totals by category, maintained from Expense signals"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expense_summaries')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    category = models.ForeignKey(BudgetCategory, on_delete=models.CASCADE, null=True, blank=True)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    expense_count = models.IntegerField(default=0)
+    min_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    max_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    class Meta:
+        unique_together = ['user', 'year', 'month', 'category']
+        constraints = [
+            # NULLs never collide in unique_together, so uncategorized rows need their own constraint
+            models.UniqueConstraint(
+                fields=['user', 'year', 'month'], condition=Q(category__isnull=True),
+                name='summary_uncategorized_unique',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.year}-{self.month:02d}"
+
+class ExpenseForecast(models.Model):
+    """Fitted Holt-Winters state of a user's monthly spend in one category (by name)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expense_forecasts')
+    category = models.CharField(max_length=100)
+    fitted_through = models.DateField(help_text="First day of the last month folded into the state")
+    alpha = models.FloatField()
+    beta = models.FloatField()
+    gamma = models.FloatField()
+    level = models.FloatField()
+    trend = models.FloatField()
+    seasonal = models.JSONField(default=list, help_text="Offset per calendar month, January first")
+    sse = models.FloatField(default=0)
+    errors = models.IntegerField(default=0)
+    months = models.IntegerField(default=0)
+    total = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'category']
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.category} through {self.fitted_through:%Y-%m}"
 
 class FraudScenario(models.Model):
     """Fraud identification scenarios"""
     title = models.CharField(max_length=200)
     description = models.TextField()
     scenario_content = models.TextField()
+    scenario_html = models.TextField(
+        blank=True, editable=False, help_text="Sanitized HTML rendered from scenario_content"
+    )
+    scenario_hash = models.CharField(max_length=64, blank=True, editable=False)
     fraud_type = models.CharField(
         max_length=50,
         choices=[
@@ -0,0 +1,103 @@
+"""
+Point awards backed by the PointsLedger.
+
+Every award is a ledger row unique per (user, source), so replaying the same
+event never pays twice. The matching UserProfile update is a single UPDATE
+with F() expressions that moves total_points, level and streak_days forward
+together, so concurrent awards never lose points.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from main.achievements import evaluate_on_commit
+from main.dashboard import invalidate_dashboard
+from main.leaderboard import invalidate_leaderboard
+from main.models import PointsLedger, UserProfile
+
+logger = logging.getLogger(__name__)
+
+
+def _profile_update(points, now):
+    """UPDATE assignments that apply an award to a UserProfile row"""
+    app_settings = settings.PAISABUDDY_SETTINGS
+    start_of_today = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    streak_cutoff = now - timedelta(hours=app_settings['STREAK_RESET_HOURS'])
+    new_total = F('total_points') + points
+    return {
+        'total_points': new_total,
+        'level': new_total / app_settings['POINTS_PER_LEVEL'] + 1,
+        'streak_days': Case(
+            When(streak_days__lt=1, then=Value(1)),
+            When(last_activity__gte=start_of_today, then=F('streak_days')),
+            When(last_activity__gte=streak_cutoff, then=F('streak_days') + 1),
+            default=Value(1),
+            output_field=IntegerField(),
+        ),
+        'last_activity': now,
+    }
+
+
+def award_points(user, points, source, description=''):
+    """
+    Award ``points`` to ``user`` once per ``source`` (e.g. ``module:3``).
+
+    Returns True when the award was applied and False when ``source`` had
+    already been awarded to this user.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                PointsLedger.objects.create(
+                    user=user, points=points, source=source, description=description
+                )
+        except IntegrityError:
+            return False
+
+        updated = UserProfile.objects.filter(user=user).update(**_profile_update(points, now))
+        if not updated:
+            UserProfile.objects.get_or_create(user=user)
+            UserProfile.objects.filter(user=user).update(**_profile_update(points, now))
+        transaction.on_commit(invalidate_leaderboard)
+        invalidate_dashboard(user.pk)
+        evaluate_on_commit('points_earned', [user.pk])
+    return True
+
+
+def ledger_mismatches():
+    """Profiles whose total_points differs from the sum of their ledger"""
+    ledger_total = PointsLedger.objects.filter(user_id=OuterRef('user_id')).order_by().values(
+        'user_id'
+    ).annotate(total=Sum('points')).values('total')
+    return UserProfile.objects.annotate(
+        ledger_points=Coalesce(Subquery(ledger_total, output_field=IntegerField()), Value(0))
+    ).exclude(total_points=F('ledger_points'))
+
+
+def reconcile_points(fix=False):
+    """
+    Check UserProfile.total_points against the ledger.
+
+    Returns a list of (user_id, profile_points, ledger_points). With ``fix``
+    the profile totals and levels are reset to the ledger totals.
+    """
+    mismatches = list(ledger_mismatches().values_list('user_id', 'total_points', 'ledger_points'))
+    for user_id, profile_points, ledger_points in mismatches:
+        logger.warning(
+            'Points mismatch for user %s: profile %s, ledger %s', user_id, profile_points, ledger_points
+        )
+    if fix and mismatches:
+        per_level = settings.PAISABUDDY_SETTINGS['POINTS_PER_LEVEL']
+        with transaction.atomic():
+            for user_id, _, ledger_points in mismatches:
+                UserProfile.objects.filter(user_id=user_id).update(
+                    total_points=ledger_points, level=ledger_points // per_level + 1
+                )
+        invalidate_leaderboard()
+    return mismatches
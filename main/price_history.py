@@ -0,0 +1,176 @@
+"""
+Columnar, append-only price history.
+
+Every symbol has two column files in PAISABUDDY_SETTINGS['PRICE_HISTORY_DIR']:
+``<SYMBOL>.ts`` holds int64 tick timestamps (microseconds since the epoch,
+UTC), and ``<SYMBOL>.px`` holds the float64 prices. Ticks are only appended,
+in time order. Ticks older than a symbol's last stored one are dropped.
+
+Reads open both files with numpy.memmap and binary-search the timestamp
+column, so a range or OHLC query only pages in the slice it covers, however
+long the history is. Prices are written before timestamps. A write torn by
+a crash leaves a longer price column, and readers ignore the extra prices.
+
+There is one writer per store (the tick ingestion path). Appends take an
+exclusive flock where the platform has one.
+"""
+import os
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.parse import quote
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+TIMESTAMP_DTYPE = np.dtype('<i8')
+PRICE_DTYPE = np.dtype('<f8')
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+_append_lock = threading.Lock()
+
+# Bar sizes accepted by the chart endpoint
+INTERVALS = {
+    '1m': 60,
+    '5m': 5 * 60,
+    '15m': 15 * 60,
+    '1h': 60 * 60,
+    '1d': 24 * 60 * 60,
+}
+
+
+def to_micros(moment):
+    """Microseconds since the epoch of an aware datetime"""
+    delta = moment - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def from_micros(micros):
+    return EPOCH + timedelta(microseconds=int(micros))
+
+
+class PriceHistory:
+    """Per-symbol timestamp/price column files under one directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _paths(self, symbol):
+        name = quote(symbol.upper(), safe='')
+        return os.path.join(self.directory, f'{name}.ts'), os.path.join(self.directory, f'{name}.px')
+
+    def columns(self, symbol):
+        """(timestamps, prices) of ``symbol`` as read-only memory maps; empty arrays without history"""
+        ts_path, px_path = self._paths(symbol)
+        try:
+            count = min(os.path.getsize(ts_path) // TIMESTAMP_DTYPE.itemsize,
+                        os.path.getsize(px_path) // PRICE_DTYPE.itemsize)
+        except OSError:
+            count = 0
+        if not count:
+            return np.empty(0, TIMESTAMP_DTYPE), np.empty(0, PRICE_DTYPE)
+        return (
+            np.memmap(ts_path, dtype=TIMESTAMP_DTYPE, mode='r', shape=(count,)),
+            np.memmap(px_path, dtype=PRICE_DTYPE, mode='r', shape=(count,)),
+        )
+
+    def append(self, symbol, timestamps, prices):
+        """
+        Append ticks of one symbol; ``timestamps`` are epoch microseconds.
+
+        Ticks not newer than the last stored one are dropped. Returns the
+        number of ticks written.
+        """
+        timestamps = np.asarray(timestamps, dtype=TIMESTAMP_DTYPE)
+        prices = np.asarray(prices, dtype=PRICE_DTYPE)
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, prices = timestamps[order], prices[order]
+
+        os.makedirs(self.directory, exist_ok=True)
+        ts_path, px_path = self._paths(symbol)
+        with _append_lock, open(ts_path, 'a+b') as ts_file, open(px_path, 'ab') as px_file:
+            if fcntl is not None:
+                fcntl.flock(ts_file, fcntl.LOCK_EX)
+            ts_size, px_size = os.fstat(ts_file.fileno()).st_size, os.fstat(px_file.fileno()).st_size
+            count = min(ts_size // TIMESTAMP_DTYPE.itemsize, px_size // PRICE_DTYPE.itemsize)
+            if (ts_size, px_size) != (count * TIMESTAMP_DTYPE.itemsize, count * PRICE_DTYPE.itemsize):
+                # Drop the tail of a torn write before appending
+                ts_file.truncate(count * TIMESTAMP_DTYPE.itemsize)
+                px_file.truncate(count * PRICE_DTYPE.itemsize)
+            if count:
+                # Only the last stored timestamp is needed, not a map of the file
+                ts_file.seek((count - 1) * TIMESTAMP_DTYPE.itemsize)
+                last = np.frombuffer(ts_file.read(TIMESTAMP_DTYPE.itemsize), dtype=TIMESTAMP_DTYPE)[0]
+                keep = timestamps > last
+                timestamps, prices = timestamps[keep], prices[keep]
+            if len(timestamps):
+                px_file.write(prices.tobytes())
+                px_file.flush()
+                ts_file.write(timestamps.tobytes())
+                ts_file.flush()
+        return len(timestamps)
+
+    def append_ticks(self, ticks):
+        """Append ``{'symbol', 'price', 'timestamp'}`` ticks; returns ticks written"""
+        by_symbol = {}
+        for tick in ticks:
+            timestamps, prices = by_symbol.setdefault(tick['symbol'], ([], []))
+            timestamps.append(to_micros(tick['timestamp']))
+            prices.append(float(tick['price']))
+        return sum(self.append(symbol, *columns) for symbol, columns in by_symbol.items())
+
+    def range(self, symbol, start=None, end=None):
+        """Ticks with start <= timestamp < end as (datetime64[us] array, price array) copies of the slice"""
+        timestamps, prices = self.columns(symbol)
+        lo = np.searchsorted(timestamps, to_micros(start), side='left') if start else 0
+        hi = np.searchsorted(timestamps, to_micros(end), side='left') if end else len(timestamps)
+        return np.array(timestamps[lo:hi]).astype('datetime64[us]'), np.array(prices[lo:hi])
+
+    def last_price_before(self, symbol, moment):
+        """Price of the last tick strictly before ``moment``, or None"""
+        timestamps, prices = self.columns(symbol)
+        index = np.searchsorted(timestamps, to_micros(moment), side='left')
+        return float(prices[index - 1]) if index else None
+
+    def ohlc(self, symbol, start, end, interval):
+        """
+        Bars of ``interval`` seconds between ``start`` and ``end``.
+
+        Bars are aligned to the current time zone's midnight, so daily bars
+        are local trading days. Returns a dict of equally long lists: time
+        (bar start, ISO 8601), open, high, low, close and ticks. Only
+        intervals with at least one tick get a bar.
+        """
+        timestamps, prices = self.columns(symbol)
+        lo = np.searchsorted(timestamps, to_micros(start), side='left')
+        hi = np.searchsorted(timestamps, to_micros(end), side='left')
+        bars = {'time': [], 'open': [], 'high': [], 'low': [], 'close': [], 'ticks': []}
+        if lo == hi:
+            return bars
+        timestamps, prices = timestamps[lo:hi], prices[lo:hi]
+
+        offset = int(timezone.localtime(start).utcoffset().total_seconds() * 1_000_000)
+        width = interval * 1_000_000
+        buckets = (timestamps + offset) // width
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        ends = np.append(starts[1:], len(buckets))
+
+        bars['time'] = [
+            timezone.localtime(from_micros(bucket * width - offset)).isoformat() for bucket in buckets[starts]
+        ]
+        bars['open'] = prices[starts].tolist()
+        bars['high'] = np.maximum.reduceat(prices, starts).tolist()
+        bars['low'] = np.minimum.reduceat(prices, starts).tolist()
+        bars['close'] = prices[ends - 1].tolist()
+        bars['ticks'] = (ends - starts).tolist()
+        return bars
+
+
+def get_store():
+    """PriceHistory for the configured directory"""
+    return PriceHistory(str(settings.PAISABUDDY_SETTINGS['PRICE_HISTORY_DIR']))
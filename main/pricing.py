@@ -0,0 +1,329 @@
+"""
+Price tick ingestion for Stock and set-based revaluation of holdings.
+
+Ticks are plain ``{'symbol', 'price', 'timestamp'}`` mappings read from CSV or
+JSON. They are applied to Stock with one ``UPDATE ... FROM (VALUES ...)``
+statement per batch, and every Holding and VirtualPortfolio that owns an
+updated stock is then revalued with UPDATE statements rather than per-row
+saves. Once the ticks commit, the accepted ones are appended to
+PRICE_FEED_FILE, which the price stream tails in every ASGI worker, and the
+``ticks_applied`` signal carries them to listeners in this process.
+"""
+import csv
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime, time as dt_time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.dispatch import Signal
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from main.achievements import evaluate_portfolios
+from main.dashboard import invalidate_all_dashboards
+from main.models import Holding, Stock, VirtualPortfolio
+from main.price_history import get_store as get_price_history
+from main.quotes import invalidate_quotes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+# Sent on commit with ``ticks``, the accepted ticks of one apply_ticks() call
+ticks_applied = Signal()
+
+
+class TickError(ValueError):
+    """Raised for a tick that cannot be parsed"""
+
+
+def _parse_tick(raw, default_timestamp):
+    symbol = str(raw.get('symbol') or '').strip().upper()
+    if not symbol:
+        raise TickError(f'Tick without symbol: {raw!r}')
+    try:
+        price = Decimal(str(raw.get('price'))).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError):
+        raise TickError(f'Invalid price for {symbol}: {raw.get("price")!r}')
+    if price <= 0:
+        raise TickError(f'Non-positive price for {symbol}: {price}')
+
+    timestamp = raw.get('timestamp')
+    if timestamp:
+        parsed = parse_datetime(str(timestamp))
+        if parsed is None:
+            raise TickError(f'Invalid timestamp for {symbol}: {timestamp!r}')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        timestamp = parsed
+    else:
+        timestamp = default_timestamp
+    return {'symbol': symbol, 'price': price, 'timestamp': timestamp}
+
+
+def read_ticks(stream, fmt='csv'):
+    """Parse ticks from a CSV (symbol,price[,timestamp]), JSON or JSON-lines text stream"""
+    now = timezone.now()
+    if fmt == 'jsonl':
+        return [_parse_tick(json.loads(line), now) for line in stream if line.strip()]
+    if fmt == 'json':
+        data = json.load(stream)
+        if isinstance(data, dict):
+            # {"SYMBOL": price, ...}
+            data = [{'symbol': symbol, 'price': price} for symbol, price in data.items()]
+        return [_parse_tick(raw, now) for raw in data]
+    if fmt == 'csv':
+        return [_parse_tick(raw, now) for raw in csv.DictReader(stream)]
+    raise ValueError(f'Unknown tick format: {fmt}')
+
+
+def write_ticks(stream, ticks):
+    """Write ticks to a text stream as the JSON lines read_ticks(fmt='jsonl') reads"""
+    stream.writelines(
+        json.dumps({
+            'symbol': tick['symbol'], 'price': str(tick['price']), 'timestamp': tick['timestamp'].isoformat()
+        }) + '\n'
+        for tick in ticks
+    )
+
+
+def _append_to_feed(ticks):
+    path = settings.PAISABUDDY_SETTINGS.get('PRICE_FEED_FILE')
+    if not path:
+        return
+    try:
+        with open(path, 'a') as stream:
+            write_ticks(stream, ticks)
+    except OSError:
+        # The prices are committed; only the live stream misses this batch
+        logger.exception('Could not append %d ticks to %s', len(ticks), path)
+
+
+def latest_ticks(ticks):
+    """Keep only the newest tick per symbol"""
+    latest = {}
+    for tick in ticks:
+        current = latest.get(tick['symbol'])
+        if current is None or tick['timestamp'] >= current['timestamp']:
+            latest[tick['symbol']] = tick
+    return latest
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+PRICE_FIELDS = ('current_price', 'previous_close', 'last_updated')
+
+
+def _supports_update_from(connection):
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 33)
+    return False
+
+
+def _write_prices(stocks):
+    """
+    Save the price fields of ``stocks`` with one UPDATE per batch.
+
+    The new values are joined in from a VALUES list (``UPDATE ... FROM``, on
+    PostgreSQL and SQLite 3.33+), prepared by the model fields. bulk_update()
+    sets each field from a CASE over the batch, which costs seconds for
+    thousands of stocks; it is only used where UPDATE ... FROM is missing.
+    """
+    if not stocks:
+        return
+    # The wrapper itself, not the thread-local proxy looked up on every attribute
+    connection = connections[DEFAULT_DB_ALIAS]
+    if not _supports_update_from(connection):
+        Stock.objects.bulk_update(stocks, PRICE_FIELDS)
+        return
+    quote_name = connection.ops.quote_name
+    table = quote_name(Stock._meta.db_table)
+    fields = [Stock._meta.get_field(name) for name in PRICE_FIELDS]
+    # VALUES columns are named column1, column2, ... on both backends
+    assignments = ', '.join(
+        f'{quote_name(field.column)} = new.column{position}' for position, field in enumerate(fields, 2)
+    )
+    row = '(' + ', '.join(['%s'] * (len(fields) + 1)) + ')'
+    max_params = connection.features.max_query_params
+    size = max_params // (len(fields) + 1) if max_params else len(stocks)
+    with connection.cursor() as cursor:
+        for batch in _chunks(stocks, size):
+            params = []
+            for stock in batch:
+                params.append(stock.pk)
+                params.extend(field.get_db_prep_save(getattr(stock, field.attname), connection) for field in fields)
+            cursor.execute(
+                f'UPDATE {table} SET {assignments} FROM (VALUES {", ".join([row] * len(batch))}) AS new '
+                f'WHERE {table}.{quote_name(Stock._meta.pk.column)} = new.column1',
+                params,
+            )
+
+
+def _session_close(history, stock, session):
+    """Last recorded price before ``session`` began, else the stock's last traded price"""
+    session_start = timezone.make_aware(datetime.combine(session, dt_time.min))
+    close = history.last_price_before(stock.symbol, session_start)
+    if close is None:
+        return stock.current_price
+    return Decimal(repr(close)).quantize(Decimal('0.01'))
+
+
+def apply_ticks(ticks, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Apply price ticks to Stock rows and revalue affected holdings and portfolios.
+
+    ``previous_close`` is rotated the first time a stock is ticked in a new
+    session (local trading day): to the last price in the price history
+    before the session began, or to the last traded price without history.
+    Ticks older than the stock's ``last_updated`` are ignored; accepted ticks
+    are appended to the price history on commit. Returns a dict of counts
+    and timings.
+    """
+    started = time.perf_counter()
+    latest = latest_ticks(ticks)
+    symbols = list(latest)
+    stats = {
+        'ticks': len(ticks),
+        'symbols': len(symbols),
+        'stocks_updated': 0,
+        'unknown_symbols': 0,
+        'stale_ticks': 0,
+        'sessions_rotated': 0,
+        'holdings_revalued': 0,
+        'portfolios_revalued': 0,
+    }
+
+    history = get_price_history()
+    # Ticks of one batch mostly share a timestamp; convert each one once
+    local_dates = {}
+
+    def local_date(value):
+        if value not in local_dates:
+            local_dates[value] = timezone.localtime(value).date()
+        return local_dates[value]
+
+    updated_ids = []
+    updated_symbols = set()
+    with transaction.atomic():
+        for chunk in _chunks(symbols, batch_size):
+            stocks = list(Stock.objects.filter(symbol__in=chunk).only('symbol', *PRICE_FIELDS))
+            stats['unknown_symbols'] += len(chunk) - len(stocks)
+            changed = []
+            for stock in stocks:
+                tick = latest[stock.symbol]
+                if stock.last_updated and tick['timestamp'] < stock.last_updated:
+                    stats['stale_ticks'] += 1
+                    continue
+                session = local_date(tick['timestamp'])
+                if stock.last_updated is None or local_date(stock.last_updated) < session:
+                    stock.previous_close = _session_close(history, stock, session)
+                    stats['sessions_rotated'] += 1
+                stock.current_price = tick['price']
+                stock.last_updated = tick['timestamp']
+                changed.append(stock)
+            _write_prices(changed)
+            updated_ids.extend(stock.id for stock in changed)
+            updated_symbols.update(stock.symbol for stock in changed)
+        stats['stocks_updated'] = len(updated_ids)
+        stats['apply_seconds'] = time.perf_counter() - started
+
+        revalue_started = time.perf_counter()
+        holdings, portfolios = revalue_stocks(updated_ids, batch_size=batch_size)
+        stats['holdings_revalued'] = holdings
+        stats['portfolios_revalued'] = portfolios
+        stats['revalue_seconds'] = time.perf_counter() - revalue_started
+        if updated_ids:
+            invalidate_all_dashboards()
+            invalidate_quotes()
+            # Every accepted tick, not just the newest per symbol, goes into the history
+            recorded = [tick for tick in ticks if tick['symbol'] in updated_symbols]
+            transaction.on_commit(lambda: history.append_ticks(recorded))
+            transaction.on_commit(lambda: _append_to_feed(recorded))
+            transaction.on_commit(lambda: ticks_applied.send(sender=Stock, ticks=recorded))
+
+    stats['total_seconds'] = time.perf_counter() - started
+    logger.info(
+        'Applied %d ticks to %d stocks; revalued %d holdings and %d portfolios in %.2fs',
+        stats['ticks'], stats['stocks_updated'], stats['holdings_revalued'],
+        stats['portfolios_revalued'], stats['total_seconds']
+    )
+    return stats
+
+
+def revalue_stocks(stock_ids, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Recompute stored Holding and VirtualPortfolio values for the given stocks.
+
+    Runs one UPDATE per batch of stock ids and one per batch of affected
+    portfolios, whatever the number of holdings. Returns
+    (holdings_updated, portfolios_updated).
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    stock_price = Stock.objects.filter(pk=OuterRef('stock_id')).values('current_price')[:1]
+
+    holdings_updated = 0
+    portfolio_ids = set()
+    for chunk in _chunks(list(stock_ids), batch_size):
+        holdings = Holding.objects.filter(stock_id__in=chunk)
+        holdings_updated += holdings.update(
+            current_value=F('quantity') * Subquery(stock_price, output_field=money)
+        )
+        portfolio_ids.update(holdings.values_list('portfolio_id', flat=True).distinct())
+
+    return holdings_updated, revalue_portfolios(portfolio_ids, batch_size=batch_size)
+
+
+def revalue_portfolios(portfolio_ids, batch_size=DEFAULT_BATCH_SIZE):
+    """Recompute stored portfolio value and P&L from their holdings' stored values"""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    holdings_total = Holding.objects.filter(portfolio_id=OuterRef('pk')).order_by().values(
+        'portfolio_id'
+    ).annotate(total=Sum('current_value')).values('total')
+    portfolio_value = Coalesce(Subquery(holdings_total, output_field=money), Value(Decimal('0')), output_field=money)
+
+    portfolio_ids = sorted(portfolio_ids)
+    portfolios_updated = 0
+    for chunk in _chunks(portfolio_ids, batch_size):
+        portfolios_updated += VirtualPortfolio.objects.filter(pk__in=chunk).update(
+            current_value=portfolio_value,
+            profit_loss=portfolio_value - F('total_invested'),
+        )
+    if portfolio_ids:
+        transaction.on_commit(lambda: evaluate_portfolios(portfolio_ids))
+    return portfolios_updated
+
+
+def value_holdings(portfolio):
+    """
+    Value a portfolio's holdings at current prices without writing anything.
+
+    Returns the holdings (with ``stock`` loaded and ``market_value`` /
+    ``profit_loss`` annotations) from a single query, and a dict of portfolio
+    totals derived from them.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    market_value = ExpressionWrapper(F('quantity') * F('stock__current_price'), output_field=money)
+    holdings = list(
+        portfolio.holdings.select_related('stock').annotate(
+            market_value=market_value,
+            profit_loss=ExpressionWrapper(market_value - F('invested_amount'), output_field=money),
+        ).order_by('stock__symbol')
+    )
+    current_value = sum((holding.market_value for holding in holdings), Decimal('0'))
+    totals = {
+        'current_value': current_value,
+        'profit_loss': current_value - portfolio.total_invested,
+        'net_worth': current_value + portfolio.virtual_cash,
+    }
+    return holdings, totals
@@ -0,0 +1,109 @@
+"""
+Quiz grading and attempt limits.
+
+A submission is graded against the quiz's AnswerKey from the content catalog.
+The answers are packed into one letter per question, in question order, and
+compared with the key's string, so grading needs no queries. Each attempt is
+stored as a single QuizAttempt row holding the packed answers.
+
+MAX_QUIZ_ATTEMPTS is enforced by UserProgress.quiz_attempts. That counter
+only goes up through a conditional UPDATE. Of two concurrent submissions
+for the last attempt, exactly one updates the row; the other is rejected.
+The same UPDATE keeps quiz_score at the best percentage so far. A pass is
+paid through award_points once per quiz, however many attempts pass.
+"""
+import logging
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Q, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from main.catalog import get_catalog
+from main.models import QuizAttempt, UserProgress
+from main.points import award_points
+
+logger = logging.getLogger(__name__)
+
+OPTIONS = frozenset('ABCD')
+UNANSWERED = '-'
+
+Result = namedtuple('Result', ['attempt', 'score', 'total', 'percentage', 'passed', 'attempts_left'])
+
+
+class QuizError(Exception):
+    """Raised when a quiz submission cannot be accepted"""
+
+
+class AttemptsExhausted(QuizError):
+    pass
+
+
+def pack_answers(answer_key, data):
+    """Options chosen in ``data`` (e.g. request.POST) as one letter per question"""
+    packed = []
+    for question_id in answer_key.question_ids:
+        answer = (data.get(f'question_{question_id}') or '').upper()
+        packed.append(answer if answer in OPTIONS else UNANSWERED)
+    return ''.join(packed)
+
+
+def grade(answer_key, answers):
+    """Number of packed ``answers`` matching the key"""
+    return sum(answer == correct for answer, correct in zip(answers, answer_key.answers))
+
+
+def attempts_left(user, module_id):
+    """Attempts ``user`` still has at the quiz of a module"""
+    used = UserProgress.objects.filter(user=user, module_id=module_id).values_list(
+        'quiz_attempts', flat=True
+    ).first()
+    return max(settings.PAISABUDDY_SETTINGS['MAX_QUIZ_ATTEMPTS'] - (used or 0), 0)
+
+
+def submit_quiz(user, quiz, data, catalog=None):
+    """
+    Grade and record one attempt at a catalog ``quiz``; returns a Result.
+
+    Raises AttemptsExhausted once MAX_QUIZ_ATTEMPTS attempts were made.
+    """
+    answer_key = (catalog or get_catalog()).answer_keys[quiz.pk]
+    answers = pack_answers(answer_key, data)
+    score = grade(answer_key, answers)
+    total = len(answers)
+    percentage = score / total * 100 if total else 0
+    passed = percentage >= quiz.passing_score
+    limit = settings.PAISABUDDY_SETTINGS['MAX_QUIZ_ATTEMPTS']
+
+    with transaction.atomic():
+        UserProgress.objects.get_or_create(user=user, module_id=quiz.module_id)
+        progress = UserProgress.objects.filter(user=user, module_id=quiz.module_id)
+        counted = progress.filter(quiz_attempts__lt=limit).update(
+            quiz_attempts=F('quiz_attempts') + 1,
+            quiz_score=Greatest(Coalesce('quiz_score', Value(0)), Value(int(percentage))),
+        )
+        if not counted:
+            raise AttemptsExhausted(f'You have used all {limit} attempts at this quiz.')
+        number = progress.values_list('quiz_attempts', flat=True).get()
+        attempt = QuizAttempt.objects.create(
+            user=user, quiz_id=quiz.pk, number=number, answers=answers, score=score,
+            percentage=percentage, passed=passed
+        )
+        if passed:
+            award_points(
+                user, settings.PAISABUDDY_SETTINGS['POINTS_PER_QUIZ'], f'quiz:{quiz.pk}', f'Passed {quiz.title}'
+            )
+
+    logger.debug('Quiz %s attempt %d by user %s scored %d/%d', quiz.pk, number, user.pk, score, total)
+    return Result(attempt, score, total, percentage, passed, limit - number)
+
+
+def quiz_stats(quiz_id):
+    """Attempt, user and pass counts and the average percentage of a quiz, in one query"""
+    return QuizAttempt.objects.filter(quiz_id=quiz_id).aggregate(
+        attempts=Count('pk'),
+        users=Count('user', distinct=True),
+        passed=Count('pk', filter=Q(passed=True)),
+        average=Avg('percentage'),
+    )
@@ -0,0 +1,117 @@
+"""
+Cached quote table for price polling.
+
+Every process keeps the JSON-ready quote of each active stock in memory,
+tagged with the price version it was built at. The version is a stamp in the
+cache backend. Price writes (ticks, Stock saves, seeded universes) replace it
+on commit. A poll reads that one cache key and compares it with the
+client's ETag. An unchanged poll is answered with 304 Not Modified before
+any query or serialisation runs. The table is rebuilt with one query the
+first time a process sees a new version.
+"""
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from main.models import Stock
+
+VERSION_KEY = 'quotes:version'
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_version():
+    """Current price version, shared by all processes"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # First poll after a cold start or eviction; whichever process adds first wins
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_quotes():
+    """Start a new price version once the current transaction commits"""
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, time.time_ns(), None))
+
+
+def _quote(stock_id, symbol, current_price, previous_close):
+    change = current_price - previous_close
+    return {
+        'id': stock_id,
+        'symbol': symbol,
+        'current_price': float(current_price),
+        'previous_close': float(previous_close),
+        'change': float(change),
+        'change_percent': float(change / previous_close * 100) if previous_close else 0.0,
+    }
+
+
+class QuoteTable:
+    """Quotes of all active stocks at one price version"""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.by_id = {}
+        self.ids_by_symbol = {}
+        for stock_id, symbol, current_price, previous_close in rows:
+            self.by_id[stock_id] = _quote(stock_id, symbol, current_price, previous_close)
+            self.ids_by_symbol[symbol.upper()] = stock_id
+
+    @classmethod
+    def build(cls, version):
+        return cls(version, Stock.objects.filter(is_active=True).values_list(
+            'id', 'symbol', 'current_price', 'previous_close'
+        ))
+
+    def lookup(self, ids, symbols):
+        """(quotes in request order, requested ids/symbols that are not active stocks)"""
+        requested = [(stock_id, stock_id) for stock_id in ids]
+        requested += [(symbol, self.ids_by_symbol.get(symbol)) for symbol in symbols]
+        quotes, missing, seen = [], [], set()
+        for key, stock_id in requested:
+            quote = self.by_id.get(stock_id)
+            if quote is None:
+                missing.append(key)
+            elif stock_id not in seen:
+                seen.add(stock_id)
+                quotes.append(quote)
+        return quotes, missing
+
+
+def get_table(version):
+    """This process's QuoteTable, rebuilt when ``version`` is newer"""
+    global _table
+    with _table_lock:
+        if _table is None or _table.version != version:
+            _table = QuoteTable.build(version)
+        return _table
+
+
+def parse_quote_request(params, max_quotes):
+    """
+    Requested (ids, symbols) from ``?ids=1,2&symbols=TCS,INFY``.
+
+    Raises ValueError for malformed ids or more than ``max_quotes`` entries.
+    """
+    try:
+        ids = [int(value) for value in params.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        raise ValueError('ids must be comma separated integers')
+    symbols = [value.strip().upper() for value in params.get('symbols', '').split(',') if value.strip()]
+    if not ids and not symbols:
+        raise ValueError('Pass ids and/or symbols')
+    if len(ids) + len(symbols) > max_quotes:
+        raise ValueError(f'At most {max_quotes} quotes per request')
+    return ids, symbols
+
+
+def quote_etag(version, ids, symbols):
+    """Strong ETag of one batch of quotes at one price version"""
+    request_key = ','.join(map(str, ids)) + '|' + ','.join(symbols)
+    digest = hashlib.blake2b(request_key.encode(), digest_size=8).hexdigest()
+    return f'"{version}-{digest}"'
@@ -0,0 +1,290 @@
+"""
+Red-flag matching for fraud scenario responses.
+
+Text is normalised into lower-case word stems. Phrases listed in SYNONYMS
+fold into one canonical keyword, so "one time password" and "OTP" count as
+the same keyword. Each FraudRedFlag becomes the set of keywords in its
+description, with stop words and generic verbs such as "asks" dropped.
+
+A scenario's flags compile into one Aho-Corasick automaton over words. The
+automaton holds every keyword and all of its synonym phrases, so a single
+pass over a response finds every keyword it mentions. A flag counts as
+spotted when any of its canonical keywords (the keys of SYNONYMS) appears,
+or else when at least FLAG_KEYWORD_SHARE of its keywords appear. A response
+is correct when it spots PASS_SHARE of the scenario's flags.
+
+Compiled matchers are cached per process and per scenario. Saving or
+deleting a flag drops the local matcher. On commit it also bumps the
+scenario's stamp in the cache backend, so other processes recompile on
+their next use. rescore_responses() re-grades stored responses after a
+scenario's flags change.
+"""
+import logging
+import re
+import threading
+import time
+from collections import deque, namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from main.models import FraudRedFlag, FraudScenario, UserFraudProgress
+from main.points import award_points
+
+logger = logging.getLogger(__name__)
+
+STAMP_KEY = 'red_flags:stamp:{scenario_id}'
+PASS_SHARE = 0.6
+FLAG_KEYWORD_SHARE = 0.5
+DEFAULT_BATCH_SIZE = 500
+
+STOP_WORDS = frozenset((
+    'a about also an and any are as at be been by can could do does for from has have he her his i if in '
+    'into is it its just me my of on or our she so some that the their them they this those to us via was '
+    'we were what which who will with would you your '
+    # Generic verbs and nouns that appear in many flags without identifying any
+    'act ask call caller claim create get give make message number person request say sender send sense '
+    'someone tell told use want'
+).split())
+
+# Canonical keyword -> phrases meaning the same thing in a red flag or a response
+SYNONYMS = {
+    'otp': ['one time password', 'one time pin', 'verification code'],
+    'urgent': ['urgency', 'immediately', 'hurry', 'rush', 'right away', 'act now', 'deadline', 'pressure'],
+    'link': ['url', 'hyperlink', 'website address'],
+    'unknown': ['unfamiliar', 'unverified', 'unsolicited', 'stranger', 'random number'],
+    'guarantee': ['guaranteed', 'assured', 'risk free', 'no risk'],
+    'prize': ['lottery', 'jackpot', 'you won', 'winning'],
+    'fee': ['upfront payment', 'advance payment', 'processing charge', 'registration charge'],
+    'password': ['passcode', 'credentials', 'login details'],
+    'threat': ['threaten', 'suspend', 'block', 'legal action', 'arrest'],
+    'kyc': ['know your customer'],
+    'fake': ['spoofed', 'impersonate', 'pretend', 'imposter', 'not genuine'],
+}
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+Score = namedtuple('Score', ['spotted', 'total', 'is_correct'])
+
+
+_VOWEL = re.compile('[aeiouy]')
+
+
+def _stem(word):
+    for suffix in ('ing', 'ed', 'ly', 's'):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix) and not word.endswith(('ss', 'us')):
+            stem = word[:-len(suffix)]
+            # Acronyms such as "sms" have no vowel to keep
+            return stem if _VOWEL.search(stem) else word
+    return word
+
+
+def words(text):
+    """Lower-case word stems of ``text``"""
+    return [_stem(word) for word in _WORD.findall(text.lower())]
+
+
+_STOP_STEMS = frozenset(_stem(word) for word in STOP_WORDS)
+
+
+class Automaton:
+    """Aho-Corasick automaton over word sequences"""
+
+    def __init__(self, patterns):
+        """``patterns`` are (word tuple, output) pairs"""
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for phrase, output in patterns:
+            node = 0
+            for word in phrase:
+                child = self.goto[node].get(word)
+                if child is None:
+                    child = len(self.goto)
+                    self.goto[node][word] = child
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                node = child
+            self.outputs[node].append((output, len(phrase)))
+
+        # Breadth first, so a node's fail target (its longest proper suffix
+        # in the trie) is complete before its children need it
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(word, 0)
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def find(self, tokens):
+        """Yield (end index, output, length) for every pattern occurrence in ``tokens``"""
+        node = 0
+        for index, token in enumerate(tokens):
+            while node and token not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(token, 0)
+            for output, length in self.outputs[node]:
+                yield index, output, length
+
+
+_PHRASES = {
+    _stem(canonical): [tuple(words(canonical))] + [tuple(words(phrase)) for phrase in phrases]
+    for canonical, phrases in SYNONYMS.items()
+}
+_synonyms = Automaton(
+    (phrase, canonical) for canonical, phrases in _PHRASES.items() for phrase in phrases
+)
+
+
+def _longest(matches):
+    """Outputs of the longest matches that don't overlap a longer one"""
+    covered = set()
+    for end, output, length in sorted(matches, key=lambda match: (-match[2], match[0])):
+        span = range(end - length + 1, end + 1)
+        if covered.isdisjoint(span):
+            covered.update(span)
+            yield output, span
+
+
+def flag_keywords(description):
+    """Canonical keywords of a red flag description"""
+    tokens = words(description)
+    keywords, covered = set(), set()
+    for canonical, span in _longest(_synonyms.find(tokens)):
+        keywords.add(canonical)
+        covered.update(span)
+    keywords.update(
+        token for index, token in enumerate(tokens) if index not in covered and token not in _STOP_STEMS
+    )
+    return keywords
+
+
+class RedFlagMatcher:
+    """The red flags of one scenario compiled into a single automaton"""
+
+    def __init__(self, flags):
+        """``flags`` are (flag id, description) pairs"""
+        keywords = {}
+        self.flags = []
+        for flag_id, description in flags:
+            flag = flag_keywords(description)
+            ids = frozenset(keywords.setdefault(keyword, len(keywords)) for keyword in flag)
+            canonical = frozenset(keywords[keyword] for keyword in flag if keyword in _PHRASES)
+            self.flags.append((flag_id, ids, canonical))
+        self.keywords = list(keywords)
+        self.automaton = Automaton(
+            (phrase, index)
+            for keyword, index in keywords.items()
+            for phrase in _PHRASES.get(keyword, [(keyword,)])
+        )
+
+    def __len__(self):
+        return len(self.flags)
+
+    def score(self, text):
+        """Score a response in one pass over its words"""
+        found = {index for index, _ in _longest(self.automaton.find(words(text)))}
+        spotted = [
+            flag_id for flag_id, ids, canonical in self.flags
+            if ids and (canonical & found or len(ids & found) >= FLAG_KEYWORD_SHARE * len(ids))
+        ]
+        return Score(spotted, len(self.flags), len(spotted) >= PASS_SHARE * len(self.flags))
+
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+def get_matcher(scenario_id):
+    """This process's compiled matcher of a scenario, recompiled when its flags changed"""
+    stamp = cache.get(STAMP_KEY.format(scenario_id=scenario_id))
+    entry = _matchers.get(scenario_id)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+    started = time.perf_counter()
+    matcher = RedFlagMatcher(
+        FraudRedFlag.objects.filter(scenario_id=scenario_id).order_by('order', 'pk').values_list('pk', 'description')
+    )
+    with _matchers_lock:
+        _matchers[scenario_id] = (stamp, matcher)
+    logger.debug(
+        'Compiled %d red flags of scenario %s in %.3fs', len(matcher), scenario_id, time.perf_counter() - started
+    )
+    return matcher
+
+
+def score_response(scenario_id, text):
+    return get_matcher(scenario_id).score(text)
+
+
+def _drop_local_matcher(scenario_id):
+    with _matchers_lock:
+        _matchers.pop(scenario_id, None)
+
+
+def invalidate_matcher(scenario_id):
+    """
+    Recompile a scenario's matcher in this process on its next use, and in
+    every other process once the current transaction commits.
+    """
+    def bump():
+        _drop_local_matcher(scenario_id)
+        cache.set(STAMP_KEY.format(scenario_id=scenario_id), time.time(), None)
+
+    _drop_local_matcher(scenario_id)
+    transaction.on_commit(bump)
+
+
+def rescore_responses(scenario_ids=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Re-grade completed responses of all scenarios (or ``scenario_ids``)
+    against their current flags.
+
+    Responses that now pass are awarded the scenario's points; points
+    already awarded are kept. Returns counts of checked, newly correct and
+    newly incorrect responses.
+    """
+    started = time.perf_counter()
+    counts = {'checked': 0, 'now_correct': 0, 'now_incorrect': 0}
+    scenarios = FraudScenario.objects.order_by('pk').only('pk', 'title', 'points_reward')
+    if scenario_ids is not None:
+        scenarios = scenarios.filter(pk__in=scenario_ids)
+    for scenario in scenarios:
+        matcher = get_matcher(scenario.pk)
+        responses = UserFraudProgress.objects.filter(
+            scenario=scenario, is_completed=True
+        ).select_related('user').order_by('pk').only('pk', 'user', 'user_response', 'is_correct')
+        last_pk = 0
+        while True:
+            batch = list(responses.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed = []
+            for progress in batch:
+                is_correct = matcher.score(progress.user_response).is_correct
+                if is_correct != progress.is_correct:
+                    progress.is_correct = is_correct
+                    changed.append(progress)
+            with transaction.atomic():
+                UserFraudProgress.objects.bulk_update(changed, ['is_correct'])
+                for progress in changed:
+                    if progress.is_correct:
+                        award_points(
+                            progress.user, scenario.points_reward, f'fraud_scenario:{scenario.pk}',
+                            f'Solved {scenario.title}'
+                        )
+            counts['checked'] += len(batch)
+            counts['now_correct'] += sum(progress.is_correct for progress in changed)
+            counts['now_incorrect'] += sum(not progress.is_correct for progress in changed)
+
+    logger.info(
+        'Re-scored %d fraud responses (%d now correct, %d now incorrect) in %.2fs',
+        counts['checked'], counts['now_correct'], counts['now_incorrect'], time.perf_counter() - started
+    )
+    return counts
@@ -0,0 +1,165 @@
+"""
+Model signal handlers for the main app.
+
+Connected from MainConfig.ready().
+"""
+from datetime import date
+
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from main.achievements import evaluate_on_commit, invalidate_rules
+from main.catalog import invalidate_catalog
+from main.content import render_fields
+from main.dashboard import invalidate_all_dashboards, invalidate_dashboard
+from main.expense_forecast import refit_on_commit
+from main.expense_summary import (
+    add_to_summary, month_start, refresh_summary_bucket, remove_from_summary, update_summary
+)
+from main.models import (
+    Achievement, BudgetCategory, Expense, ExpenseMonthlySummary, FinancialGoal, FraudRedFlag, FraudScenario,
+    LearningModule, Quiz, QuizQuestion, Stock, UserProfile, UserProgress, VirtualPortfolio
+)
+from main.quotes import invalidate_quotes
+from main.red_flags import invalidate_matcher
+from main.stock_search import invalidate_stock_index
+
+
+def _expense_state(expense):
+    """Normalised (user, date, category, amount) of an expense instance"""
+    return {
+        'user_id': expense.user_id,
+        'date': Expense._meta.get_field('date').to_python(expense.date),
+        'category_id': expense.category_id,
+        'amount': Expense._meta.get_field('amount').to_python(expense.amount),
+    }
+
+
+@receiver(pre_save, sender=Expense)
+def remember_previous_expense(sender, instance, raw=False, **kwargs):
+    """Keep the stored values of an edited expense for the summary update"""
+    instance._summary_previous = None
+    if raw or instance.pk is None:
+        return
+    instance._summary_previous = Expense.objects.filter(pk=instance.pk).values(
+        'user_id', 'date', 'category_id', 'amount'
+    ).first()
+
+
+@receiver(post_save, sender=Expense)
+def update_expense_summary(sender, instance, created, raw=False, **kwargs):
+    """Fold created or edited expenses into ExpenseMonthlySummary"""
+    if raw:
+        return
+    previous = getattr(instance, '_summary_previous', None)
+    current = _expense_state(instance)
+    if created or previous is None:
+        add_to_summary(current['user_id'], current['date'], current['category_id'], current['amount'])
+    else:
+        update_summary(previous, current)
+    evaluate_on_commit('expense_recorded', [current['user_id']])
+
+
+@receiver(post_delete, sender=Expense)
+def remove_expense_summary(sender, instance, **kwargs):
+    """Take deleted expenses out of ExpenseMonthlySummary"""
+    state = _expense_state(instance)
+    remove_from_summary(state['user_id'], state['date'], state['category_id'], state['amount'])
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def refit_expense_forecast(sender, instance, raw=False, **kwargs):
+    """Expenses of completed months are part of the fitted forecast history"""
+    if raw:
+        return
+    previous = getattr(instance, '_summary_previous', None)
+    dates = [_expense_state(instance)['date']] + ([previous['date']] if previous else [])
+    if min(dates) < month_start(timezone.localdate()):
+        refit_on_commit(instance.user_id)
+
+
+@receiver(pre_delete, sender=BudgetCategory)
+def remember_category_summary_months(sender, instance, **kwargs):
+    """Note which months a deleted category had spending in"""
+    instance._summary_months = list(
+        ExpenseMonthlySummary.objects.filter(category=instance).values_list('user_id', 'year', 'month')
+    )
+
+
+@receiver(post_delete, sender=BudgetCategory)
+def refresh_uncategorized_summaries(sender, instance, **kwargs):
+    """Expenses of a deleted category become uncategorized; refresh those rows"""
+    for user_id, year, month in getattr(instance, '_summary_months', []):
+        refresh_summary_bucket(user_id, date(year, month, 1), None)
+
+
+@receiver(post_save, sender=Achievement)
+@receiver(post_delete, sender=Achievement)
+def reload_achievement_rules(sender, **kwargs):
+    """Achievement rules changed; reload them on the next evaluation"""
+    invalidate_rules()
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+@receiver(post_save, sender=FinancialGoal)
+@receiver(post_delete, sender=FinancialGoal)
+@receiver(post_save, sender=UserProgress)
+@receiver(post_delete, sender=UserProgress)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_save, sender=VirtualPortfolio)
+def expire_user_dashboard(sender, instance, raw=False, **kwargs):
+    """Drop the cached dashboard of the user a write belongs to"""
+    if not raw:
+        invalidate_dashboard(instance.user_id)
+
+
+@receiver(pre_save, sender=LearningModule)
+@receiver(pre_save, sender=FraudScenario)
+def render_learning_content(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Store the rendered HTML of new or edited content"""
+    if not raw:
+        render_fields(instance, update_fields)
+
+
+@receiver(post_save, sender=LearningModule)
+@receiver(post_delete, sender=LearningModule)
+def expire_all_dashboards(sender, raw=False, **kwargs):
+    """Module counts changed for everyone"""
+    if not raw:
+        invalidate_all_dashboards()
+
+
+@receiver(post_save, sender=LearningModule)
+@receiver(post_delete, sender=LearningModule)
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+@receiver(post_save, sender=QuizQuestion)
+@receiver(post_delete, sender=QuizQuestion)
+@receiver(post_save, sender=FraudScenario)
+@receiver(post_delete, sender=FraudScenario)
+@receiver(post_save, sender=FraudRedFlag)
+@receiver(post_delete, sender=FraudRedFlag)
+def expire_content_catalog(sender, raw=False, **kwargs):
+    """Rebuild the content catalog with the changed module, quiz or scenario"""
+    if not raw:
+        invalidate_catalog()
+
+
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+def expire_stock_caches(sender, raw=False, **kwargs):
+    """Stock symbols, names, prices or active flags may have changed"""
+    if not raw:
+        invalidate_stock_index()
+        invalidate_quotes()
+
+
+@receiver(post_save, sender=FraudRedFlag)
+@receiver(post_delete, sender=FraudRedFlag)
+def expire_red_flag_matcher(sender, instance, raw=False, **kwargs):
+    """Recompile the scenario's red-flag matcher"""
+    if not raw:
+        invalidate_matcher(instance.scenario_id)
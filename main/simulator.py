@@ -0,0 +1,138 @@
+"""
+Vectorised market simulator.
+
+MarketSimulator moves every active Stock with geometric Brownian motion in
+one NumPy step. The price state is a float64 array. Each step draws one
+market shock, one shock per sector and one idiosyncratic shock per stock,
+and blends them so that any two stocks' returns correlate by
+MARKET_CORRELATION, or by MARKET_CORRELATION + SECTOR_CORRELATION within a
+sector. The new prices become ordinary ticks for main.pricing.apply_ticks,
+so simulated moves are persisted, revalued, recorded in the price history
+and invalidate caches exactly like ingested ones.
+
+Parameters come from PAISABUDDY_SETTINGS['SIMULATOR'] and can be overridden
+per instance. Drift and volatility are annual. TICK_SECONDS of simulated
+market time pass per step, out of TRADING_SECONDS_PER_YEAR.
+"""
+import logging
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from main.models import Stock
+from main.pricing import DEFAULT_BATCH_SIZE, apply_ticks
+
+logger = logging.getLogger(__name__)
+
+# 252 sessions of 6h15m (NSE hours)
+TRADING_SECONDS_PER_YEAR = 252 * 6.25 * 3600
+MIN_PRICE = 0.01
+
+
+class MarketSimulator:
+    """GBM price state of a fixed set of stocks"""
+
+    def __init__(self, symbols, sectors, prices, seed=None, **overrides):
+        config = dict(settings.PAISABUDDY_SETTINGS['SIMULATOR'], **overrides)
+        market, sector = config['MARKET_CORRELATION'], config['SECTOR_CORRELATION']
+        if market < 0 or sector < 0 or market + sector > 1:
+            raise ValueError('Correlations must be non-negative and sum to at most 1')
+
+        self.symbols = list(symbols)
+        sector_names, self.sector_index = np.unique(np.asarray(sectors, dtype=object).astype(str), return_inverse=True)
+        self.sector_names = sector_names.tolist()
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.rng = np.random.default_rng(seed)
+        self.dt = config['TICK_SECONDS'] / TRADING_SECONDS_PER_YEAR
+
+        volatility = np.full(len(self.symbols), float(config['VOLATILITY']))
+        for name, value in config.get('SECTOR_VOLATILITY', {}).items():
+            if name in self.sector_names:
+                volatility[self.sector_index == self.sector_names.index(name)] = value
+        self.drift_term = (config['DRIFT'] - 0.5 * volatility ** 2) * self.dt
+        self.shock_scale = volatility * np.sqrt(self.dt)
+        self.weights = np.sqrt([market, sector, 1 - market - sector])
+
+    @classmethod
+    def from_database(cls, seed=None, **overrides):
+        """Simulator over the active stocks at their current prices"""
+        rows = list(Stock.objects.filter(is_active=True).order_by('symbol').values_list(
+            'symbol', 'sector', 'current_price'
+        ))
+        return cls(
+            [row[0] for row in rows], [row[1] for row in rows], [float(row[2]) for row in rows],
+            seed=seed, **overrides
+        )
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def step(self):
+        """Advance all prices by one tick; returns the new prices rounded to paise"""
+        count = len(self.symbols)
+        market_shock = self.rng.standard_normal()
+        sector_shocks = self.rng.standard_normal(len(self.sector_names))
+        own_shocks = self.rng.standard_normal(count)
+        shocks = (
+            self.weights[0] * market_shock
+            + self.weights[1] * sector_shocks[self.sector_index]
+            + self.weights[2] * own_shocks
+        )
+        self.prices *= np.exp(self.drift_term + self.shock_scale * shocks)
+        np.maximum(self.prices, MIN_PRICE, out=self.prices)
+        return np.round(self.prices, 2)
+
+    def ticks(self, prices, timestamp=None):
+        """Ticks in apply_ticks() form for rounded ``prices``"""
+        timestamp = timestamp or timezone.now()
+        return [
+            {'symbol': symbol, 'price': price, 'timestamp': timestamp}
+            for symbol, price in zip(self.symbols, _decimal_prices(prices))
+        ]
+
+    def run(self, steps=None, interval=1.0, batch_size=None, stop=None):
+        """
+        Step and persist every ``interval`` seconds until ``steps`` ticks are
+        done or ``stop`` (a threading.Event) is set. Runs in the calling
+        thread, so a background loop is ``Thread(target=simulator.run)``.
+
+        Returns the number of steps taken.
+
+        A step that takes longer than ``interval`` (persisting about 10,000
+        stocks takes most of a second on SQLite) is followed by the next one
+        straight away, with a warning: simulated time still advances by
+        TICK_SECONDS per step, but slower than wall-clock time.
+        """
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+        done = 0
+        while (steps is None or done < steps) and not (stop and stop.is_set()):
+            started = time.perf_counter()
+            prices = self.step()
+            stepped = time.perf_counter()
+            ticks = self.ticks(prices)
+            stats = apply_ticks(ticks, batch_size=batch_size)
+            done += 1
+            logger.debug(
+                'Simulated tick %d: step %.1fms, persisted %d stocks in %.1fms',
+                done, (stepped - started) * 1000, stats['stocks_updated'], (time.perf_counter() - stepped) * 1000
+            )
+            remaining = interval - (time.perf_counter() - started)
+            if remaining < 0 and interval:
+                logger.warning(
+                    'Simulated tick %d overran the %.1fs interval by %.1fms', done, interval, -remaining * 1000
+                )
+            elif remaining > 0 and (steps is None or done < steps):
+                if stop:
+                    stop.wait(remaining)
+                else:
+                    time.sleep(remaining)
+        return done
+
+
+def _decimal_prices(prices):
+    # str() of a float rounded to 2 places is its shortest repr, e.g. '101.5'
+    return [Decimal(str(price)) for price in prices.tolist()]
+
@@ -0,0 +1,80 @@
+"""
+Daily portfolio value snapshots.
+
+take_snapshots() values every portfolio's holdings at current prices with
+one set-based query per batch and upserts one PortfolioSnapshot row per
+portfolio for the day. Running it again later the same day (e.g. after each
+price batch) refreshes that day's row, so the last run of a day holds the
+closing values. Performance charts read these rows instead of replaying
+VirtualTransaction history.
+"""
+import logging
+import time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from main.models import Holding, PortfolioSnapshot, VirtualPortfolio
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+FIELDS = ['cash', 'invested', 'market_value', 'net_worth', 'profit_loss']
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def take_snapshots(day=None, portfolio_ids=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Snapshot portfolios (all, or ``portfolio_ids``) for ``day`` (default today).
+
+    Returns (created, updated) row counts.
+    """
+    started = time.perf_counter()
+    day = day or timezone.localdate()
+    money = DecimalField(max_digits=12, decimal_places=2)
+    holdings_value = Holding.objects.filter(portfolio_id=OuterRef('pk')).order_by().values(
+        'portfolio_id'
+    ).annotate(total=Sum(F('quantity') * F('stock__current_price'), output_field=money)).values('total')
+
+    portfolios = VirtualPortfolio.objects.order_by('pk')
+    if portfolio_ids is not None:
+        portfolios = portfolios.filter(pk__in=portfolio_ids)
+    ids = list(portfolios.values_list('pk', flat=True))
+
+    created = updated = 0
+    with transaction.atomic():
+        for chunk in _chunks(ids, batch_size):
+            rows = VirtualPortfolio.objects.filter(pk__in=chunk).annotate(
+                market_value=Coalesce(Subquery(holdings_value, output_field=money), Value(Decimal('0')),
+                                      output_field=money)
+            ).values_list('pk', 'virtual_cash', 'total_invested', 'market_value')
+            existing = dict(
+                PortfolioSnapshot.objects.filter(portfolio_id__in=chunk, date=day).values_list('portfolio_id', 'pk')
+            )
+            new, changed = [], []
+            for portfolio_id, cash, invested, market_value in rows:
+                market_value = Decimal(market_value).quantize(Decimal('0.01'))
+                snapshot = PortfolioSnapshot(
+                    pk=existing.get(portfolio_id), portfolio_id=portfolio_id, date=day,
+                    cash=cash, invested=invested, market_value=market_value,
+                    net_worth=cash + market_value, profit_loss=market_value - invested,
+                    updated_at=timezone.now(),
+                )
+                (changed if snapshot.pk else new).append(snapshot)
+            PortfolioSnapshot.objects.bulk_create(new, batch_size=batch_size)
+            PortfolioSnapshot.objects.bulk_update(changed, FIELDS + ['updated_at'], batch_size=batch_size)
+            created += len(new)
+            updated += len(changed)
+
+    logger.info(
+        'Snapshotted %d portfolios for %s (%d new, %d refreshed) in %.2fs',
+        created + updated, day, created, updated, time.perf_counter() - started
+    )
+    return created, updated
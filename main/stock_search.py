@@ -0,0 +1,177 @@
+"""
+In-memory search index over active stocks.
+
+The index keeps the active stocks' symbols, normalised company names and
+company name words in sorted arrays. Sorted arrays serve as a compact prefix
+trie: all keys with a given prefix form one contiguous slice found with two
+bisects. Matches are produced lazily in rank order (exact symbol, symbol
+prefix, company name prefix, then company name words), so an autocomplete
+lookup stops after ``limit`` results and never touches the database.
+
+Each process builds its index lazily. Stock saves and deletes drop the local
+index and, on commit, bump a stamp in the cache backend. Other processes check that stamp
+at most once every STAMP_CHECK_INTERVAL seconds and rebuild when it changes.
+Code that writes Stock rows in bulk calls invalidate_stock_index() itself.
+"""
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import transaction
+
+from main.models import Stock
+
+logger = logging.getLogger(__name__)
+
+STAMP_KEY = 'stock_search:stamp'
+STAMP_CHECK_INTERVAL = 1.0
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+_WORD = re.compile(r'[a-z0-9]+')
+# Sorts after every character a key can contain
+_PREFIX_END = '\uffff'
+
+
+def tokenize(text):
+    """Lower-case alphanumeric words of ``text``"""
+    return _WORD.findall(text.lower())
+
+
+def _prefix_range(keys, prefix):
+    return bisect_left(keys, prefix), bisect_left(keys, prefix + _PREFIX_END)
+
+
+class StockIndex:
+    """Immutable snapshot of the active stocks, searchable by prefix"""
+
+    def __init__(self, rows):
+        # (id, symbol, company_name, sector), ordered by symbol
+        self.entries = sorted(rows, key=lambda row: row[1])
+        self.ids = [entry[0] for entry in self.entries]
+        self.symbols = [entry[1].lower() for entry in self.entries]
+        self.words = [tokenize(entry[2]) for entry in self.entries]
+
+        # Symbols bucketed by length, so prefix matches come out shortest first
+        by_length = {}
+        for position, symbol in enumerate(self.symbols):
+            by_length.setdefault(len(symbol), []).append((symbol, position))
+        self.symbols_by_length = [
+            ([symbol for symbol, _ in bucket], [position for _, position in bucket])
+            for _, bucket in sorted(by_length.items())
+        ]
+        names = sorted((' '.join(words), position) for position, words in enumerate(self.words))
+        self.names = [name for name, _ in names]
+        self.name_positions = [position for _, position in names]
+        tokens = sorted(
+            (token, position)
+            for position, words in enumerate(self.words)
+            for token in set(words)
+        )
+        self.tokens = [token for token, _ in tokens]
+        self.token_positions = [position for _, position in tokens]
+
+    @classmethod
+    def build(cls):
+        return cls(Stock.objects.filter(is_active=True).values_list('id', 'symbol', 'company_name', 'sector'))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _symbol_matches(self, prefix):
+        for keys, positions in self.symbols_by_length:
+            lo, hi = _prefix_range(keys, prefix)
+            yield from positions[lo:hi]
+
+    def _name_matches(self, phrase):
+        lo, hi = _prefix_range(self.names, phrase)
+        yield from self.name_positions[lo:hi]
+
+    def _word_matches(self, words):
+        ranges = [_prefix_range(self.tokens, word) for word in words]
+        # Walk the rarest word's matches and check the others on the entry
+        lo, hi = min(ranges, key=lambda bounds: bounds[1] - bounds[0])
+        for position in self.token_positions[lo:hi]:
+            tokens = self.words[position]
+            if all(any(token.startswith(word) for token in tokens) for word in words):
+                yield position
+
+    def _matches(self, query):
+        """
+        Positions matching ``query``, best first: symbol prefix (shortest
+        symbol first, so an exact symbol leads), company name prefix, then
+        every query word starting some word of the company name.
+        """
+        words = tokenize(query)
+        if not words:
+            return
+        symbol = query.strip().lower()
+        seen = set()
+        streams = [self._name_matches(' '.join(words)), self._word_matches(words)]
+        if ' ' not in symbol:
+            streams.insert(0, self._symbol_matches(symbol))
+        for stream in streams:
+            for position in stream:
+                if position not in seen:
+                    seen.add(position)
+                    yield position
+
+    def search(self, query, limit=None):
+        """Stock ids matching ``query``, best first; all active stocks for a blank query"""
+        if not query.strip():
+            return self.ids[:limit]
+        return [self.ids[position] for position in islice(self._matches(query), limit)]
+
+    def suggest(self, query, limit=AUTOCOMPLETE_LIMIT):
+        """JSON-ready autocomplete entries for ``query``"""
+        return [
+            {'id': entry[0], 'symbol': entry[1], 'company_name': entry[2], 'sector': entry[3]}
+            for entry in (self.entries[position] for position in islice(self._matches(query), limit))
+        ]
+
+
+_index = None
+_index_stamp = None
+_stamp_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """This process's StockIndex, rebuilt when stocks changed"""
+    global _index, _index_stamp, _stamp_checked_at
+    with _index_lock:
+        now = time.monotonic()
+        if _index is not None and now - _stamp_checked_at < STAMP_CHECK_INTERVAL:
+            return _index
+        stamp = cache.get(STAMP_KEY)
+        _stamp_checked_at = now
+        if _index is None or stamp != _index_stamp:
+            started = time.perf_counter()
+            _index = StockIndex.build()
+            _index_stamp = stamp
+            logger.debug('Built stock search index of %d stocks in %.3fs', len(_index), time.perf_counter() - started)
+        return _index
+
+
+def _drop_local_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def _bump_stamp():
+    _drop_local_index()
+    cache.set(STAMP_KEY, time.time(), None)
+
+
+def invalidate_stock_index():
+    """
+    Rebuild this process's index on its next use, and every other process's
+    once the current transaction commits.
+    """
+    _drop_local_index()
+    transaction.on_commit(_bump_stamp)
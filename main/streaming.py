@@ -0,0 +1,412 @@
+"""
+Server-Sent Events price stream.
+
+Django 3.2 cannot stream from async views, so the stream is served by
+``price_stream``, a small ASGI application that paisabuddy/asgi.py mounts
+at STREAM_PATH next to Django. Each worker process has one
+PriceBroadcaster. It reads the price feed once and fans every batch out to
+the subscribed connections, which are indexed by symbol. Idle watchers are
+coroutines waiting on an event. They cost no CPU between ticks and run no
+queries apart from a periodic refresh of the watcher's holdings.
+
+A connection receives:
+
+* ``snapshot``: the current quotes of its symbols and the portfolio totals;
+* ``prices``: quotes that changed since the last message;
+* ``portfolio``: new portfolio value and P&L with the P&L change, whenever
+  a held stock moved.
+
+Updates for a slow client are coalesced per symbol rather than queued.
+
+The feed is a FileFeed tailing PAISABUDDY_SETTINGS['PRICE_FEED_FILE'], a
+JSON-lines file of ``{"symbol", "price", "timestamp"}`` ticks that
+main.pricing.apply_ticks() appends to in whichever process applies them
+(ingest_prices, simulate_market). With PRICE_FEED_FILE empty it is the
+in-process MemoryFeed, which only sees ticks applied by the ASGI worker
+itself; a warning says so when the stream starts. Holdings are reloaded
+every STREAM_PORTFOLIO_REFRESH_SECONDS, however busy the feed is.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import threading
+import time
+from http.cookies import SimpleCookie
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from main.models import Holding, VirtualPortfolio
+from main.pricing import TickError, read_ticks, ticks_applied
+from main.quotes import get_table as get_quote_table, get_version as get_quote_version
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/stream/prices/'
+RETRY_MS = 5000
+
+
+class MemoryFeed:
+    """In-process price source; publish() may be called from any thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners = set()
+
+    def publish(self, ticks):
+        with self._lock:
+            listeners = list(self._listeners)
+        for loop, queue in listeners:
+            loop.call_soon_threadsafe(queue.put_nowait, list(ticks))
+
+    async def batches(self):
+        listener = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._listeners.add(listener)
+        try:
+            while True:
+                yield await listener[1].get()
+        finally:
+            with self._lock:
+                self._listeners.discard(listener)
+
+
+class FileFeed:
+    """Ticks appended to a JSON-lines file, polled every ``interval`` seconds"""
+
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.interval = interval
+
+    def _read_new(self, offset):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return [], 0
+        if size < offset:
+            # Truncated or replaced; start over
+            offset = 0
+        if size == offset:
+            return [], offset
+        with open(self.path, 'rb') as stream:
+            stream.seek(offset)
+            data = stream.read(size - offset)
+        # A half-written last line is read on the next poll
+        complete = data.rfind(b'\n') + 1
+        try:
+            ticks = read_ticks(io.StringIO(data[:complete].decode()), 'jsonl')
+        except (TickError, ValueError) as e:
+            logger.warning('Skipping bad ticks in %s: %s', self.path, e)
+            ticks = []
+        return ticks, offset + complete
+
+    async def batches(self):
+        try:
+            offset = os.path.getsize(self.path)
+        except OSError:
+            offset = 0
+        while True:
+            await asyncio.sleep(self.interval)
+            # File reads block; keep them off the event loop
+            ticks, offset = await sync_to_async(self._read_new, thread_sensitive=False)(offset)
+            if ticks:
+                yield ticks
+
+
+memory_feed = MemoryFeed()
+
+
+@receiver(ticks_applied)
+def publish_applied_ticks(sender, ticks, **kwargs):
+    """Feed ticks committed in this process to its open streams"""
+    memory_feed.publish(ticks)
+
+
+def configured_feed():
+    feed_file = settings.PAISABUDDY_SETTINGS.get('PRICE_FEED_FILE')
+    if feed_file:
+        return FileFeed(feed_file, settings.PAISABUDDY_SETTINGS.get('PRICE_FEED_POLL_INTERVAL', 1.0))
+    logger.warning(
+        'PRICE_FEED_FILE is not set; the price stream only sees ticks applied in this process'
+    )
+    return memory_feed
+
+
+class Subscription:
+    """One connection's pending quotes, coalesced by symbol"""
+
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def push(self, quote):
+        self.pending[quote['symbol']] = quote
+        self.ready.set()
+
+    async def next(self, timeout):
+        """Quotes received since the last call, or {} after ``timeout`` seconds"""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        self.ready.clear()
+        pending, self.pending = self.pending, {}
+        return pending
+
+
+class PriceBroadcaster:
+    """Reads the feed once per worker and fans quotes out to subscriptions"""
+
+    def __init__(self, feed):
+        self.feed = feed
+        self.by_symbol = {}
+        self.everything = set()
+        self.task = None
+
+    def __len__(self):
+        return len(self.everything) + len({
+            subscription for subscriptions in self.by_symbol.values() for subscription in subscriptions
+        })
+
+    def subscribe(self, symbols=None):
+        """Subscription to ``symbols`` (every symbol when None)"""
+        subscription = Subscription(symbols)
+        if symbols is None:
+            self.everything.add(subscription)
+        else:
+            for symbol in symbols:
+                self.by_symbol.setdefault(symbol, set()).add(subscription)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription.symbols is None:
+            self.everything.discard(subscription)
+        else:
+            for symbol in subscription.symbols:
+                subscribers = self.by_symbol.get(symbol)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.by_symbol[symbol]
+        if not self.everything and not self.by_symbol and self.task is not None:
+            # Nobody is watching; stop reading the feed until someone is
+            self.task.cancel()
+            self.task = None
+
+    def publish(self, ticks):
+        """Deliver the newest tick of each symbol to its subscriptions"""
+        for tick in ticks:
+            quote = {
+                'symbol': tick['symbol'],
+                'price': float(tick['price']),
+                'timestamp': tick['timestamp'].isoformat(),
+            }
+            for subscription in self.by_symbol.get(tick['symbol'], ()):
+                subscription.push(quote)
+            for subscription in self.everything:
+                subscription.push(quote)
+
+    async def _run(self):
+        try:
+            async for ticks in self.feed.batches():
+                self.publish(ticks)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('Price feed failed; the next subscriber restarts it')
+
+
+_broadcaster = None
+
+
+def get_broadcaster():
+    """This worker's PriceBroadcaster"""
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = PriceBroadcaster(configured_feed())
+    return _broadcaster
+
+
+def _session_user(scope):
+    cookies = SimpleCookie()
+    for name, value in scope.get('headers', ()):
+        if name == b'cookie':
+            cookies.load(value.decode('latin-1'))
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+    engine = import_string(settings.SESSION_ENGINE + '.SessionStore')
+    # get_user() only needs request.session; it also checks the session auth hash
+    user = get_user(SimpleNamespace(session=engine(morsel.value)))
+    return user if user.is_authenticated else None
+
+
+def _portfolio_state(user_id):
+    """Invested total and {symbol: quantity} of a user's portfolio"""
+    portfolio = VirtualPortfolio.objects.filter(user_id=user_id).values('id', 'total_invested').first()
+    if portfolio is None:
+        return None
+    return {
+        'total_invested': float(portfolio['total_invested']),
+        'holdings': dict(
+            Holding.objects.filter(portfolio_id=portfolio['id'], quantity__gt=0).values_list(
+                'stock__symbol', 'quantity'
+            )
+        ),
+    }
+
+
+class PriceStream:
+    """State of one SSE connection"""
+
+    def __init__(self, user_id, requested):
+        self.user_id = user_id
+        self.requested = requested
+        self.quotes = {}
+        self.previous_close = {}
+        self.portfolio = None
+        self.profit_loss = None
+        self.refreshed_at = 0.0
+
+    def load(self):
+        """Holdings and starting quotes; runs in a thread"""
+        self.portfolio = _portfolio_state(self.user_id)
+        table = get_quote_table(get_quote_version())
+        symbols = self.symbols()
+        for quote in table.by_id.values():
+            if symbols is None or quote['symbol'] in symbols:
+                self.quotes[quote['symbol']] = quote['current_price']
+                self.previous_close[quote['symbol']] = quote['previous_close']
+        self.refreshed_at = time.monotonic()
+
+    def symbols(self):
+        """Requested symbols, else held ones, else None for every symbol"""
+        if self.requested:
+            return set(self.requested)
+        if self.portfolio and self.portfolio['holdings']:
+            return set(self.portfolio['holdings'])
+        return None
+
+    def price_event(self, quote):
+        previous_close = self.previous_close.get(quote['symbol'])
+        change = quote['price'] - previous_close if previous_close else 0.0
+        return dict(
+            quote,
+            change=round(change, 2),
+            change_percent=round(change / previous_close * 100, 2) if previous_close else 0.0,
+        )
+
+    def portfolio_event(self):
+        if not self.portfolio:
+            return None
+        current_value = sum(
+            quantity * self.quotes.get(symbol, 0.0) for symbol, quantity in self.portfolio['holdings'].items()
+        )
+        profit_loss = current_value - self.portfolio['total_invested']
+        delta = 0.0 if self.profit_loss is None else profit_loss - self.profit_loss
+        self.profit_loss = profit_loss
+        return {
+            'current_value': round(current_value, 2),
+            'profit_loss': round(profit_loss, 2),
+            'profit_loss_delta': round(delta, 2),
+        }
+
+
+def _event(name, data):
+    return f'event: {name}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+
+async def _respond(send, status, text):
+    await send({
+        'type': 'http.response.start', 'status': status,
+        'headers': [(b'content-type', b'text/plain; charset=utf-8')],
+    })
+    await send({'type': 'http.response.body', 'body': text.encode()})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def price_stream(scope, receive, send):
+    """ASGI application for ``GET STREAM_PATH?symbols=TCS,INFY``"""
+    if scope['method'] != 'GET':
+        return await _respond(send, 405, 'GET required')
+    user = await sync_to_async(_session_user)(scope)
+    if user is None:
+        return await _respond(send, 403, 'Login required')
+
+    params = parse_qs(scope.get('query_string', b'').decode())
+    requested = [
+        symbol.strip().upper()
+        for value in params.get('symbols', []) for symbol in value.split(',') if symbol.strip()
+    ]
+    stream = PriceStream(user.pk, requested)
+    await sync_to_async(stream.load)()
+
+    heartbeat = settings.PAISABUDDY_SETTINGS.get('STREAM_HEARTBEAT_SECONDS', 15)
+    refresh = settings.PAISABUDDY_SETTINGS.get('STREAM_PORTFOLIO_REFRESH_SECONDS', 120)
+    broadcaster = get_broadcaster()
+    subscription = broadcaster.subscribe(stream.symbols())
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start', 'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Keep nginx from buffering the stream
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        snapshot = {
+            'quotes': [
+                stream.price_event({'symbol': symbol, 'price': price, 'timestamp': None})
+                for symbol, price in sorted(stream.quotes.items())
+            ],
+            'portfolio': stream.portfolio_event(),
+        }
+        await send({
+            'type': 'http.response.body',
+            'body': f'retry: {RETRY_MS}\n\n'.encode() + _event('snapshot', snapshot),
+            'more_body': True,
+        })
+
+        while not disconnected.done():
+            update = asyncio.ensure_future(subscription.next(heartbeat))
+            await asyncio.wait({update, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                update.cancel()
+                break
+            quotes = update.result()
+            if not quotes:
+                body = b': keepalive\n\n'
+            else:
+                for symbol, quote in quotes.items():
+                    stream.quotes[symbol] = quote['price']
+                body = _event('prices', [stream.price_event(quote) for quote in quotes.values()])
+                if stream.portfolio and stream.portfolio['holdings'].keys() & quotes.keys():
+                    body += _event('portfolio', stream.portfolio_event())
+            if time.monotonic() - stream.refreshed_at > refresh:
+                # Pick up trades made since the stream started
+                await sync_to_async(stream.load)()
+                # Subscribe before unsubscribing, so the feed task keeps running
+                previous, subscription = subscription, broadcaster.subscribe(stream.symbols())
+                broadcaster.unsubscribe(previous)
+                if stream.portfolio:
+                    body += _event('portfolio', stream.portfolio_event())
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        broadcaster.unsubscribe(subscription)
+        disconnected.cancel()
@@ -1,3 +1,1787 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from main.achievements import evaluate, get_rules
+from main.benchmark import compare_results, run_benchmarks, uncovered_routes
+from main import catalog as content_catalog
+from main.catalog import get_catalog
+from main.content import render_stale, rendered_html, sanitize
+from main.dashboard import DashboardContext
+from main.expense_forecast import (
+    fit, fit_forecasts, get_forecasts as get_expense_forecasts, month_from_index, month_index, predict
+)
+from main.expense_summary import rebuild_expense_summaries
+from main.leaderboard import get_snapshot, invalidate_leaderboard, rank_for_points
+from main.load_data import generate_load_data
+from main import metrics
+from main.models import (
+    User, UserProfile, Achievement, Budget, BudgetCategory, Expense, ExpenseForecast, ExpenseMonthlySummary,
+    FinancialGoal, FraudRedFlag, FraudScenario, Holding, LearningModule, PointsLedger, PortfolioSnapshot, Quiz,
+    QuizAttempt, QuizQuestion, Stock, UserAchievement, UserFraudProgress, UserProgress, VirtualPortfolio, VirtualTransaction
+)
+from main.points import award_points, reconcile_points
+from main import analytics
+from main.price_history import PriceHistory, get_store as get_price_history, to_micros
+from main.pricing import apply_ticks, read_ticks
+from main.quizzes import AttemptsExhausted, quiz_stats, submit_quiz
+from main.red_flags import Automaton, flag_keywords, get_matcher, rescore_responses, words
+from main.simulator import MarketSimulator
+from main.snapshots import take_snapshots
+from main.stock_search import StockIndex, get_index as get_stock_index
+from main.streaming import FileFeed, PriceBroadcaster, configured_feed, memory_feed, price_stream
+from main.trading import InsufficientFunds, InsufficientShares, TradeError, TradeService
+
+def use_temp_price_history(test):
+    """Point PRICE_HISTORY_DIR and PRICE_FEED_FILE into a directory removed after ``test``"""
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    override = override_settings(
+        PAISABUDDY_SETTINGS=dict(
+            settings.PAISABUDDY_SETTINGS,
+            PRICE_HISTORY_DIR=directory.name,
+            PRICE_FEED_FILE=os.path.join(directory.name, 'price_feed.jsonl'),
+        )
+    )
+    override.enable()
+    test.addCleanup(override.disable)
+    return directory.name
+
+
+# Minimal stand-ins for templates the views render, so tests exercise the view
+# logic without depending on the full front-end.
+TEST_TEMPLATES = [{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'OPTIONS': {
+        'loaders': [
+            ('django.template.loaders.locmem.Loader', {
+                'budget_analysis.html': '{{ total_monthly_expenses }}',
+                'profile.html': '{% for holding in holdings %}{{ holding.stock.symbol }}{% endfor %}',
+                'leaderboard.html': '{% for row in top_users %}{{ row.username }}{% endfor %}',
+                'achievements.html': '{{ achievements|join:"," }}',
+                'dashboard.html': '{{ monthly_expenses }}',
+                'stocks.html': '{% for stock in page_obj %}{{ stock.symbol }} {% endfor %}',
+                'scenario_detail.html': '{{ progress.is_correct }}',
+                'module_detail.html': '{{ content_html }}',
+                'modules.html': '{% for module in modules %}{{ module.title }} {% endfor %}',
+                'quiz.html': '{{ attempts_left }}',
+            }),
+        ],
+    },
+}]
+
+
+@override_settings(TEMPLATES=TEST_TEMPLATES)
+class BudgetAnalysisQueryCountTests(TestCase):
+    """budget_analysis must cost the same number of queries for any month"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='saver', password='pass12345')
+        budget = Budget.objects.create(
+            user=cls.user, name='Yearly', total_amount=Decimal('50000'),
+            start_date=date(2024, 1, 1), end_date=date(2024, 12, 31)
+        )
+        food = BudgetCategory.objects.create(
+            budget=budget, name='Food & Dining', allocated_amount=Decimal('3000')
+        )
+        travel = BudgetCategory.objects.create(
+            budget=budget, name='Travel', allocated_amount=Decimal('2000')
+        )
+        # A busy March: several expenses on every day of the month
+        day = date(2024, 3, 1)
+        expenses = []
+        while day.month == 3:
+            for category in (food, travel, None):
+                expenses.append(Expense(
+                    user=cls.user, category=category, description='Spend',
+                    amount=Decimal('12.50'), date=day
+                ))
+            day += timedelta(days=1)
+        Expense.objects.bulk_create(expenses)
+        # bulk_create skips model signals, so build the summary table explicitly
+        rebuild_expense_summaries()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _count_queries(self, month, year=2024):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('budget_analysis'), {'month': month, 'year': year})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_query_count_is_independent_of_selected_month(self):
+        busy_count, response = self._count_queries(3)
+        quiet_count, _ = self._count_queries(7)
+        self.assertEqual(busy_count, quiet_count)
+        self.assertLessEqual(busy_count, 10)
+        self.assertEqual(response.context['total_monthly_expenses'], Decimal('1162.50'))
+
+    def test_daily_and_category_totals(self):
+        _, response = self._count_queries(3)
+        daily = response.context['daily_expenses']
+        self.assertEqual(len(daily), 31)
+        self.assertTrue(all(entry['amount'] == 37.5 for entry in daily))
+        spent = {row['category']: row['spent'] for row in response.context['budget_analysis_data']}
+        self.assertEqual(spent, {'Food & Dining': 387.5, 'Travel': 387.5})
+        self.assertEqual(len(response.context['monthly_comparison']), 6)
+
+
+class ExpenseMonthlySummaryTests(TestCase):
+    """Summary rows track Expense creates, edits and deletes"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tracker', password='pass12345')
+        budget = Budget.objects.create(
+            user=self.user, name='Monthly', total_amount=Decimal('5000'),
+            start_date=date(2024, 1, 1), end_date=date(2024, 12, 31)
+        )
+        self.food = BudgetCategory.objects.create(
+            budget=budget, name='Food & Dining', allocated_amount=Decimal('3000')
+        )
+
+    def _summary(self, month, category=None):
+        return ExpenseMonthlySummary.objects.get(
+            user=self.user, year=2024, month=month, category=category
+        )
+
+    def _expense(self, amount, day, category=None):
+        return Expense.objects.create(
+            user=self.user, category=category, description='Spend',
+            amount=Decimal(amount), date=day
+        )
+
+    def test_create_edit_delete(self):
+        small = self._expense('10.00', date(2024, 3, 2), self.food)
+        large = self._expense('90.00', date(2024, 3, 5), self.food)
+        self._expense('50.00', date(2024, 3, 9), self.food)
+        summary = self._summary(3, self.food)
+        self.assertEqual(
+            (summary.total_amount, summary.expense_count, summary.min_amount, summary.max_amount),
+            (Decimal('150.00'), 3, Decimal('10.00'), Decimal('90.00'))
+        )
+
+        large.amount = Decimal('40.00')
+        large.save()
+        summary = self._summary(3, self.food)
+        self.assertEqual((summary.total_amount, summary.max_amount), (Decimal('100.00'), Decimal('50.00')))
+
+        small.date = date(2024, 4, 1)
+        small.category = None
+        small.save()
+        self.assertEqual(self._summary(3, self.food).min_amount, Decimal('40.00'))
+        self.assertEqual(self._summary(4).total_amount, Decimal('10.00'))
+
+        small.delete()
+        self.assertFalse(ExpenseMonthlySummary.objects.filter(user=self.user, month=4).exists())
+
+    def test_deleting_category_folds_into_uncategorized(self):
+        self._expense('25.00', date(2024, 3, 2), self.food)
+        self._expense('5.00', date(2024, 3, 3))
+        self.food.delete()
+        summary = self._summary(3)
+        self.assertEqual((summary.total_amount, summary.expense_count), (Decimal('30.00'), 2))
+
+    def test_one_uncategorized_row_per_month(self):
+        self._expense('5.00', date(2024, 3, 3))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ExpenseMonthlySummary.objects.create(
+                user=self.user, year=2024, month=3, total_amount=1, expense_count=1, min_amount=1, max_amount=1
+            )
+
+    def test_rebuild_matches_incremental(self):
+        for day in range(1, 20):
+            self._expense(f'{day}.50', date(2024, 2, day), self.food if day % 2 else None)
+        incremental = sorted(ExpenseMonthlySummary.objects.values_list(
+            'year', 'month', 'category_id', 'total_amount', 'expense_count', 'min_amount', 'max_amount'
+        ), key=str)
+        self.assertEqual(rebuild_expense_summaries(), 2)
+        rebuilt = sorted(ExpenseMonthlySummary.objects.values_list(
+            'year', 'month', 'category_id', 'total_amount', 'expense_count', 'min_amount', 'max_amount'
+        ), key=str)
+        self.assertEqual(incremental, rebuilt)
+
+
+class PriceTickIngestionTests(TestCase):
+    """Ticks update Stock prices and revalue holdings with set-based updates"""
+
+    def setUp(self):
+        self.stock = Stock.objects.create(
+            symbol='INFY', company_name='Infosys', sector='IT',
+            current_price=Decimal('100.00'), previous_close=Decimal('95.00')
+        )
+        user = User.objects.create_user(username='investor', password='pass12345')
+        self.portfolio = VirtualPortfolio.objects.create(user=user, total_invested=Decimal('1000.00'))
+        Holding.objects.create(
+            portfolio=self.portfolio, stock=self.stock, quantity=10,
+            average_price=Decimal('100.00'), invested_amount=Decimal('1000.00')
+        )
+
+    def _tick(self, price, when):
+        stream = io.StringIO(f'symbol,price,timestamp\ninfy,{price},{when.isoformat()}\n')
+        return apply_ticks(read_ticks(stream))
+
+    def test_ticks_rotate_previous_close_and_revalue(self):
+        tomorrow = timezone.localtime() + timedelta(days=1)
+        stats = self._tick('110.00', tomorrow)
+        self.assertEqual((stats['sessions_rotated'], stats['portfolios_revalued']), (1, 1))
+        self.stock.refresh_from_db()
+        self.assertEqual((self.stock.current_price, self.stock.previous_close), (Decimal('110.00'), Decimal('100.00')))
+
+        # A second tick in the same session keeps previous_close
+        self._tick('120.00', tomorrow + timedelta(minutes=5))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.previous_close, Decimal('100.00'))
+
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.current_value, Decimal('1200.00'))
+        self.assertEqual(self.portfolio.profit_loss, Decimal('200.00'))
+
+    @override_settings(TEMPLATES=TEST_TEMPLATES)
+    def test_portfolio_view_values_holdings_without_writes(self):
+        Stock.objects.filter(pk=self.stock.pk).update(current_price=Decimal('150.00'))
+        self.client.force_login(self.portfolio.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('portfolio_view'))
+        writes = [
+            query['sql'] for query in ctx.captured_queries
+            if query['sql'].startswith(('UPDATE "main_', 'INSERT INTO "main_', 'DELETE FROM "main_'))
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(response.context['portfolio_value'], Decimal('1500.00'))
+        self.assertEqual(response.context['holdings'][0].profit_loss, Decimal('500.00'))
+
+    def test_portfolio_page_shows_live_value(self):
+        Stock.objects.filter(pk=self.stock.pk).update(current_price=Decimal('150.00'))
+        self.client.force_login(self.portfolio.user)
+        response = self.client.get(reverse('portfolio_view'))
+        # The stored current_value is still 0 until the price path revalues it
+        self.assertContains(response, '<h3>1500</h3>', html=False)
+        self.assertContains(response, 'P&amp;L 500')
+
+    def test_prices_are_written_in_one_statement_per_batch(self):
+        for number in range(5):
+            Stock.objects.create(
+                symbol=f'S{number}', company_name=f'S{number}', sector='IT',
+                current_price=Decimal('10.00'), previous_close=Decimal('10.00')
+            )
+        when = timezone.now()
+        ticks = [{'symbol': f'S{number}', 'price': Decimal(f'2{number}.50'), 'timestamp': when} for number in range(5)]
+        with override_settings(DEBUG=True), CaptureQueriesContext(connection) as ctx:
+            apply_ticks(ticks, batch_size=2)
+        writes = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('UPDATE "main_stock"')]
+        self.assertEqual(len(writes), 3)
+        prices = Stock.objects.filter(symbol__startswith='S').order_by('symbol').values_list('current_price', flat=True)
+        self.assertEqual(list(prices), [Decimal(f'2{number}.50') for number in range(5)])
+
+        # Backends without UPDATE ... FROM fall back to bulk_update()
+        with mock.patch('main.pricing._supports_update_from', return_value=False):
+            apply_ticks([dict(tick, price=Decimal('1.25'), timestamp=when + timedelta(seconds=1)) for tick in ticks])
+        prices = Stock.objects.filter(symbol__startswith='S').values_list('current_price', flat=True)
+        self.assertEqual(set(prices), {Decimal('1.25')})
+        self.assertEqual(Stock.objects.get(symbol='S0').last_updated, when + timedelta(seconds=1))
+
+    def test_stale_ticks_are_ignored(self):
+        stats = self._tick('50.00', timezone.localtime() - timedelta(days=1))
+        self.assertEqual(stats['stale_ticks'], 1)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.current_price, Decimal('100.00'))
+
+
+class TradeServiceTests(TestCase):
+    """Single-threaded trade rules"""
+
+    def setUp(self):
+        user = User.objects.create_user(username='trader', password='pass12345')
+        self.portfolio = VirtualPortfolio.objects.create(user=user, virtual_cash=Decimal('1000.00'))
+        self.stock = Stock.objects.create(
+            symbol='TCS', company_name='Tata Consultancy', sector='IT',
+            current_price=Decimal('100.00'), previous_close=Decimal('100.00')
+        )
+        self.service = TradeService(self.portfolio)
+
+    def test_buy_then_sell_updates_cash_and_cost_basis(self):
+        self.service.buy(self.stock, 4)
+        self.stock.current_price = Decimal('150.00')
+        self.service.buy(self.stock, 2)
+        holding = Holding.objects.get(portfolio=self.portfolio, stock=self.stock)
+        self.assertEqual((holding.quantity, holding.average_price), (6, Decimal('116.67')))
+
+        self.service.sell(self.stock, 6)
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.virtual_cash, Decimal('1200.00'))
+        self.assertFalse(Holding.objects.filter(portfolio=self.portfolio).exists())
+
+    def test_rejected_orders_change_nothing(self):
+        with self.assertRaises(InsufficientFunds):
+            self.service.buy(self.stock, 11)
+        with self.assertRaises(InsufficientShares):
+            self.service.sell(self.stock, 1)
+        with self.assertRaises(TradeError):
+            self.service.execute(self.stock, 'short', 1)
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.virtual_cash, Decimal('1000.00'))
+        self.assertFalse(VirtualTransaction.objects.exists())
+
+    def test_idempotency_key_deduplicates(self):
+        first, created = self.service.buy(self.stock, 1, idempotency_key='order-1')
+        again, created_again = self.service.buy(self.stock, 1, idempotency_key='order-1')
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(first.pk, again.pk)
+        self.assertEqual(VirtualTransaction.objects.count(), 1)
+
+
+class BatchOrderApiTests(TestCase):
+    """A basket of orders costs a fixed handful of queries"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='pass12345')
+        self.portfolio = VirtualPortfolio.objects.create(user=self.user, virtual_cash=Decimal('10000.00'))
+        self.stocks = [
+            Stock.objects.create(
+                symbol=f'SYM{i}', company_name=f'Company {i}', sector='IT',
+                current_price=Decimal('10.00'), previous_close=Decimal('10.00')
+            )
+            for i in range(10)
+        ]
+        TradeService(self.portfolio).buy(self.stocks[0], 5)
+        self.client.force_login(self.user)
+
+    def _post(self, payload):
+        return self.client.post(
+            reverse('api_batch_orders'), data=json.dumps(payload), content_type='application/json'
+        )
+
+    def test_twenty_order_rebalance(self):
+        orders = [
+            {'stock_id': stock.pk, 'transaction_type': 'buy', 'quantity': 2, 'idempotency_key': f'b-{stock.pk}'}
+            for stock in self.stocks
+        ] + [
+            {'symbol': stock.symbol.lower(), 'transaction_type': 'sell', 'quantity': 1}
+            for stock in self.stocks
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._post({'orders': orders})
+        self.assertLessEqual(len(ctx.captured_queries), 20)
+
+        data = response.json()
+        self.assertEqual([r['status'] for r in data['results']], ['executed'] * 20)
+        quantities = dict(Holding.objects.filter(portfolio=self.portfolio).values_list('stock__symbol', 'quantity'))
+        self.assertEqual(quantities['SYM0'], 6)
+        self.assertEqual(quantities['SYM9'], 1)
+        self.assertEqual(data['portfolio']['virtual_cash'], 10000 - 50 - 200 + 100)
+
+        # Re-submitting the keyed buys trades nothing
+        data = self._post({'orders': orders[:10]}).json()
+        self.assertEqual({r['status'] for r in data['results']}, {'duplicate'})
+
+    def test_rejections_and_all_or_none(self):
+        orders = [
+            {'stock_id': self.stocks[1].pk, 'transaction_type': 'buy', 'quantity': 1},
+            {'stock_id': self.stocks[2].pk, 'transaction_type': 'sell', 'quantity': 1},
+        ]
+        statuses = [r['status'] for r in self._post({'orders': orders, 'all_or_none': True}).json()['results']]
+        self.assertEqual(statuses, ['cancelled', 'rejected'])
+        self.assertFalse(Holding.objects.filter(stock=self.stocks[1]).exists())
+
+        statuses = [r['status'] for r in self._post({'orders': orders}).json()['results']]
+        self.assertEqual(statuses, ['executed', 'rejected'])
+        self.assertEqual(self._post({'orders': 'nope'}).status_code, 400)
+
+
+class TradeServiceConcurrencyTests(TransactionTestCase):
+    """Hundreds of concurrent orders must never overdraw cash or oversell shares"""
+
+    threads = 8
+    orders_per_thread = 40
+
+    def setUp(self):
+        # The in-memory SQLite test database uses shared-cache table locks,
+        # which fail at once instead of waiting, so allow many more retries
+        patcher = mock.patch.object(TradeService, 'max_attempts', 200)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        user = User.objects.create_user(username='racer', password='pass12345')
+        self.portfolio = VirtualPortfolio.objects.create(user=user, virtual_cash=Decimal('5000.00'))
+        self.stock = Stock.objects.create(
+            symbol='HDFC', company_name='HDFC Bank', sector='Banking',
+            current_price=Decimal('100.00'), previous_close=Decimal('100.00')
+        )
+
+    def _run(self, worker):
+        errors = []
+
+        def target(index):
+            try:
+                worker(index)
+            except Exception as e:  # surfaced through the assertion below
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=target, args=(i,)) for i in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_orders_keep_invariants(self):
+        portfolio = VirtualPortfolio.objects.get(pk=self.portfolio.pk)
+        stock = Stock.objects.get(pk=self.stock.pk)
+
+        def worker(index):
+            service = TradeService(portfolio)
+            for order in range(self.orders_per_thread):
+                transaction_type = 'sell' if (index + order) % 3 == 0 else 'buy'
+                # Every order is submitted twice, like a double-clicked form
+                for _ in range(2):
+                    try:
+                        service.execute(stock, transaction_type, 2, idempotency_key=f'{index}-{order}')
+                    except (InsufficientFunds, InsufficientShares):
+                        pass
+
+        self._run(worker)
+
+        self.portfolio.refresh_from_db()
+        trades = VirtualTransaction.objects.filter(portfolio=self.portfolio)
+        bought = trades.filter(transaction_type='buy').aggregate(q=Sum('quantity'), amount=Sum('total_amount'))
+        sold = trades.filter(transaction_type='sell').aggregate(q=Sum('quantity'), amount=Sum('total_amount'))
+        bought_qty, sold_qty = bought['q'] or 0, sold['q'] or 0
+        holding = Holding.objects.filter(portfolio=self.portfolio, stock=self.stock).first()
+
+        self.assertGreater(bought_qty, 0)
+        self.assertGreaterEqual(self.portfolio.virtual_cash, 0)
+        self.assertEqual(
+            self.portfolio.virtual_cash,
+            Decimal('5000.00') - (bought['amount'] or 0) + (sold['amount'] or 0)
+        )
+        self.assertEqual(holding.quantity if holding else 0, bought_qty - sold_qty)
+        self.assertLessEqual(trades.count(), self.threads * self.orders_per_thread)
+
+    def test_concurrent_baskets_with_shared_keys(self):
+        portfolio = VirtualPortfolio.objects.get(pk=self.portfolio.pk)
+        orders = [
+            {'stock_id': self.stock.pk, 'transaction_type': 'buy', 'quantity': 1, 'idempotency_key': f'basket-{order}'}
+            for order in range(5)
+        ]
+        statuses = []
+
+        def worker(index):
+            statuses.append([result['status'] for result in TradeService(portfolio).execute_batch(orders)])
+
+        self._run(worker)
+
+        self.assertEqual(sorted(statuses), [['duplicate'] * 5] * (self.threads - 1) + [['executed'] * 5])
+        self.assertEqual(VirtualTransaction.objects.filter(portfolio=self.portfolio).count(), 5)
+
+    def test_failed_commit_hook_neither_repeats_nor_drops_work(self):
+        dashboard_key = f'dashboard:{self.portfolio.user_id}'
+        locked = OperationalError('database table is locked')
+        service = TradeService(self.portfolio)
+        basket = [{'stock_id': self.stock.pk, 'transaction_type': 'buy', 'quantity': 1}]
+        for trade in (lambda: service.execute(self.stock, 'buy', 1), lambda: service.execute_batch(basket)):
+            cache.set(dashboard_key, 'stale')
+            before = VirtualTransaction.objects.count()
+            # The hook raises after the commit, dropping the dashboard hook queued behind it
+            with mock.patch('main.pricing.evaluate_portfolios', side_effect=locked), \
+                    mock.patch('main.trading.evaluate_portfolios') as evaluate:
+                trade()
+            self.assertEqual(VirtualTransaction.objects.count(), before + 1)
+            self.assertIsNone(cache.get(dashboard_key))
+            evaluate.assert_called_once_with([self.portfolio.pk])
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.virtual_cash, Decimal('4800.00'))
+
+
+@override_settings(TEMPLATES=TEST_TEMPLATES)
+class LeaderboardTests(TestCase):
+    """Leaderboard ranks are served from a cached snapshot"""
+
+    def setUp(self):
+        cache.clear()
+        self.users = []
+        for index, points in enumerate([50, 30, 30, 10, 0]):
+            user = User.objects.create_user(username=f'player{index}', password='pass12345')
+            UserProfile.objects.create(user=user, total_points=points)
+            self.users.append(user)
+
+    def test_ranks_match_database_counts(self):
+        snapshot = get_snapshot('all')
+        for profile in UserProfile.objects.all():
+            expected = UserProfile.objects.filter(total_points__gt=profile.total_points).count() + 1
+            self.assertEqual(rank_for_points(snapshot, profile.total_points), expected)
+        self.assertEqual([row['rank'] for row in snapshot['top']], [1, 2, 2, 4, 5])
+        self.assertEqual(rank_for_points(snapshot, 100), 1)
+
+    def test_view_serves_from_cache_until_invalidated(self):
+        self.client.force_login(self.users[3])
+        self.client.get(reverse('leaderboard'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('leaderboard'))
+        self.assertFalse(any('main_userprofile' in q['sql'] and 'COUNT' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(response.context['user_rank'], 4)
+
+        UserProfile.objects.filter(user=self.users[3]).update(total_points=60)
+        invalidate_leaderboard()
+        response = self.client.get(reverse('leaderboard'))
+        self.assertEqual(response.context['user_rank'], 1)
+        self.assertEqual(self.client.get(reverse('leaderboard'), {'window': 'weekly'}).status_code, 200)
+
+
+class PointsLedgerTests(TestCase):
+    """Awards go through the ledger and roll profile state forward"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='learner', password='pass12345')
+        self.profile = UserProfile.objects.create(user=self.user)
+
+    def test_award_is_applied_once_per_source(self):
+        self.assertTrue(award_points(self.user, 60, 'module:1'))
+        self.assertFalse(award_points(self.user, 60, 'module:1'))
+        self.assertTrue(award_points(self.user, 45, 'quiz:1'))
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.total_points, self.profile.level, self.profile.streak_days), (105, 2, 1))
+        self.assertEqual(reconcile_points(), [])
+
+    def test_streak_rolls_forward_on_a_new_day(self):
+        award_points(self.user, 10, 'module:1')
+        yesterday = timezone.now() - timedelta(days=1)
+        UserProfile.objects.filter(pk=self.profile.pk).update(last_activity=yesterday)
+        award_points(self.user, 10, 'module:2')
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.streak_days, 2)
+
+        UserProfile.objects.filter(pk=self.profile.pk).update(last_activity=yesterday - timedelta(days=5))
+        award_points(self.user, 10, 'module:3')
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.streak_days, 1)
+
+    def test_reconcile_fixes_drift(self):
+        award_points(self.user, 30, 'module:1')
+        UserProfile.objects.filter(pk=self.profile.pk).update(total_points=999)
+        self.assertEqual(reconcile_points(fix=True), [(self.user.id, 999, 30)])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.total_points, 30)
+
+    def test_weekly_leaderboard_uses_ledger(self):
+        award_points(self.user, 25, 'fraud_scenario:1')
+        self.assertEqual(get_snapshot('weekly')['top'][0]['total_points'], 25)
+
+
+@override_settings(TEMPLATES=TEST_TEMPLATES)
+class AchievementEngineTests(TestCase):
+    """Achievements are awarded from indexed rules when events happen"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='achiever', password='pass12345')
+        UserProfile.objects.create(user=self.user)
+
+    def earned(self):
+        return set(UserAchievement.objects.filter(user=self.user).values_list('achievement__name', flat=True))
+
+    def test_points_award_unlocks_point_achievements(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            award_points(self.user, 150, 'module:1')
+        self.assertEqual(self.earned(), {'Point Collector'})
+
+    def test_module_completion_and_portfolio_profit(self):
+        module = LearningModule.objects.create(
+            title='Basics', description='-', content='-', difficulty_level='beginner', estimated_time=5
+        )
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('complete_module', args=[module.id]))
+        self.assertIn('First Steps', self.earned())
+
+        portfolio = VirtualPortfolio.objects.create(user=self.user, profit_loss=Decimal('12000'))
+        evaluate('portfolio_revalued', [self.user.id])
+        self.assertIn('Profit Maker', self.earned())
+        self.assertNotIn('Investment Growth', self.earned())
+
+        VirtualPortfolio.objects.filter(pk=portfolio.pk).update(current_value=Decimal('110500'))
+        evaluate('portfolio_revalued', [self.user.id])
+        evaluate('portfolio_revalued', [self.user.id])
+        self.assertIn('Investment Growth', self.earned())
+
+    def test_rule_changes_reload_the_index(self):
+        get_rules()
+        Achievement.objects.create(
+            name='Saver', description='-', condition_type='budget_followed', condition_value=1
+        )
+        self.assertIn('budget_followed', get_rules())
+
+    def test_view_is_a_single_read(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            award_points(self.user, 600, 'module:1')
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('user_achievements'))
+        self.assertEqual(set(response.context['achievements']), {'Point Collector', 'High Achiever'})
+        self.assertEqual(sum('main_userachievement' in q['sql'] for q in ctx.captured_queries), 1)
+        self.assertFalse(any('main_userprogress' in q['sql'] for q in ctx.captured_queries))
+
+
+class HotPathIndexTests(TestCase):
+    """The dashboard, leaderboard, budget_analysis and stock_list queries use their indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='indexed', password='pass12345')
+        cls.portfolio = VirtualPortfolio.objects.create(user=cls.user)
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def test_budget_analysis_queries(self):
+        first_day, last_day = date(2026, 10, 1), date(2026, 10, 31)
+        self.assertUsesIndex(
+            Expense.objects.filter(user=self.user, date__gte=first_day, date__lte=last_day).order_by().values(
+                'date'
+            ).annotate(total=Sum('amount')),
+            'expense_user_date_idx'
+        )
+        self.assertUsesIndex(
+            Budget.objects.filter(user=self.user, is_active=True, start_date__lte=last_day, end_date__gte=first_day),
+            'budget_active_period_idx'
+        )
+        self.assertUsesIndex(Expense.objects.filter(user=self.user).order_by('-date')[:20], 'expense_user_date_idx')
+
+    def test_dashboard_queries(self):
+        self.assertUsesIndex(
+            VirtualTransaction.objects.filter(portfolio=self.portfolio)[:5], 'vtxn_portfolio_recent_idx'
+        )
+        self.assertUsesIndex(UserProgress.objects.filter(user=self.user, is_completed=True), 'progress_completed_idx')
+
+    def test_leaderboard_and_stock_list_queries(self):
+        self.assertUsesIndex(
+            UserProfile.objects.order_by('-total_points', 'user_id').values('user_id', 'total_points')[:20],
+            'profile_points_rank_idx'
+        )
+        # The unique index on symbol already serves the ordered stock list
+        self.assertUsesIndex(Stock.objects.filter(is_active=True).order_by('symbol')[:20], 'sqlite_autoindex_main_stock')
+
+
+@override_settings(TEMPLATES=TEST_TEMPLATES)
+class DashboardContextTests(TestCase):
+    """The dashboard is built in a few queries and cached per user"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='dash', password='pass12345')
+        UserProfile.objects.create(user=self.user)
+        self.portfolio = VirtualPortfolio.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        today = timezone.localdate()
+        Expense.objects.create(user=self.user, description='Rent', amount=Decimal('500'), date=today)
+        # Same month a year earlier must not count towards this month
+        Expense.objects.create(
+            user=self.user, description='Old', amount=Decimal('70'), date=today.replace(year=today.year - 1)
+        )
+
+    def test_build_and_cache(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['monthly_expenses'], Decimal('500'))
+        dashboard_queries = [
+            q for q in ctx.captured_queries if q['sql'].startswith('SELECT "main_') and 'FROM "main_user"' not in q['sql']
+        ]
+        self.assertLessEqual(len(dashboard_queries), 3)
+
+        hits = DashboardContext.metrics()['hits']
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('dashboard'))
+        self.assertFalse(any('main_userprofile' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(DashboardContext.metrics()['hits'], hits + 1)
+
+    def test_writes_invalidate_the_entry(self):
+        DashboardContext(self.user).get()
+        with self.captureOnCommitCallbacks(execute=True):
+            FinancialGoal.objects.create(
+                user=self.user, title='Laptop', goal_type='gadget', target_amount=Decimal('50000'),
+                target_date=timezone.localdate() + timedelta(days=90)
+            )
+        self.assertEqual(len(DashboardContext(self.user).get()['active_goals']), 1)
+
+        stock = Stock.objects.create(
+            symbol='DASH', company_name='Dash', sector='IT', current_price=Decimal('10'), previous_close=Decimal('10')
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            TradeService(self.portfolio).buy(stock, 3)
+        self.assertEqual(len(DashboardContext(self.user).get()['recent_transactions']), 1)
+
+
+class LoadDataTests(TestCase):
+    """seed_load data is reproducible and internally consistent"""
+
+    def generate(self, prefix, chunk_size):
+        return generate_load_data(
+            3, seed=7, expenses_per_user=12, trades_per_user=6, months=2, stocks=25, modules=5, scenarios=3,
+            chunk_size=chunk_size, prefix=prefix, as_of=date(2026, 10, 17)
+        )
+
+    def expenses(self, prefix):
+        return list(Expense.objects.filter(user__username__startswith=prefix).order_by(
+            'user__username', 'date', 'amount'
+        ).values_list('description', 'amount', 'date'))
+
+    def test_same_seed_gives_same_data_whatever_the_chunk_size(self):
+        stats = self.generate('a_', chunk_size=2)
+        self.generate('b_', chunk_size=3)
+        self.assertEqual(stats.rows['Expense'], 36)
+        self.assertEqual(self.expenses('a_'), self.expenses('b_'))
+
+    def test_generated_timestamps_are_kept(self):
+        self.generate('t_', chunk_size=2)
+        for day, created_at in Expense.objects.values_list('date', 'created_at'):
+            self.assertEqual(created_at.astimezone(dt_timezone.utc).date(), day)
+        self.assertLess(PointsLedger.objects.latest('created_at').created_at.date(), date(2026, 10, 17))
+        self.assertTrue(Expense._meta.get_field('created_at').auto_now_add)
+
+    def test_derived_state_is_consistent(self):
+        self.generate('c_', chunk_size=2)
+        self.assertEqual(reconcile_points(), [])
+        summaries = sorted(ExpenseMonthlySummary.objects.values_list(
+            'user_id', 'year', 'month', 'category_id', 'total_amount', 'expense_count'
+        ))
+        rebuild_expense_summaries()
+        self.assertEqual(summaries, sorted(ExpenseMonthlySummary.objects.values_list(
+            'user_id', 'year', 'month', 'category_id', 'total_amount', 'expense_count'
+        )))
+        for portfolio in VirtualPortfolio.objects.all():
+            value = portfolio.holdings.aggregate(total=Sum('current_value'))['total'] or Decimal('0')
+            self.assertEqual(portfolio.current_value, value)
+            self.assertGreaterEqual(portfolio.virtual_cash, 0)
+
+
+class ViewBenchmarkTests(TestCase):
+    """The benchmark harness covers every route and flags regressions"""
+
+    def test_every_named_route_is_benchmarked(self):
+        self.assertEqual(uncovered_routes(), [])
+
+    def test_run_and_compare(self):
+        generate_load_data(3, seed=3, expenses_per_user=5, trades_per_user=3, stocks=10, modules=2, scenarios=1)
+        result = run_benchmarks(iterations=2, warmup=1, only=['api_portfolio_summary', 'api_batch_orders'])
+        summary = result['routes']['api_portfolio_summary']
+        self.assertEqual(summary['status'], [200])
+        self.assertGreater(summary['queries'], 0)
+        # Batch orders are rolled back, so the portfolio is unchanged between iterations
+        self.assertEqual(result['routes']['api_batch_orders']['status'], [200])
+
+        baseline = {'sizes': {'3': result}}
+        self.assertEqual(compare_results(baseline, baseline), [])
+        regressed = json.loads(json.dumps(baseline))
+        regressed['sizes']['3']['routes']['api_portfolio_summary']['queries'] += 1
+        regressed['sizes']['3']['routes']['api_portfolio_summary']['p50_ms'] += 0.5
+        self.assertEqual(len(compare_results(baseline, regressed)), 1)
+
+        # Failing routes and routes or sizes without a baseline never pass
+        regressed = json.loads(json.dumps(baseline))
+        regressed['sizes']['3']['routes']['api_portfolio_summary']['status'] = [200, 404]
+        regressed['sizes']['3']['routes']['new_route'] = summary
+        regressed['sizes']['10'] = result
+        self.assertEqual(compare_results(baseline, regressed), [
+            '[3 users] api_portfolio_summary: answered with status [404]',
+            '[3 users] new_route: not in the baseline',
+            '[10 users]: not in the baseline',
+        ])
+
+    def test_every_route_answers_with_stand_in_templates(self):
+        generate_load_data(3, seed=3, expenses_per_user=5, trades_per_user=3, stocks=10, modules=2, scenarios=1)
+        result = run_benchmarks(iterations=1, warmup=0)
+        self.assertEqual(
+            {label: row['status'] for label, row in result['routes'].items() if not 200 <= max(row['status']) < 400},
+            {}
+        )
+
+
+class MetricsTests(TestCase):
+    """Request metrics are recorded per URL name and exposed at /metrics"""
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.user = User.objects.create_user(username='observed', password='pass12345')
+        UserProfile.objects.create(user=self.user)
+        VirtualPortfolio.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def test_views_are_recorded_and_exposed(self):
+        self.client.get(reverse('api_portfolio_summary'))
+        self.client.get(reverse('api_portfolio_summary'))
+        self.user.is_staff = True
+        self.user.save()
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'paisabuddy_http_requests_total{view="api_portfolio_summary",method="GET",status="200"} 2', body
+        )
+        self.assertIn('paisabuddy_http_request_duration_seconds_count{view="api_portfolio_summary"} 2', body)
+        self.assertIn('paisabuddy_db_queries_per_request_bucket{view="api_portfolio_summary",le="+Inf"} 2', body)
+        self.assertRegex(body, r'paisabuddy_db_queries_total\{view="api_portfolio_summary"\} [1-9]')
+
+    def test_snapshots_from_several_processes_are_summed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings_override = dict(settings.PAISABUDDY_SETTINGS, METRICS_DIR=directory)
+            with override_settings(PAISABUDDY_SETTINGS=settings_override):
+                metrics.record_cache('dashboard', hit=True)
+                metrics.flush(force=True)
+                # Another worker's snapshot
+                with open(os.path.join(directory, '999-1.json'), 'w') as stream:
+                    json.dump({
+                        'counters': [['cache_requests_total', [['cache', 'dashboard'], ['result', 'hit']], 4]],
+                        'histograms': [],
+                    }, stream)
+                body = metrics.render()
+        self.assertIn('paisabuddy_cache_requests_total{cache="dashboard",result="hit"} 5', body)
+
+    def test_scrapes_need_staff_or_the_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.logout()
+        settings_override = dict(settings.PAISABUDDY_SETTINGS, METRICS_TOKEN='s3cret')
+        with override_settings(PAISABUDDY_SETTINGS=settings_override):
+            self.assertEqual(
+                self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403
+            )
+            self.assertEqual(
+                self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200
+            )
+
+    def test_snapshots_of_dead_workers_expire(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings_override = dict(settings.PAISABUDDY_SETTINGS, METRICS_DIR=directory, METRICS_SNAPSHOT_TTL=60)
+            with override_settings(PAISABUDDY_SETTINGS=settings_override):
+                metrics.flush(force=True)
+                snapshot = {'counters': [], 'histograms': []}
+                old = time.time() - 120
+                for name in (f'{os.getppid()}-1.json', '999999999-1.json', '999999998-1.json'):
+                    with open(os.path.join(directory, name), 'w') as stream:
+                        json.dump(snapshot, stream)
+                    if name != '999999998-1.json':
+                        os.utime(os.path.join(directory, name), (old, old))
+                metrics.collect()
+                remaining = sorted(os.listdir(directory))
+        # Live or recently written snapshots stay
+        self.assertEqual(len(remaining), 3)
+        self.assertNotIn('999999999-1.json', remaining)
+        self.assertIn(f'{os.getppid()}-1.json', remaining)
+
+
+@override_settings(TEMPLATES=TEST_TEMPLATES)
+class StockSearchTests(TestCase):
+    """Stock search is served from the in-memory index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='searcher', password='pass12345')
+        for symbol, name in [
+            ('TCS', 'Tata Consultancy Services'),
+            ('TATAMOTORS', 'Tata Motors Limited'),
+            ('TITAN', 'Titan Company'),
+            ('INFY', 'Infosys Limited'),
+            ('M&M', 'Mahindra & Mahindra'),
+        ]:
+            Stock.objects.create(
+                symbol=symbol, company_name=name, sector='Test',
+                current_price=Decimal('100'), previous_close=Decimal('100')
+            )
+        Stock.objects.create(
+            symbol='TATADEAD', company_name='Tata Delisted', sector='Test',
+            current_price=Decimal('1'), previous_close=Decimal('1'), is_active=False
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def symbols(self, ids):
+        stocks = Stock.objects.in_bulk(ids)
+        return [stocks[stock_id].symbol for stock_id in ids]
+
+    def test_ranking(self):
+        index = StockIndex.build()
+        # Exact symbol, symbol prefix, company name prefix, then later name words
+        self.assertEqual(self.symbols(index.search('tcs')), ['TCS'])
+        self.assertEqual(self.symbols(index.search('ta')), ['TATAMOTORS', 'TCS'])
+        self.assertEqual(self.symbols(index.search('t')), ['TCS', 'TITAN', 'TATAMOTORS'])
+        self.assertEqual(self.symbols(index.search('limited')), ['INFY', 'TATAMOTORS'])
+        self.assertEqual(self.symbols(index.search('tata mot')), ['TATAMOTORS'])
+        self.assertEqual(self.symbols(index.search('m&m'))[0], 'M&M')
+        self.assertEqual(index.search('nothing'), [])
+        self.assertEqual(len(index.search('')), 5)
+
+    def test_autocomplete_endpoint(self):
+        response = self.client.get(reverse('api_stock_search'), {'q': 'tata', 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row['symbol'] for row in response.json()['results']], ['TATAMOTORS']
+        )
+        self.assertEqual(self.client.get(reverse('api_stock_search'), {'q': 'x', 'limit': 'a'}).status_code, 400)
+
+    def test_index_follows_stock_changes(self):
+        get_stock_index()
+        stock = Stock.objects.get(symbol='TITAN')
+        stock.is_active = False
+        stock.save()
+        self.assertEqual(self.symbols(get_stock_index().search('ti')), [])
+
+    def test_stock_list_pages_without_count_or_scan(self):
+        get_stock_index()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('stock_list'), {'search': 'tata'})
+        self.assertEqual(response.content.decode().split(), ['TATAMOTORS', 'TCS'])
+        stock_queries = [query['sql'] for query in captured.captured_queries if 'main_stock' in query['sql']]
+        self.assertEqual(len(stock_queries), 1)
+        self.assertNotIn('COUNT', stock_queries[0])
+        self.assertNotIn('LIKE', stock_queries[0])
+
+
+class StockQuoteApiTests(TestCase):
+    """Batch quotes come from the cached table and unchanged polls get a 304"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='poller', password='pass12345')
+        cls.tcs = Stock.objects.create(
+            symbol='TCS', company_name='Tata Consultancy Services', sector='IT',
+            current_price=Decimal('110'), previous_close=Decimal('100')
+        )
+        cls.infy = Stock.objects.create(
+            symbol='INFY', company_name='Infosys', sector='IT',
+            current_price=Decimal('90'), previous_close=Decimal('100')
+        )
+
+    def setUp(self):
+        cache.clear()
+        use_temp_price_history(self)
+        self.client.force_login(self.user)
+        self.url = reverse('api_stock_quotes')
+
+    def test_batch_by_id_and_symbol(self):
+        response = self.client.get(self.url, {'ids': f'{self.tcs.id},999999', 'symbols': 'infy,TCS'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([quote['symbol'] for quote in data['quotes']], ['TCS', 'INFY'])
+        self.assertEqual(data['quotes'][0]['change_percent'], 10.0)
+        self.assertEqual(data['missing'], [999999])
+        self.assertTrue(response['ETag'])
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'ids': 'abc'}).status_code, 400)
+
+    def test_unchanged_poll_is_not_modified_without_queries(self):
+        params = {'symbols': 'TCS,INFY'}
+        etag = self.client.get(self.url, params)['ETag']
+        with CaptureQueriesContext(connection) as captured, \
+                mock.patch('main.quotes.QuoteTable.build') as build:
+            response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Only authentication and the session refresh are left
+        app_queries = [
+            query for query in captured.captured_queries
+            if '"main_' in query['sql'] and '"main_user"' not in query['sql']
+        ]
+        self.assertEqual(app_queries, [])
+        build.assert_not_called()
+
+        self.client.logout()
+        response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_price_ticks_change_the_etag(self):
+        params = {'symbols': 'TCS'}
+        etag = self.client.get(self.url, params)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_ticks([{'symbol': 'TCS', 'price': Decimal('120'), 'timestamp': timezone.now()}])
+        response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['quotes'][0]['current_price'], 120.0)
+
+
+class PriceStreamTests(TestCase):
+    """The SSE stream fans feed ticks out to subscribed connections"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='watcher', password='pass12345')
+        cls.stock = Stock.objects.create(
+            symbol='TCS', company_name='Tata Consultancy Services', sector='IT',
+            current_price=Decimal('100'), previous_close=Decimal('100')
+        )
+        Stock.objects.create(
+            symbol='INFY', company_name='Infosys', sector='IT',
+            current_price=Decimal('50'), previous_close=Decimal('50')
+        )
+        portfolio = VirtualPortfolio.objects.create(user=cls.user, total_invested=Decimal('1000'))
+        Holding.objects.create(
+            portfolio=portfolio, stock=cls.stock, quantity=10,
+            average_price=Decimal('100'), invested_amount=Decimal('1000')
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def tick(self, symbol, price):
+        return {'symbol': symbol, 'price': Decimal(price), 'timestamp': timezone.now()}
+
+    def test_broadcaster_fans_out_by_symbol_and_coalesces(self):
+        async def scenario():
+            broadcaster = PriceBroadcaster(memory_feed)
+            tcs = broadcaster.subscribe({'TCS'})
+            everything = broadcaster.subscribe()
+            broadcaster.publish([self.tick('TCS', '101'), self.tick('INFY', '51')])
+            broadcaster.publish([self.tick('TCS', '102')])
+            received = (await tcs.next(1), await everything.next(1), await tcs.next(0.01))
+            broadcaster.unsubscribe(tcs)
+            broadcaster.unsubscribe(everything)
+            return received, broadcaster.task
+
+        (tcs, everything, idle), task = async_to_sync(scenario)()
+        self.assertEqual({symbol: quote['price'] for symbol, quote in tcs.items()}, {'TCS': 102.0})
+        self.assertEqual(set(everything), {'TCS', 'INFY'})
+        self.assertEqual(idle, {})
+        self.assertIsNone(task)
+
+    def test_file_feed_reads_complete_appended_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ticks.jsonl')
+            with open(path, 'w') as stream:
+                stream.write('{"symbol": "tcs", "price": 101}\n{"symbol": "IN')
+            ticks, offset = FileFeed(path)._read_new(0)
+            self.assertEqual([(tick['symbol'], tick['price']) for tick in ticks], [('TCS', Decimal('101.00'))])
+            with open(path, 'a') as stream:
+                stream.write('FY", "price": 52}\n')
+            ticks, _ = FileFeed(path)._read_new(offset)
+        self.assertEqual([tick['symbol'] for tick in ticks], ['INFY'])
+
+    def run_stream(self, cookie, ticks):
+        async def scenario():
+            messages = []
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                messages.append(message)
+                body = message.get('body', b'')
+                if b'event: snapshot' in body:
+                    # Connected; the feed may publish now
+                    asyncio.get_running_loop().call_soon(memory_feed.publish, ticks)
+                elif body:
+                    disconnect.set()
+
+            headers = [(b'cookie', f'{settings.SESSION_COOKIE_NAME}={cookie}'.encode())] if cookie else []
+            scope = {'type': 'http', 'method': 'GET', 'path': '/stream/prices/', 'query_string': b'', 'headers': headers}
+            await asyncio.wait_for(price_stream(scope, receive, send), 5)
+            return messages
+
+        with mock.patch('main.streaming._broadcaster', PriceBroadcaster(memory_feed)):
+            return async_to_sync(scenario)()
+
+    def events(self, messages):
+        body = b''.join(message.get('body', b'') for message in messages).decode()
+        return {
+            block.split('\n')[0][len('event: '):]: json.loads(block.split('\n')[1][len('data: '):])
+            for block in body.split('\n\n') if block.startswith('event: ')
+        }
+
+    def test_stream_pushes_prices_and_portfolio_deltas(self):
+        self.client.force_login(self.user)
+        messages = self.run_stream(
+            self.client.cookies[settings.SESSION_COOKIE_NAME].value,
+            [self.tick('TCS', '110'), self.tick('INFY', '55')],
+        )
+        self.assertEqual(messages[0]['status'], 200)
+        events = self.events(messages)
+        # Only the held symbol is watched by default
+        self.assertEqual([quote['symbol'] for quote in events['snapshot']['quotes']], ['TCS'])
+        self.assertEqual(events['snapshot']['portfolio']['profit_loss'], 0.0)
+        self.assertEqual(events['prices'], [{
+            'symbol': 'TCS', 'price': 110.0, 'timestamp': events['prices'][0]['timestamp'],
+            'change': 10.0, 'change_percent': 10.0,
+        }])
+        self.assertEqual(events['portfolio'], {'current_value': 1100.0, 'profit_loss': 100.0, 'profit_loss_delta': 100.0})
+
+    def test_stream_requires_login(self):
+        messages = self.run_stream(None, [])
+        self.assertEqual(messages[0]['status'], 403)
+
+    def test_holdings_refresh_while_the_feed_is_busy(self):
+        self.client.force_login(self.user)
+        states = [
+            {'total_invested': 1000.0, 'holdings': {'TCS': 10}},
+            {'total_invested': 1000.0, 'holdings': {'TCS': 20}},
+        ]
+        settings_override = dict(settings.PAISABUDDY_SETTINGS, STREAM_PORTFOLIO_REFRESH_SECONDS=0)
+        with override_settings(PAISABUDDY_SETTINGS=settings_override), \
+                mock.patch('main.streaming._portfolio_state', side_effect=states):
+            messages = self.run_stream(
+                self.client.cookies[settings.SESSION_COOKIE_NAME].value, [self.tick('TCS', '110')]
+            )
+        # The reload after the price update picks up the new quantity at the stored price
+        self.assertEqual(self.events(messages)['portfolio']['current_value'], 2000.0)
+
+    def test_applied_ticks_reach_the_memory_feed(self):
+        use_temp_price_history(self)
+        with mock.patch.object(memory_feed, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                apply_ticks([self.tick('TCS', '105')])
+        [ticks], _ = publish.call_args
+        self.assertEqual([(tick['symbol'], tick['price']) for tick in ticks], [('TCS', Decimal('105'))])
+
+    def test_applied_ticks_are_appended_to_the_feed_file(self):
+        directory = use_temp_price_history(self)
+        path = os.path.join(directory, 'price_feed.jsonl')
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_ticks([self.tick('TCS', '105')])
+        ticks, _ = FileFeed(path)._read_new(0)
+        self.assertEqual([(tick['symbol'], tick['price']) for tick in ticks], [('TCS', Decimal('105'))])
+
+    def test_memory_feed_fallback_warns(self):
+        with override_settings(PAISABUDDY_SETTINGS=dict(settings.PAISABUDDY_SETTINGS, PRICE_FEED_FILE='')):
+            with self.assertLogs('main.streaming', 'WARNING'):
+                self.assertIs(configured_feed(), memory_feed)
+
+
+class PortfolioSnapshotTests(TestCase):
+    """Daily snapshots feed vectorised performance analytics"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='charted', password='pass12345')
+        cls.stock = Stock.objects.create(
+            symbol='TCS', company_name='Tata Consultancy Services', sector='IT',
+            current_price=Decimal('120'), previous_close=Decimal('100')
+        )
+        cls.portfolio = VirtualPortfolio.objects.create(
+            user=cls.user, virtual_cash=Decimal('9000'), total_invested=Decimal('1000')
+        )
+        Holding.objects.create(
+            portfolio=cls.portfolio, stock=cls.stock, quantity=10,
+            average_price=Decimal('100'), invested_amount=Decimal('1000')
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_take_snapshots_upserts_the_day(self):
+        day = date(2026, 1, 5)
+        self.assertEqual(take_snapshots(day), (1, 0))
+        Stock.objects.filter(pk=self.stock.pk).update(current_price=Decimal('130'))
+        self.assertEqual(take_snapshots(day), (0, 1))
+        snapshot = PortfolioSnapshot.objects.get(portfolio=self.portfolio, date=day)
+        self.assertEqual(
+            (snapshot.market_value, snapshot.net_worth, snapshot.profit_loss),
+            (Decimal('1300.00'), Decimal('10300.00'), Decimal('300.00'))
+        )
+
+    def test_statistics(self):
+        values = np.array([100.0, 110.0, 99.0, 120.0])
+        np.testing.assert_allclose(analytics.simple_returns(values), [0.1, -0.1, 120 / 99 - 1])
+        np.testing.assert_allclose(analytics.drawdown(values), [0, 0, -0.1, 0])
+        np.testing.assert_allclose(analytics.cumulative_returns(values), [0, 0.1, -0.01, 0.2])
+        returns = analytics.simple_returns(values)
+        self.assertAlmostEqual(analytics.annualised_volatility(returns), np.std(returns, ddof=1) * np.sqrt(252))
+        comparison = analytics.compare(returns, returns / 2)
+        self.assertAlmostEqual(comparison['beta'], 2.0)
+        self.assertAlmostEqual(comparison['correlation'], 1.0)
+        self.assertIsNone(analytics.sharpe_ratio(np.zeros(3)))
+
+    def test_history_endpoint_reads_snapshots(self):
+        other = User.objects.create_user(username='market', password='pass12345')
+        market = VirtualPortfolio.objects.create(user=other)
+        today = timezone.localdate()
+        VirtualPortfolio.objects.filter(pk__in=[self.portfolio.pk, market.pk]).update(
+            created_at=timezone.now() - timedelta(days=30)
+        )
+        for offset, mine, theirs in [(2, 10000, 1000), (1, 11000, 1000), (0, 9900, 1100)]:
+            day = today - timedelta(days=offset)
+            for portfolio, net_worth in [(self.portfolio, mine), (market, theirs)]:
+                PortfolioSnapshot.objects.create(
+                    portfolio=portfolio, date=day, cash=net_worth, invested=0,
+                    market_value=0, net_worth=net_worth, profit_loss=0
+                )
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as captured:
+            data = self.client.get(reverse('api_portfolio_history'), {'days': 7}).json()
+        self.assertFalse([query for query in captured.captured_queries if 'main_virtualtransaction' in query['sql']])
+        self.assertEqual(data['net_worth'], [10000.0, 11000.0, 9900.0])
+        self.assertEqual(data['drawdown'], [0.0, 0.0, -0.1])
+        self.assertAlmostEqual(data['stats']['total_return'], -0.01)
+        self.assertAlmostEqual(data['stats']['max_drawdown'], -0.1)
+        # The benchmark sums both portfolios: 11000 -> 12000 -> 11000
+        self.assertAlmostEqual(data['stats']['benchmark_return'], 0.0)
+        self.assertAlmostEqual(data['stats']['excess_return'], -0.01)
+        self.assertEqual(self.client.get(reverse('api_portfolio_history'), {'days': 0}).status_code, 400)
+
+
+class PriceHistoryTests(TestCase):
+    """Ticks are kept in append-only column files read through memory maps"""
+
+    def setUp(self):
+        self.directory = use_temp_price_history(self)
+        self.store = PriceHistory(self.directory)
+        self.start = timezone.make_aware(timezone.datetime(2026, 3, 2, 9, 15))
+
+    def at(self, minutes):
+        return self.start + timedelta(minutes=minutes)
+
+    def record(self, *points):
+        return self.store.append_ticks([
+            {'symbol': 'TCS', 'price': Decimal(price), 'timestamp': self.at(minutes)} for minutes, price in points
+        ])
+
+    def test_append_and_range(self):
+        self.assertEqual(self.record((0, '100'), (1, '101'), (2, '102')), 3)
+        # Older ticks are dropped, newer ones appended
+        self.assertEqual(self.record((1, '99'), (3, '103')), 1)
+        timestamps, prices = self.store.range('TCS', self.at(1), self.at(3))
+        self.assertEqual(prices.tolist(), [101.0, 102.0])
+        self.assertEqual(timestamps[0], np.datetime64(to_micros(self.at(1)), 'us'))
+        self.assertIsInstance(self.store.columns('TCS')[0], np.memmap)
+        self.assertEqual(self.store.last_price_before('TCS', self.at(3)), 102.0)
+        self.assertIsNone(self.store.last_price_before('TCS', self.at(0)))
+        self.assertEqual(self.store.range('INFY')[1].tolist(), [])
+
+    def test_torn_write_is_ignored_and_repaired(self):
+        self.record((0, '100'))
+        with open(os.path.join(self.directory, 'TCS.px'), 'ab') as stream:
+            stream.write(b'\x00' * 12)
+        self.assertEqual(self.store.range('TCS')[1].tolist(), [100.0])
+        self.record((1, '101'))
+        self.assertEqual(self.store.range('TCS')[1].tolist(), [100.0, 101.0])
+
+    def test_ohlc_bars(self):
+        self.record((0, '100'), (10, '104'), (20, '98'), (50, '101'), (65, '110'), (70, '108'))
+        bars = self.store.ohlc('TCS', self.at(0), self.at(120), 3600)
+        # Hourly bars are aligned to local hours: 09:15-09:35 and 10:05-10:25
+        self.assertEqual(bars['time'], [
+            timezone.localtime(self.start.replace(minute=0)).isoformat(),
+            timezone.localtime(self.start.replace(hour=10, minute=0)).isoformat(),
+        ])
+        self.assertEqual(
+            [bars[key] for key in ('open', 'high', 'low', 'close', 'ticks')],
+            [[100.0, 101.0], [104.0, 110.0], [98.0, 101.0], [98.0, 108.0], [3, 3]]
+        )
+        self.assertEqual(self.store.ohlc('TCS', self.at(200), self.at(300), 60)['close'], [])
+
+    def test_ticks_are_recorded_and_rotate_previous_close(self):
+        stock = Stock.objects.create(
+            symbol='TCS', company_name='Tata Consultancy Services', sector='IT',
+            current_price=Decimal('100'), previous_close=Decimal('100')
+        )
+        yesterday = timezone.now() - timedelta(days=1)
+        Stock.objects.filter(pk=stock.pk).update(last_updated=yesterday - timedelta(days=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_ticks([
+                {'symbol': 'TCS', 'price': Decimal('105'), 'timestamp': yesterday},
+                {'symbol': 'TCS', 'price': Decimal('107'), 'timestamp': yesterday + timedelta(seconds=1)},
+            ])
+        self.assertEqual(get_price_history().range('TCS')[1].tolist(), [105.0, 107.0])
+
+        # The stored price drifts from the recorded close; rotation follows the history
+        Stock.objects.filter(pk=stock.pk).update(current_price=Decimal('999'))
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_ticks([{'symbol': 'TCS', 'price': Decimal('110'), 'timestamp': timezone.now()}])
+        stock.refresh_from_db()
+        self.assertEqual((stock.previous_close, stock.current_price), (Decimal('107.00'), Decimal('110.00')))
+
+    def test_chart_endpoint(self):
+        user = User.objects.create_user(username='charter', password='pass12345')
+        stock = Stock.objects.create(
+            symbol='TCS', company_name='Tata Consultancy Services', sector='IT',
+            current_price=Decimal('100'), previous_close=Decimal('100')
+        )
+        now = timezone.now()
+        get_price_history().append_ticks([
+            {'symbol': 'TCS', 'price': Decimal('100'), 'timestamp': now - timedelta(days=2)},
+            {'symbol': 'TCS', 'price': Decimal('105'), 'timestamp': now - timedelta(minutes=1)},
+        ])
+        self.client.force_login(user)
+        url = reverse('api_stock_history', args=[stock.id])
+        data = self.client.get(url, {'interval': '1d', 'days': 7}).json()
+        self.assertEqual(data['bars']['close'], [100.0, 105.0])
+        self.assertEqual(self.client.get(url, {'interval': '2d'}).status_code, 400)
+
+
+class MarketSimulatorTests(TestCase):
+    """Correlated GBM steps are vectorised and persisted as ordinary ticks"""
+
+    def sectors(self, count):
+        return ['IT', 'Banking', 'Pharma', 'FMCG'] * (count // 4)
+
+    def test_step_is_seeded_and_correlated(self):
+        count = 400
+        args = ([f'S{i}' for i in range(count)], self.sectors(count), [100.0] * count)
+        first, second = MarketSimulator(*args, seed=7), MarketSimulator(*args, seed=7)
+        self.assertEqual(first.step().tolist(), second.step().tolist())
+
+        returns = np.diff(np.log([first.step() for _ in range(300)]), axis=0)
+        correlations = np.corrcoef(returns.T)
+        same_sector, other_sector = correlations[0, 4::4].mean(), correlations[0, 1::4].mean()
+        self.assertAlmostEqual(same_sector, 0.6, delta=0.1)
+        self.assertAlmostEqual(other_sector, 0.3, delta=0.1)
+        with self.assertRaises(ValueError):
+            MarketSimulator(*args, MARKET_CORRELATION=0.7, SECTOR_CORRELATION=0.5)
+
+    def test_step_is_fast_for_a_large_universe(self):
+        count = 10000
+        simulator = MarketSimulator([f'S{i}' for i in range(count)], self.sectors(count), [100.0] * count, seed=1)
+        simulator.step()
+        started = time.perf_counter()
+        prices = simulator.step()
+        self.assertEqual(prices.shape, (count,))
+        self.assertLess(time.perf_counter() - started, 0.1)
+
+    def test_run_persists_through_apply_ticks(self):
+        use_temp_price_history(self)
+        for symbol, sector in [('TCS', 'IT'), ('SBIN', 'Banking')]:
+            Stock.objects.create(
+                symbol=symbol, company_name=symbol, sector=sector,
+                current_price=Decimal('100'), previous_close=Decimal('100')
+            )
+        Stock.objects.update(last_updated=timezone.now() - timedelta(minutes=5))
+        simulator = MarketSimulator.from_database(seed=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(simulator.run(steps=1, interval=0), 1)
+        prices = dict(Stock.objects.values_list('symbol', 'current_price'))
+        self.assertEqual([prices['SBIN'], prices['TCS']], [Decimal(str(p)) for p in simulator.prices.round(2)])
+        self.assertNotEqual(prices['TCS'], Decimal('100'))
+        self.assertEqual(get_price_history().range('TCS')[1].tolist(), [float(prices['TCS'])])
+
+
+class ExpenseForecastTests(TestCase):
+    """Holt-Winters forecasts are fitted in batches and kept current incrementally"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='forecaster', password='pass12345')
+        budget = Budget.objects.create(
+            user=self.user, name='Monthly', total_amount=Decimal('5000'),
+            start_date=date(2020, 1, 1), end_date=date(2030, 12, 31)
+        )
+        self.food = BudgetCategory.objects.create(budget=budget, name='Food & Dining', allocated_amount=Decimal('3000'))
+        self.current = month_index(timezone.localdate())
+
+    def spend(self, months_ago, amount, category=None):
+        return Expense.objects.create(
+            user=self.user, category=category, description='Spend',
+            amount=Decimal(amount), date=month_from_index(self.current - months_ago) + timedelta(days=3)
+        )
+
+    def test_fit_learns_seasonality_and_trend(self):
+        months = np.arange(36)
+        pattern = 1000 + 300 * np.sin(2 * np.pi * months / 12)
+        totals = np.vstack([pattern, 500 + 20 * months, np.r_[np.zeros(34), 800, 900]])
+        state = fit(totals, first_month=2023 * 12)
+        # Offsets by calendar month for the seasonal series only (column 0 is January)
+        self.assertAlmostEqual(state['seasonal'][0][3], 300)
+        self.assertFalse(state['seasonal'][1:].any())
+        self.assertEqual(state['gamma'][1:].tolist(), [0.0, 0.0])
+        self.assertEqual(state['errors'].tolist(), [35, 35, 1])
+        # Too short to choose parameters: defaults, and an interval from the level
+        self.assertEqual((state['alpha'][2], state['beta'][2]), (0.4, 0.0))
+
+        forecasts = [
+            ExpenseForecast(
+                fitted_through=month_from_index(2023 * 12 + 35),
+                **{name: values[row].tolist() for name, values in state.items()}
+            )
+            for row in range(3)
+        ]
+        seasonal, trending, short = (predict(forecast) for forecast in forecasts)
+        self.assertEqual([month['month'] for month in seasonal], ['2026-01', '2026-02', '2026-03'])
+        self.assertAlmostEqual(seasonal[0]['amount'], 1000, delta=5)
+        self.assertAlmostEqual(seasonal[2]['amount'], 1000 + 300 * np.sin(np.pi / 3), delta=5)
+        self.assertAlmostEqual(trending[1]['amount'], 500 + 20 * 37, delta=5)
+        self.assertLess(short[0]['lower'], short[0]['amount'])
+        self.assertLess(short[0]['upper'] - short[0]['lower'], short[2]['upper'] - short[2]['lower'])
+
+    def test_endpoint_reads_precomputed_forecasts(self):
+        for months_ago, amount in [(4, '1000'), (3, '1100'), (2, '900'), (1, '1000')]:
+            self.spend(months_ago, amount, self.food)
+        self.spend(0, '5000', self.food)
+        self.spend(1, '200')
+        self.assertEqual(fit_forecasts(), 2)
+
+        self.client.force_login(self.user)
+        url = reverse('expense_predictor')
+        data = self.client.get(url).json()
+        food = data['predictions'][0]
+        self.assertEqual([row['category'] for row in data['predictions']], ['Food & Dining', 'Uncategorized'])
+        self.assertEqual(data['months_analyzed'], 4)
+        self.assertEqual(food['historical_avg'], 1000.0)
+        # This month's spend is not part of the fit
+        self.assertLess(food['predicted_amount'], 1100)
+        self.assertLess(food['lower'], food['predicted_amount'])
+        self.assertEqual(len(food['forecast']), 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).json()['predictions'], data['predictions'])
+        self.assertFalse([query for query in queries if 'main_expense' in query['sql']])
+
+    def test_completed_month_is_folded_in_incrementally(self):
+        for months_ago, amount in [(4, '1000'), (3, '1000'), (2, '1000')]:
+            self.spend(months_ago, amount, self.food)
+        fit_forecasts(through=month_from_index(self.current - 2))
+        self.spend(1, '1600', self.food)
+        forecast = ExpenseForecast.objects.get(user=self.user)
+        level = forecast.level
+
+        predictions = get_expense_forecasts(self.user.pk)['predictions']
+        forecast.refresh_from_db()
+        self.assertEqual(forecast.fitted_through, month_from_index(self.current - 1))
+        self.assertEqual((forecast.months, forecast.errors, forecast.total), (4, 3, 4600.0))
+        self.assertAlmostEqual(forecast.level, level + forecast.alpha * 600)
+        self.assertEqual(predictions[0]['predicted_amount'], round(forecast.level, 2))
+
+    def test_unfitted_categories_refit_the_user(self):
+        # Spend in completed months but no fit yet, e.g. a new user
+        self.spend(2, '1000', self.food)
+        self.spend(1, '1200', self.food)
+        data = get_expense_forecasts(self.user.pk)
+        self.assertEqual([row['category'] for row in data['predictions']], ['Food & Dining'])
+        self.assertEqual(ExpenseForecast.objects.get(user=self.user).total, 2200.0)
+
+        # A stale fit that meets a category it has never seen
+        ExpenseForecast.objects.update(fitted_through=month_from_index(self.current - 2))
+        last_month = month_from_index(self.current - 1)
+        ExpenseMonthlySummary.objects.filter(
+            user=self.user, year=last_month.year, month=last_month.month
+        ).update(category=None)
+        cache.clear()
+        data = get_expense_forecasts(self.user.pk)
+        self.assertEqual(
+            sorted(row['category'] for row in data['predictions']), ['Food & Dining', 'Uncategorized']
+        )
+        self.assertEqual(
+            set(ExpenseForecast.objects.values_list('fitted_through', flat=True)), {last_month}
+        )
+
+    def test_backdated_expense_refits_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spend(0, '300', self.food)
+        self.assertFalse(ExpenseForecast.objects.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spend(2, '700', self.food)
+        self.assertEqual(ExpenseForecast.objects.get(user=self.user).total, 700.0)
+
+
+@override_settings(TEMPLATES=TEST_TEMPLATES)
+class RedFlagMatcherTests(TestCase):
+    """Fraud responses are graded by a cached multi-pattern matcher"""
+
+    def setUp(self):
+        self.scenario = FraudScenario.objects.create(
+            title='Bank KYC call', description='-', scenario_content='-', fraud_type='phishing',
+            correct_action='-', points_reward=20, difficulty_level='beginner'
+        )
+        self.flags = [
+            FraudRedFlag.objects.create(scenario=self.scenario, description=description, order=order)
+            for order, description in enumerate([
+                'Caller asks for your OTP',
+                'Pressure to act immediately',
+                'SMS link from an unknown number',
+            ])
+        ]
+        self.user = User.objects.create_user(username='spotter', password='pass12345')
+
+    def test_automaton_finds_overlapping_phrases(self):
+        automaton = Automaton([(('a', 'b'), 'ab'), (('b', 'c'), 'bc'), (('b',), 'b'), (('a', 'b', 'c', 'd'), 'abcd')])
+        self.assertEqual(
+            list(automaton.find(['a', 'b', 'c', 'x'])), [(1, 'ab', 2), (1, 'b', 1), (2, 'bc', 2)]
+        )
+
+    def test_keywords_are_normalised_with_synonyms(self):
+        self.assertEqual(flag_keywords('Pressure to act immediately'), {'urgent'})
+        self.assertEqual(flag_keywords('Asks for a One-Time Password'), {'otp'})
+        self.assertEqual(words('SMS OTPs sent urgently'), ['sms', 'otp', 'sent', 'urgent'])
+        matcher = get_matcher(self.scenario.pk)
+        score = matcher.score('He wanted the one time password and told me to hurry. The caller sounded calm.')
+        self.assertEqual(score.spotted, [self.flags[0].pk, self.flags[1].pk])
+        self.assertTrue(score.is_correct)
+        self.assertFalse(matcher.score('Nothing suspicious about this SMS').is_correct)
+
+    def test_canonical_keywords_spot_realistic_flags(self):
+        scenario = FraudScenario.objects.create(
+            title='Courier scam', description='-', scenario_content='-', fraud_type='phishing',
+            correct_action='-', points_reward=20, difficulty_level='beginner'
+        )
+        flags = [
+            FraudRedFlag.objects.create(scenario=scenario, description=description, order=order).pk
+            for order, description in enumerate([
+                'Asks for OTP or PIN',
+                'Creates a sense of urgency',
+                'Message claims your parcel will be blocked by customs',
+                'Sends an SMS link from an unknown number',
+            ])
+        ]
+        matcher = get_matcher(scenario.pk)
+        self.assertEqual(matcher.score('otp urgent').spotted, flags[:2])
+        score = matcher.score('The SMS said customs would suspend my parcel unless I clicked the URL urgently')
+        self.assertEqual(score.spotted, flags[1:])
+        self.assertTrue(score.is_correct)
+        # Filler words shared with the descriptions spot nothing
+        self.assertEqual(matcher.score('Someone sent a message asking me to call a number').spotted, [])
+
+    def test_matcher_is_cached_until_flags_change(self):
+        matcher = get_matcher(self.scenario.pk)
+        with self.assertNumQueries(0):
+            self.assertIs(get_matcher(self.scenario.pk), matcher)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flags[2].delete()
+        self.assertEqual(len(get_matcher(self.scenario.pk)), 2)
+
+    def test_view_grades_and_awards_once(self):
+        self.client.force_login(self.user)
+        url = reverse('fraud_scenario_detail', args=[self.scenario.pk])
+        response = self.client.post(url, {'user_response': 'They asked for my OTP urgently via an unknown link'})
+        self.assertEqual(response.content, b'True')
+        self.assertEqual(PointsLedger.objects.get(user=self.user).points, 20)
+
+    def test_rescore_after_flags_change(self):
+        UserFraudProgress.objects.create(
+            user=self.user, scenario=self.scenario, user_response='The caller asked for my OTP',
+            is_correct=False, is_completed=True
+        )
+        other = User.objects.create_user(username='second', password='pass12345')
+        UserFraudProgress.objects.create(
+            user=other, scenario=self.scenario, user_response='They wanted my one time password',
+            is_correct=False, is_completed=True
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            FraudRedFlag.objects.filter(pk__in=[self.flags[1].pk, self.flags[2].pk]).delete()
+        with CaptureQueriesContext(connection) as ctx:
+            counts = rescore_responses([self.scenario.pk])
+        self.assertEqual(counts, {'checked': 2, 'now_correct': 2, 'now_incorrect': 0})
+        # Users come with their responses, not one query per award
+        user_table = f'FROM "{User._meta.db_table}"'
+        self.assertFalse([query for query in ctx.captured_queries if user_table in query['sql']])
+        self.assertTrue(UserFraudProgress.objects.get(user=self.user).is_correct)
+        self.assertEqual(rescore_responses()['now_correct'], 0)
+        self.assertEqual(PointsLedger.objects.filter(user=self.user).count(), 1)
+
+
+@override_settings(TEMPLATES=TEST_TEMPLATES)
+class RenderedContentTests(TestCase):
+    """Module and scenario content is rendered to sanitized HTML once, at save time"""
+
+    def setUp(self):
+        cache.clear()
+        self.module = LearningModule.objects.create(
+            title='Budgeting', description='-', content='# Budgets\n\nSpend *less* than you earn.',
+            difficulty_level='beginner', estimated_time=5
+        )
+
+    def test_sanitize(self):
+        self.assertEqual(
+            sanitize(
+                '<p onclick="x()">Hi <script>alert(1)</script><a href="java\nscript:alert(1)">a</a>'
+                '<a href="https://example.com" target="_blank">b</a><em>open'
+            ),
+            '<p>Hi <a>a</a><a href="https://example.com">b</a><em>open</em></p>'
+        )
+
+    def test_rendered_on_save_and_served_without_rendering(self):
+        self.assertEqual(self.module.content_html, '<h1>Budgets</h1>\n<p>Spend <em>less</em> than you earn.</p>')
+        stored_hash = self.module.content_hash
+        with mock.patch('main.content.render') as render:
+            self.module.save(update_fields=['title'])
+            self.module.save()
+            render.assert_not_called()
+        self.assertEqual(LearningModule.objects.get(pk=self.module.pk).content_hash, stored_hash)
+
+        user = User.objects.create_user(username='reader', password='pass12345')
+        self.client.force_login(user)
+        url = reverse('module_detail', args=[self.module.pk])
+        with mock.patch('main.content.render') as render:
+            self.assertContains(self.client.get(url), '<em>less</em>')
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            render.assert_not_called()
+        self.assertFalse([query for query in queries if 'content_html' in query['sql']])
+
+    def test_bulk_written_rows_render_once(self):
+        LearningModule.objects.filter(pk=self.module.pk).update(content='**New**', content_html='', content_hash='')
+        module = LearningModule.objects.defer('content', 'content_html').get(pk=self.module.pk)
+        self.assertEqual(rendered_html(module), '<p><strong>New</strong></p>')
+        self.assertEqual(LearningModule.objects.get(pk=self.module.pk).content_html, '<p><strong>New</strong></p>')
+
+    def test_render_command_after_renderer_upgrade(self):
+        FraudScenario.objects.create(
+            title='Call', description='-', scenario_content='Caller asks for an *OTP*', fraud_type='phishing',
+            correct_action='-', difficulty_level='beginner'
+        )
+        self.assertEqual(render_stale(), {'learningmodule': 0, 'fraudscenario': 0})
+        self.assertEqual(rendered_html(self.module), '<h1>Budgets</h1>\n<p>Spend <em>less</em> than you earn.</p>')
+
+        # A sanitizer change without a version bump, fixed with force
+        LearningModule.objects.filter(pk=self.module.pk).update(content_html='<p>unsafe</p>')
+        key = f'content:learningmodule:{self.module.pk}:{self.module.content_hash}'
+        cache.set(key, '<p>unsafe</p>')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(render_stale(force=True), {'learningmodule': 1, 'fraudscenario': 1})
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(rendered_html(self.module), '<h1>Budgets</h1>\n<p>Spend <em>less</em> than you earn.</p>')
+
+        with mock.patch('main.content.RENDERER_VERSION', 2):
+            self.assertEqual(render_stale(), {'learningmodule': 1, 'fraudscenario': 1})
+            self.assertEqual(render_stale(), {'learningmodule': 0, 'fraudscenario': 0})
+
+
+@override_settings(TEMPLATES=TEST_TEMPLATES)
+class CatalogTests(TestCase):
+    """Content listings come from the in-process catalog, rebuilt when content changes"""
+
+    def setUp(self):
+        cache.clear()
+        content_catalog._drop_local_catalog()
+        self.module = LearningModule.objects.create(
+            title='Saving', description='-', content='Save first', difficulty_level='beginner', estimated_time=5
+        )
+        LearningModule.objects.create(
+            title='Hidden', description='-', content='-', difficulty_level='beginner', estimated_time=5,
+            is_active=False
+        )
+        self.quiz = Quiz.objects.create(module=self.module, title='Saving quiz')
+        self.questions = [
+            QuizQuestion.objects.create(
+                quiz=self.quiz, question_text=f'Q{index}', option_a='a', option_b='b', option_c='c', option_d='d',
+                correct_answer=answer
+            ) for index, answer in enumerate('BD')
+        ]
+
+    def test_built_once_and_answer_keys(self):
+        catalog = get_catalog()
+        self.assertEqual([module.title for module in catalog.modules], ['Saving'])
+        self.assertIsNone(catalog.module(self.module.pk + 1))
+        self.assertEqual(catalog.answer_keys[self.quiz.pk], ((self.questions[0].pk, self.questions[1].pk), 'BD'))
+        with self.assertNumQueries(0):
+            self.assertIs(get_catalog(), catalog)
+            self.assertEqual(len(catalog.quiz(self.module.pk).questions.all()), 2)
+
+    def test_content_writes_rebuild_it(self):
+        catalog = get_catalog()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.questions[0].delete()
+        self.assertIsNot(get_catalog(), catalog)
+        self.assertEqual(get_catalog().answer_keys[self.quiz.pk], ((self.questions[1].pk,), 'D'))
+
+        # Another process notices the new version without a local signal
+        catalog = get_catalog()
+        cache.set(content_catalog.VERSION_KEY, 'elsewhere', None)
+        with mock.patch('main.catalog.VERSION_CHECK_INTERVAL', 0):
+            self.assertIsNot(get_catalog(), catalog)
+
+    def test_rendering_outside_save_rebuilds_it(self):
+        # Rendered lazily on first view
+        LearningModule.objects.filter(pk=self.module.pk).update(content='**New**', content_html='', content_hash='')
+        catalog = get_catalog()
+        with self.captureOnCommitCallbacks(execute=True):
+            rendered_html(catalog.module(self.module.pk))
+        catalog = get_catalog()
+        self.assertEqual(
+            catalog.module(self.module.pk).content_hash,
+            LearningModule.objects.get(pk=self.module.pk).content_hash
+        )
+
+        # Rendered by the render_content command
+        with mock.patch('main.content.RENDERER_VERSION', 2), self.captureOnCommitCallbacks(execute=True):
+            render_stale()
+        self.assertIsNot(get_catalog(), catalog)
+        self.assertEqual(
+            get_catalog().module(self.module.pk).content_hash,
+            LearningModule.objects.get(pk=self.module.pk).content_hash
+        )
+
+    def test_views_read_the_catalog(self):
+        user = User.objects.create_user(username='learner', password='pass12345')
+        self.client.force_login(user)
+        get_catalog()
+        with mock.patch('main.catalog.Catalog.build') as build:
+            self.assertContains(self.client.get(reverse('learning_modules')), 'Saving')
+            self.assertEqual(self.client.get(reverse('module_detail', args=[self.module.pk + 1])).status_code, 404)
+            build.assert_not_called()
+
+
+@override_settings(TEMPLATES=TEST_TEMPLATES)
+class QuizEngineTests(TestCase):
+    """Quiz submissions are graded from the cached answer key and limited to MAX_QUIZ_ATTEMPTS"""
+
+    def setUp(self):
+        cache.clear()
+        content_catalog._drop_local_catalog()
+        self.user = User.objects.create_user(username='quizzer', password='pass12345')
+        self.module = LearningModule.objects.create(
+            title='Credit', description='-', content='-', difficulty_level='beginner', estimated_time=5
+        )
+        self.quiz = Quiz.objects.create(module=self.module, title='Credit quiz', passing_score=60)
+        self.questions = [
+            QuizQuestion.objects.create(
+                quiz=self.quiz, question_text=f'Q{index}', option_a='a', option_b='b', option_c='c',
+                option_d='d', correct_answer=answer
+            ) for index, answer in enumerate('ABCDA')
+        ]
+        self.url = reverse('take_quiz', args=[self.module.pk])
+
+    def answers(self, letters):
+        return {f'question_{question.pk}': letter for question, letter in zip(self.questions, letters)}
+
+    def test_graded_and_packed_without_loading_questions(self):
+        quiz = get_catalog().quiz(self.module.pk)
+        with CaptureQueriesContext(connection) as queries:
+            result = submit_quiz(self.user, quiz, self.answers('ABDx'))
+        self.assertFalse([query for query in queries if 'quizquestion' in query['sql']])
+        self.assertEqual((result.score, result.total, result.percentage, result.passed), (2, 5, 40.0, False))
+        self.assertEqual(result.attempt.answers, 'ABD--')
+        self.assertEqual(result.attempts_left, 2)
+
+        result = submit_quiz(self.user, quiz, self.answers('ABCDA'))
+        self.assertTrue(result.passed)
+        submit_quiz(self.user, quiz, self.answers('ABCAA'))
+        progress = UserProgress.objects.get(user=self.user, module=self.module)
+        self.assertEqual((progress.quiz_attempts, progress.quiz_score), (3, 100))
+        self.assertEqual(
+            list(PointsLedger.objects.filter(user=self.user).values_list('source', flat=True)),
+            [f'quiz:{self.quiz.pk}']
+        )
+        stats = quiz_stats(self.quiz.pk)
+        self.assertEqual((stats['attempts'], stats['users'], stats['passed']), (3, 1, 2))
+        self.assertAlmostEqual(stats['average'], (40 + 100 + 80) / 3)
+
+    def test_attempt_limit(self):
+        self.client.force_login(self.user)
+        for _ in range(settings.PAISABUDDY_SETTINGS['MAX_QUIZ_ATTEMPTS']):
+            self.client.post(self.url, self.answers('D'))
+        self.assertContains(self.client.get(self.url), '0')
+
+        response = self.client.post(self.url, self.answers('ABCDA'))
+        self.assertRedirects(response, reverse('module_detail', args=[self.module.pk]), fetch_redirect_response=False)
+        self.assertEqual(QuizAttempt.objects.filter(user=self.user).count(), 3)
+        self.assertFalse(PointsLedger.objects.filter(user=self.user).exists())
+        with self.assertRaises(AttemptsExhausted):
+            submit_quiz(self.user, get_catalog().quiz(self.module.pk), self.answers('ABCDA'))
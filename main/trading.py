@@ -0,0 +1,422 @@
+"""
+Trade execution for the virtual portfolio simulator.
+
+TradeService applies the cash, holding and VirtualTransaction changes of a
+trade as one atomic unit. The first statement of every trade is a conditional
+UPDATE on the portfolio row, which takes the row's write lock, so concurrent
+trades on the same portfolio are serialized and cash can never go negative.
+A client-supplied idempotency key makes repeated submissions of the same order
+return the original transaction instead of trading twice.
+"""
+import logging
+import random
+import time
+from decimal import Decimal
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import F, Q
+
+from main.achievements import evaluate_portfolios
+from main.dashboard import invalidate_dashboard
+from main.models import Holding, Stock, VirtualPortfolio, VirtualTransaction
+from main.pricing import revalue_portfolios
+
+logger = logging.getLogger(__name__)
+
+
+class TradeError(Exception):
+    """Raised when a trade cannot be executed"""
+
+
+class InsufficientFunds(TradeError):
+    pass
+
+
+class InsufficientShares(TradeError):
+    pass
+
+
+MAX_BATCH_ORDERS = 100
+
+
+def _add_shares(holding, quantity, price):
+    holding.quantity += quantity
+    holding.invested_amount += price * quantity
+    holding.average_price = (holding.invested_amount / holding.quantity).quantize(Decimal('0.01'))
+    holding.current_value = price * holding.quantity
+
+
+def _remove_shares(holding, quantity, price):
+    """Take shares out of a holding and return the cost basis removed"""
+    cost_basis = holding.average_price * quantity
+    holding.quantity -= quantity
+    holding.invested_amount -= cost_basis
+    holding.current_value = price * holding.quantity
+    return cost_basis
+
+
+class TradeService:
+    """Executes buy and sell orders against one virtual portfolio"""
+
+    # Attempts for trades that hit a lock timeout or serialization failure
+    max_attempts = 10
+
+    def __init__(self, portfolio):
+        self.portfolio = portfolio
+
+    def buy(self, stock, quantity, idempotency_key=None):
+        return self.execute(stock, 'buy', quantity, idempotency_key)
+
+    def sell(self, stock, quantity, idempotency_key=None):
+        return self.execute(stock, 'sell', quantity, idempotency_key)
+
+    def execute(self, stock, transaction_type, quantity, idempotency_key=None):
+        """
+        Execute an order and return ``(transaction, created)``.
+
+        ``created`` is False when ``idempotency_key`` matches an earlier order,
+        in which case nothing is traded and that order's transaction is
+        returned. Raises TradeError subclasses when the order is invalid.
+        """
+        if transaction_type not in ('buy', 'sell'):
+            raise TradeError(f'Unknown transaction type: {transaction_type}')
+        if quantity <= 0:
+            raise TradeError('Please enter a valid quantity.')
+        if idempotency_key and len(idempotency_key) > 64:
+            raise TradeError('Invalid idempotency key.')
+
+        # Trades inside a caller's transaction cannot be retried on their own
+        in_outer_transaction = transaction.get_connection().in_atomic_block
+        attempt = 0
+        while True:
+            attempt += 1
+            committed, created = [], []
+            try:
+                existing = self._existing(idempotency_key)
+                if existing is not None:
+                    return existing, False
+                try:
+                    trade = self._execute_once(stock, transaction_type, quantity, idempotency_key, committed, created)
+                    return trade, True
+                except IntegrityError:
+                    # A concurrent submission with the same key committed first
+                    existing = self._existing(idempotency_key)
+                    if existing is None:
+                        raise
+                    return existing, False
+            except OperationalError:
+                if committed:
+                    # The trade is in; only work queued for after the commit failed
+                    self._redo_commit_hooks()
+                    return created[0], True
+                if in_outer_transaction or attempt >= self.max_attempts:
+                    raise
+                logger.debug('Retrying trade for portfolio %s (attempt %d)', self.portfolio.pk, attempt)
+                time.sleep(random.uniform(0, 0.01 * attempt))
+
+    def _existing(self, idempotency_key):
+        if not idempotency_key:
+            return None
+        return VirtualTransaction.objects.filter(
+            portfolio_id=self.portfolio.pk, idempotency_key=idempotency_key
+        ).first()
+
+    def _redo_commit_hooks(self):
+        """
+        Redo the post-commit work of a committed trade after one of its
+        commit hooks raised, which drops the hooks queued after it.
+        """
+        logger.warning('Post-commit work failed for portfolio %s; running it again', self.portfolio.pk)
+        # Outside a transaction this drops the cached dashboard right away
+        invalidate_dashboard(self.portfolio.user_id)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                evaluate_portfolios([self.portfolio.pk])
+                return
+            except OperationalError:
+                if attempt >= self.max_attempts:
+                    logger.exception('Achievement evaluation failed for portfolio %s', self.portfolio.pk)
+                    return
+                time.sleep(random.uniform(0, 0.01 * attempt))
+
+    def _execute_once(self, stock, transaction_type, quantity, idempotency_key, committed, created):
+        price = stock.current_price
+        total_amount = price * quantity
+
+        with transaction.atomic():
+            # Runs before any other commit hook, so the caller can tell a
+            # failed commit from a failed hook
+            transaction.on_commit(lambda: committed.append(True))
+            if transaction_type == 'buy':
+                self._apply_buy(stock, quantity, price, total_amount)
+            else:
+                self._apply_sell(stock, quantity, price, total_amount)
+
+            trade = VirtualTransaction.objects.create(
+                portfolio_id=self.portfolio.pk,
+                stock=stock,
+                transaction_type=transaction_type,
+                quantity=quantity,
+                price_per_share=price,
+                total_amount=total_amount,
+                idempotency_key=idempotency_key or None,
+            )
+            created.append(trade)
+            revalue_portfolios([self.portfolio.pk])
+            invalidate_dashboard(self.portfolio.user_id)
+            # Read back while the row is still locked by this transaction
+            self.portfolio.refresh_from_db()
+        return trade
+
+    def _apply_buy(self, stock, quantity, price, total_amount):
+        paid = VirtualPortfolio.objects.filter(
+            pk=self.portfolio.pk, virtual_cash__gte=total_amount
+        ).update(
+            virtual_cash=F('virtual_cash') - total_amount,
+            total_invested=F('total_invested') + total_amount,
+        )
+        if not paid:
+            raise InsufficientFunds('Insufficient funds!')
+
+        # The portfolio row is now locked by this transaction
+        holding = Holding.objects.select_for_update().filter(
+            portfolio_id=self.portfolio.pk, stock=stock
+        ).first()
+        if holding is None:
+            Holding.objects.create(
+                portfolio_id=self.portfolio.pk,
+                stock=stock,
+                quantity=quantity,
+                average_price=price,
+                invested_amount=total_amount,
+                current_value=total_amount,
+            )
+            return
+
+        _add_shares(holding, quantity, price)
+        holding.save(update_fields=['quantity', 'invested_amount', 'average_price', 'current_value'])
+
+    def _apply_sell(self, stock, quantity, price, total_amount):
+        # Lock the portfolio row first so buys and sells take locks in the same order
+        VirtualPortfolio.objects.filter(pk=self.portfolio.pk).update(
+            virtual_cash=F('virtual_cash') + total_amount
+        )
+
+        holding = Holding.objects.select_for_update().filter(
+            portfolio_id=self.portfolio.pk, stock=stock
+        ).first()
+        if holding is None or holding.quantity < quantity:
+            raise InsufficientShares('Insufficient shares to sell!')
+
+        cost_basis = _remove_shares(holding, quantity, price)
+        VirtualPortfolio.objects.filter(pk=self.portfolio.pk).update(
+            total_invested=F('total_invested') - cost_basis
+        )
+
+        if holding.quantity == 0:
+            holding.delete()
+            return
+        holding.save(update_fields=['quantity', 'invested_amount', 'current_value'])
+
+    def execute_batch(self, orders, all_or_none=False):
+        """
+        Execute a basket of orders in one transaction.
+
+        Each order is a dict with ``stock_id`` or ``symbol``,
+        ``transaction_type``, ``quantity`` and an optional ``idempotency_key``.
+        Orders are applied in sequence against the portfolio's locked state;
+        stocks, holdings and earlier keys are each loaded with one query and
+        changes are written with bulk_create/bulk_update. Returns one result
+        dict per order. With ``all_or_none`` a single rejection cancels the
+        whole basket. Like execute(), the basket is retried on lock timeouts
+        and when a concurrent request commits one of its keys first.
+        """
+        if len(orders) > MAX_BATCH_ORDERS:
+            raise TradeError(f'A basket can hold at most {MAX_BATCH_ORDERS} orders.')
+
+        rejected = {}
+        parsed = []
+        for index, order in enumerate(orders):
+            try:
+                parsed.append((index, self._parse_order(order)))
+            except TradeError as e:
+                rejected[index] = str(e)
+        keys = [order['idempotency_key'] for _, order in parsed if order['idempotency_key']]
+
+        in_outer_transaction = transaction.get_connection().in_atomic_block
+        attempt = 0
+        while True:
+            attempt += 1
+            results = [{'index': index, 'status': 'pending'} for index in range(len(orders))]
+            for index, error in rejected.items():
+                results[index].update(status='rejected', error=error)
+            committed = []
+            try:
+                return self._execute_batch_once(
+                    [(results[index], order) for index, order in parsed], results, keys, all_or_none, committed
+                )
+            except IntegrityError:
+                # A concurrent request with one of these keys committed first;
+                # the retry reports its orders as duplicates
+                key_taken = VirtualTransaction.objects.filter(
+                    portfolio_id=self.portfolio.pk, idempotency_key__in=keys
+                ).exists()
+                if in_outer_transaction or attempt >= self.max_attempts or not key_taken:
+                    raise
+            except OperationalError:
+                if committed:
+                    # The basket is in; only work queued for after the commit failed
+                    self._redo_commit_hooks()
+                    return results
+                if in_outer_transaction or attempt >= self.max_attempts:
+                    raise
+                time.sleep(random.uniform(0, 0.01 * attempt))
+            logger.debug('Retrying order basket for portfolio %s (attempt %d)', self.portfolio.pk, attempt)
+
+    def _execute_batch_once(self, parsed, results, keys, all_or_none, committed):
+        with transaction.atomic():
+            # Runs before any other commit hook, so the caller can tell a
+            # failed commit from a failed hook
+            transaction.on_commit(lambda: committed.append(True))
+            # Take the portfolio row lock before reading any state
+            VirtualPortfolio.objects.filter(pk=self.portfolio.pk).update(virtual_cash=F('virtual_cash'))
+            portfolio = VirtualPortfolio.objects.get(pk=self.portfolio.pk)
+
+            stock_ids = {order['stock_id'] for _, order in parsed if order['stock_id']}
+            symbols = {order['symbol'] for _, order in parsed if order['symbol']}
+            stocks = list(Stock.objects.filter(Q(pk__in=stock_ids) | Q(symbol__in=symbols), is_active=True))
+            stocks_by_id = {stock.pk: stock for stock in stocks}
+            stocks_by_symbol = {stock.symbol: stock for stock in stocks}
+
+            holdings = {
+                holding.stock_id: holding
+                for holding in Holding.objects.select_for_update().filter(
+                    portfolio=portfolio, stock__in=stocks
+                )
+            }
+            seen_keys = {
+                trade.idempotency_key: trade
+                for trade in VirtualTransaction.objects.filter(portfolio=portfolio, idempotency_key__in=keys)
+            }
+
+            cash = portfolio.virtual_cash
+            invested = portfolio.total_invested
+            new_holdings = {}
+            touched = set()
+            trades = []
+            for result, order in parsed:
+                stock = stocks_by_id.get(order['stock_id']) or stocks_by_symbol.get(order['symbol'])
+                if stock is None:
+                    result.update(status='rejected', error='Stock not found')
+                    continue
+                result['symbol'] = stock.symbol
+
+                key = order['idempotency_key']
+                if key in seen_keys:
+                    result.update(status='duplicate', transaction_id=str(seen_keys[key].pk))
+                    continue
+
+                price = stock.current_price
+                total_amount = price * order['quantity']
+                holding = holdings.get(stock.pk)
+                if order['transaction_type'] == 'buy':
+                    if cash < total_amount:
+                        result.update(status='rejected', error='Insufficient funds!')
+                        continue
+                    cash -= total_amount
+                    invested += total_amount
+                    if holding is None:
+                        holding = Holding(
+                            portfolio=portfolio, stock=stock, quantity=0,
+                            average_price=price, invested_amount=Decimal('0')
+                        )
+                        holdings[stock.pk] = new_holdings[stock.pk] = holding
+                    _add_shares(holding, order['quantity'], price)
+                    touched.add(stock.pk)
+                else:
+                    if holding is None or holding.quantity < order['quantity']:
+                        result.update(status='rejected', error='Insufficient shares to sell!')
+                        continue
+                    cash += total_amount
+                    invested -= _remove_shares(holding, order['quantity'], price)
+                    touched.add(stock.pk)
+
+                trade = VirtualTransaction(
+                    portfolio=portfolio,
+                    stock=stock,
+                    transaction_type=order['transaction_type'],
+                    quantity=order['quantity'],
+                    price_per_share=price,
+                    total_amount=total_amount,
+                    idempotency_key=key,
+                )
+                trades.append(trade)
+                if key:
+                    seen_keys[key] = trade
+                result.update(
+                    status='executed', transaction_id=str(trade.pk),
+                    price_per_share=float(price), total_amount=float(total_amount)
+                )
+
+            if all_or_none and any(result['status'] == 'rejected' for result in results):
+                for result in results:
+                    if result['status'] == 'executed':
+                        result.update(status='cancelled')
+                        for field in ('transaction_id', 'price_per_share', 'total_amount'):
+                            result.pop(field)
+                transaction.set_rollback(True)
+                return results
+
+            VirtualPortfolio.objects.filter(pk=portfolio.pk).update(
+                virtual_cash=cash, total_invested=invested
+            )
+            existing = [holdings[stock_id] for stock_id in touched if stock_id not in new_holdings]
+            emptied = [h.pk for h in existing if h.quantity == 0]
+            changed = [h for h in existing if h.quantity > 0]
+            created = [h for h in new_holdings.values() if h.quantity > 0]
+            if emptied:
+                Holding.objects.filter(pk__in=emptied).delete()
+            if created:
+                Holding.objects.bulk_create(created)
+            if changed:
+                Holding.objects.bulk_update(
+                    changed, ['quantity', 'invested_amount', 'average_price', 'current_value']
+                )
+            if trades:
+                VirtualTransaction.objects.bulk_create(trades)
+            revalue_portfolios([portfolio.pk])
+            invalidate_dashboard(portfolio.user_id)
+            # Read back while the row is still locked by this transaction
+            self.portfolio.refresh_from_db()
+        return results
+
+    @staticmethod
+    def _parse_order(order):
+        if not isinstance(order, dict):
+            raise TradeError('Each order must be an object.')
+        transaction_type = order.get('transaction_type')
+        if transaction_type not in ('buy', 'sell'):
+            raise TradeError(f'Unknown transaction type: {transaction_type}')
+        try:
+            quantity = int(order.get('quantity', 0))
+        except (TypeError, ValueError):
+            quantity = 0
+        if quantity <= 0:
+            raise TradeError('Please enter a valid quantity.')
+        try:
+            stock_id = int(order['stock_id']) if order.get('stock_id') is not None else None
+        except (TypeError, ValueError):
+            raise TradeError('Invalid stock id.')
+        symbol = str(order.get('symbol') or '').strip().upper() or None
+        if stock_id is None and symbol is None:
+            raise TradeError('Each order needs a stock_id or symbol.')
+        key = order.get('idempotency_key') or None
+        if key is not None and (not isinstance(key, str) or len(key) > 64):
+            raise TradeError('Invalid idempotency key.')
+        return {
+            'stock_id': stock_id,
+            'symbol': symbol,
+            'transaction_type': transaction_type,
+            'quantity': quantity,
+            'idempotency_key': key,
+        }
@@ -3,12 +3,13 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Sum, Q
+from django.http import Http404, JsonResponse
+from django.db.models import Sum
 from django.utils import timezone
 from django.core.paginator import Paginator
 from decimal import Decimal
 import json
+import uuid
 from datetime import datetime, timedelta
 from django.db import transaction, IntegrityError
 from django.contrib.auth import update_session_auth_hash
@@ -17,14 +18,41 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.db import transaction
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseForbidden
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
 
 
 from main.models import (
     User, UserProfile, LearningModule, UserProgress, VirtualPortfolio,
     Stock, VirtualTransaction, Holding, Budget, BudgetCategory, Expense,
-    FraudScenario, UserFraudProgress, FinancialGoal, Quiz, QuizQuestion
+    FraudScenario, UserFraudProgress, FinancialGoal, Quiz, QuizQuestion,
+    ExpenseMonthlySummary, UserAchievement
+)
+from main.achievements import evaluate_on_commit
+from main.analytics import MAX_HISTORY_DAYS, performance as portfolio_performance
+from main.catalog import get_catalog
+from main.content import rendered_html
+from main.dashboard import DashboardContext
+from main.expense_forecast import get_forecasts as get_expense_forecasts
+from main.expense_summary import month_range_q, monthly_totals, recent_months
+from main import metrics as request_metrics
+from main.leaderboard import (
+    WINDOWS as LEADERBOARD_WINDOWS, get_snapshot as get_leaderboard_snapshot,
+    user_rank as leaderboard_user_rank
 )
+from main.points import award_points
+from main.price_history import INTERVALS as PRICE_HISTORY_INTERVALS, get_store as get_price_history
+from main.pricing import value_holdings
+from main.quizzes import QuizError, attempts_left, submit_quiz
+from main.quotes import (
+    get_table as get_quote_table, get_version as get_quote_version, parse_quote_request, quote_etag
+)
+from main.red_flags import score_response
+from main.stock_search import AUTOCOMPLETE_LIMIT, MAX_AUTOCOMPLETE_LIMIT, get_index as get_stock_index
+from main.trading import TradeError, TradeService
 from main.forms import (
     UserRegistrationForm, UserProfileForm, BudgetForm, ExpenseForm,
     FinancialGoalForm, QuizResponseForm
@@ -35,10 +63,11 @@ def home(request):
     if request.user.is_authenticated:
         return redirect('dashboard')
     
+    catalog = get_catalog()
     context = {
         'total_users': User.objects.count(),
-        'total_modules': LearningModule.objects.filter(is_active=True).count(),
-        'total_scenarios': FraudScenario.objects.filter(is_active=True).count(),
+        'total_modules': catalog.module_count,
+        'total_scenarios': catalog.scenario_count,
     }
     return render(request, 'home.html', context)
 
@@ -144,44 +173,17 @@ def logout_view(request):
 @login_required
 def dashboard(request):
     """User dashboard view"""
-    user = request.user
-    profile = get_object_or_404(UserProfile, user=user)
-    portfolio = get_object_or_404(VirtualPortfolio, user=user)
-    
-    # Get user progress
-    completed_modules = UserProgress.objects.filter(user=user, is_completed=True).count()
-    total_modules = LearningModule.objects.filter(is_active=True).count()
-    
-    # Get recent transactions
-    recent_transactions = VirtualTransaction.objects.filter(portfolio=portfolio)[:5]
-    
-    # Get active goals
-    active_goals = FinancialGoal.objects.filter(user=user, is_achieved=False)[:3]
-    
-    # Get monthly expenses
-    current_month = timezone.now().month
-    monthly_expenses = Expense.objects.filter(
-        user=user,
-        date__month=current_month
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    context = {
-        'profile': profile,
-        'portfolio': portfolio,
-        'completed_modules': completed_modules,
-        'total_modules': total_modules,
-        'progress_percentage': (completed_modules / total_modules * 100) if total_modules > 0 else 0,
-        'recent_transactions': recent_transactions,
-        'active_goals': active_goals,
-        'monthly_expenses': monthly_expenses,
-    }
+    try:
+        context = DashboardContext(request.user).get()
+    except (UserProfile.DoesNotExist, VirtualPortfolio.DoesNotExist):
+        raise Http404('Dashboard is not available for this user')
     
     return render(request, 'dashboard.html', context)
 
 @login_required
 def learning_modules(request):
     """Learning modules list view"""
-    modules = LearningModule.objects.filter(is_active=True)
+    modules = get_catalog().modules
     user_progress = UserProgress.objects.filter(user=request.user).values_list('module_id', 'is_completed')
     progress_dict = {module_id: completed for module_id, completed in user_progress}
     
@@ -194,7 +196,9 @@ def learning_modules(request):
 @login_required
 def module_detail(request, module_id):
     """Individual module detail view"""
-    module = get_object_or_404(LearningModule, id=module_id, is_active=True)
+    module = get_catalog().module(module_id)
+    if module is None:
+        raise Http404('No active learning module matches the given query.')
     
     # Get or create user progress
     progress, created = UserProgress.objects.get_or_create(
@@ -204,6 +208,7 @@ def module_detail(request, module_id):
     
     context = {
         'module': module,
+        'content_html': mark_safe(rendered_html(module)),
         'progress': progress,
     }
     
@@ -225,9 +230,11 @@ def complete_module(request, module_id):
             progress.save()
             
             # Update user profile points
-            profile = request.user.profile
-            profile.total_points += module.points_reward
-            profile.save()
+            award_points(
+                request.user, module.points_reward, f'module:{module.id}',
+                f'Completed {module.title}'
+            )
+            evaluate_on_commit('module_completed', [request.user.pk])
             
             messages.success(request, f'Module completed! You earned {module.points_reward} points.')
         
@@ -238,39 +245,33 @@ def complete_module(request, module_id):
 @login_required
 def take_quiz(request, module_id):
     """Quiz taking view"""
-    module = get_object_or_404(LearningModule, id=module_id)
-    quiz = get_object_or_404(Quiz, module=module)
+    catalog = get_catalog()
+    module, quiz = catalog.module(module_id), catalog.quiz(module_id)
+    if module is None or quiz is None:
+        raise Http404('No quiz matches the given query.')
     questions = quiz.questions.all()
     
     if request.method == 'POST':
-        score = 0
-        total_questions = questions.count()
-        
-        for question in questions:
-            user_answer = request.POST.get(f'question_{question.id}')
-            if user_answer == question.correct_answer:
-                score += 1
-        
-        percentage_score = (score / total_questions * 100) if total_questions > 0 else 0
-        
-        # Update progress
-        progress, created = UserProgress.objects.get_or_create(
-            user=request.user,
-            module=module
-        )
-        progress.quiz_score = percentage_score
-        progress.save()
+        try:
+            result = submit_quiz(request.user, quiz, request.POST, catalog)
+        except QuizError as e:
+            messages.error(request, str(e))
+            return redirect('module_detail', module_id=module_id)
         
-        if percentage_score >= quiz.passing_score:
-            messages.success(request, f'Congratulations! You passed with {percentage_score:.1f}%')
+        if result.passed:
+            messages.success(request, f'Congratulations! You passed with {result.percentage:.1f}%')
             return redirect('complete_module', module_id=module_id)
-        else:
-            messages.error(request, f'You scored {percentage_score:.1f}%. You need {quiz.passing_score}% to pass.')
+        messages.error(
+            request,
+            f'You scored {result.percentage:.1f}%. You need {quiz.passing_score}% to pass. '
+            f'Attempts left: {result.attempts_left}.'
+        )
     
     context = {
         'module': module,
         'quiz': quiz,
         'questions': questions,
+        'attempts_left': attempts_left(request.user, module_id),
     }
     
     return render(request, 'quiz.html', context)
@@ -279,27 +280,19 @@ def take_quiz(request, module_id):
 def portfolio_view(request):
     """Virtual portfolio view"""
     portfolio = get_object_or_404(VirtualPortfolio, user=request.user)
-    holdings = portfolio.holdings.all()
-    recent_transactions = portfolio.transactions.all()[:10]
-    
-    # Update current values for holdings
-    for holding in holdings:
-        holding.current_value = holding.quantity * holding.stock.current_price
-        holding.save()
+    recent_transactions = portfolio.transactions.select_related('stock')[:10]
     
-    # Update portfolio current value
-    total_current_value = holdings.aggregate(
-        total=Sum('current_value')
-    )['total'] or 0
-    
-    portfolio.current_value = total_current_value
-    portfolio.profit_loss = total_current_value - portfolio.total_invested
-    portfolio.save()
+    # Value holdings at live prices; stored values are only refreshed by the
+    # price update path (main.pricing), so GET requests never write
+    holdings, totals = value_holdings(portfolio)
     
     context = {
         'portfolio': portfolio,
         'holdings': holdings,
         'recent_transactions': recent_transactions,
+        'portfolio_value': totals['current_value'],
+        'portfolio_profit_loss': totals['profit_loss'],
+        'net_worth': totals['net_worth'],
     }
     
     return render(request, 'profile.html', context)
@@ -307,19 +300,15 @@ def portfolio_view(request):
 @login_required
 def stock_list(request):
     """Stock list for trading"""
-    stocks = Stock.objects.filter(is_active=True)
-    
-    # Search functionality
+    # Ranked ids come from the in-memory index; only the page's rows are read
     search_query = request.GET.get('search', '')
-    if search_query:
-        stocks = stocks.filter(
-            Q(symbol__icontains=search_query) |
-            Q(company_name__icontains=search_query)
-        )
+    stock_ids = get_stock_index().search(search_query)
     
-    paginator = Paginator(stocks, 20)
+    paginator = Paginator(stock_ids, 20)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    stocks = Stock.objects.filter(is_active=True).in_bulk(page_obj.object_list)
+    page_obj.object_list = [stocks[stock_id] for stock_id in page_obj.object_list if stock_id in stocks]
     
     context = {
         'page_obj': page_obj,
@@ -339,79 +328,28 @@ def trade_stock(request, stock_id):
     
     if request.method == 'POST':
         transaction_type = request.POST.get('transaction_type')
-        quantity = int(request.POST.get('quantity', 0))
+        try:
+            quantity = int(request.POST.get('quantity', 0))
+        except (TypeError, ValueError):
+            quantity = 0
         
         if quantity <= 0:
             messages.error(request, 'Please enter a valid quantity.')
             return redirect('trade_stock', stock_id=stock_id)
         
-        total_amount = quantity * stock.current_price
-        
-        if transaction_type == 'buy':
-            if portfolio.virtual_cash >= total_amount:
-                # Create transaction
-                VirtualTransaction.objects.create(
-                    portfolio=portfolio,
-                    stock=stock,
-                    transaction_type='buy',
-                    quantity=quantity,
-                    price_per_share=stock.current_price,
-                    total_amount=total_amount
-                )
-                
-                # Update portfolio cash
-                portfolio.virtual_cash -= total_amount
-                portfolio.total_invested += total_amount
-                portfolio.save()
-                
-                # Update or create holding
-                if holding:
-                    new_quantity = holding.quantity + quantity
-                    new_invested = holding.invested_amount + total_amount
-                    holding.quantity = new_quantity
-                    holding.average_price = new_invested / new_quantity
-                    holding.invested_amount = new_invested
-                    holding.save()
-                else:
-                    Holding.objects.create(
-                        portfolio=portfolio,
-                        stock=stock,
-                        quantity=quantity,
-                        average_price=stock.current_price,
-                        invested_amount=total_amount
-                    )
-                
-                messages.success(request, f'Successfully bought {quantity} shares of {stock.symbol}')
-            else:
-                messages.error(request, 'Insufficient funds!')
-        
-        elif transaction_type == 'sell':
-            if holding and holding.quantity >= quantity:
-                # Create transaction
-                VirtualTransaction.objects.create(
-                    portfolio=portfolio,
-                    stock=stock,
-                    transaction_type='sell',
-                    quantity=quantity,
-                    price_per_share=stock.current_price,
-                    total_amount=total_amount
-                )
-                
-                # Update portfolio cash
-                portfolio.virtual_cash += total_amount
-                portfolio.save()
-                
-                # Update holding
-                holding.quantity -= quantity
-                if holding.quantity == 0:
-                    holding.delete()
-                else:
-                    holding.invested_amount -= (holding.average_price * quantity)
-                    holding.save()
-                
-                messages.success(request, f'Successfully sold {quantity} shares of {stock.symbol}')
+        try:
+            trade, created = TradeService(portfolio).execute(
+                stock, transaction_type, quantity,
+                idempotency_key=request.POST.get('idempotency_key')
+            )
+        except TradeError as e:
+            messages.error(request, str(e))
+        else:
+            if created:
+                action = 'bought' if trade.transaction_type == 'buy' else 'sold'
+                messages.success(request, f'Successfully {action} {trade.quantity} shares of {stock.symbol}')
             else:
-                messages.error(request, 'Insufficient shares to sell!')
+                messages.info(request, 'This order was already submitted.')
         
         return redirect('portfolio_view')
     
@@ -419,6 +357,8 @@ def trade_stock(request, stock_id):
         'stock': stock,
         'portfolio': portfolio,
         'holding': holding,
+        # Echoed back by the form so a double submit only trades once
+        'idempotency_key': uuid.uuid4().hex,
     }
     
     return render(request, 'trade.html', context)
@@ -475,14 +415,9 @@ def expense_tracking(request):
     
     # Monthly expense summary
     monthly_expenses = {}
-    for i in range(6):
-        date = timezone.now() - timedelta(days=30*i)
-        month_expenses = Expense.objects.filter(
-            user=request.user,
-            date__year=date.year,
-            date__month=date.month
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        monthly_expenses[date.strftime('%b %Y')] = float(monthly_expenses)
+    month_totals = monthly_totals(request.user, recent_months(timezone.localdate(), 6))
+    for date, month_expenses in sorted(month_totals.items(), reverse=True):
+        monthly_expenses[date.strftime('%b %Y')] = float(month_expenses)
     
     context = {
         'expenses': expenses,
@@ -518,7 +453,7 @@ def financial_goals(request):
 @login_required
 def fraud_scenarios(request):
     """Fraud scenario challenges"""
-    scenarios = FraudScenario.objects.filter(is_active=True)
+    scenarios = get_catalog().scenarios
     user_progress = UserFraudProgress.objects.filter(user=request.user).values_list(
         'scenario_id', 'is_completed', 'is_correct'
     )
@@ -534,7 +469,9 @@ def fraud_scenarios(request):
 @login_required
 def fraud_scenario_detail(request, scenario_id):
     """Individual fraud scenario view"""
-    scenario = get_object_or_404(FraudScenario, id=scenario_id, is_active=True)
+    scenario = get_catalog().scenario(scenario_id)
+    if scenario is None:
+        raise Http404('No active fraud scenario matches the given query.')
     
     # Check if user has already completed this scenario
     progress = UserFraudProgress.objects.filter(
@@ -545,14 +482,8 @@ def fraud_scenario_detail(request, scenario_id):
     if request.method == 'POST' and not progress:
         user_response = request.POST.get('user_response', '')
         
-        # Simple check - in a real app, you'd have more sophisticated evaluation
-        red_flags_mentioned = 0
-        for flag in scenario.red_flags:
-            if flag.lower() in user_response.lower():
-                red_flags_mentioned += 1
-        
-        # Consider correct if user mentioned at least 60% of red flags
-        is_correct = red_flags_mentioned >= len(scenario.red_flags) * 0.6
+        # Correct when the response spots enough of the scenario's red flags
+        is_correct = score_response(scenario.pk, user_response).is_correct
         
         # Create progress record
         UserFraudProgress.objects.create(
@@ -566,9 +497,10 @@ def fraud_scenario_detail(request, scenario_id):
         
         # Award points if correct
         if is_correct:
-            profile = request.user.profile
-            profile.total_points += scenario.points_reward
-            profile.save()
+            award_points(
+                request.user, scenario.points_reward, f'fraud_scenario:{scenario.id}',
+                f'Solved {scenario.title}'
+            )
             messages.success(request, f'Correct! You earned {scenario.points_reward} points.')
         else:
             messages.warning(request, 'Good try! Review the explanation and try similar scenarios.')
@@ -577,6 +509,8 @@ def fraud_scenario_detail(request, scenario_id):
     
     context = {
         'scenario': scenario,
+        'scenario_html': mark_safe(rendered_html(scenario)),
+        'red_flags': scenario.red_flags.all(),
         'progress': progress,
     }
     
@@ -606,21 +540,30 @@ def profile_settings(request):
 @login_required
 def leaderboard(request):
     """Leaderboard view"""
-    top_users = UserProfile.objects.select_related('user').order_by('-total_points')[:20]
+    window = request.GET.get('window', 'all')
+    if window not in LEADERBOARD_WINDOWS:
+        window = 'all'
     
-    # Get current user's rank
-    user_rank = UserProfile.objects.filter(
-        total_points__gt=request.user.profile.total_points
-    ).count() + 1
+    # Ranks come from a cached snapshot rather than per-request COUNT queries
+    snapshot = get_leaderboard_snapshot(window)
+    profile = request.user.profile
     
     context = {
-        'top_users': top_users,
-        'user_rank': user_rank,
-        'user_profile': request.user.profile,
+        'top_users': snapshot['top'],
+        'user_rank': leaderboard_user_rank(snapshot, request.user.id, profile.total_points),
+        'user_profile': profile,
+        'window': window,
+        'windows': LEADERBOARD_WINDOWS,
     }
     
     return render(request, 'leaderboard.html', context)
 
+def metrics(request):
+    """Prometheus scrape endpoint, merged across worker processes"""
+    if not request_metrics.is_authorized(request):
+        return HttpResponseForbidden()
+    return HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # API Views for AJAX requests
 @login_required
 def api_stock_price(request, stock_id):
@@ -637,29 +580,131 @@ def api_stock_price(request, stock_id):
     except Stock.DoesNotExist:
         return JsonResponse({'error': 'Stock not found'}, status=404)
 
+def _stock_quotes_etag(request):
+    try:
+        ids, symbols = parse_quote_request(request.GET, settings.PAISABUDDY_SETTINGS['MAX_QUOTES_PER_REQUEST'])
+    except ValueError:
+        return None
+    return quote_etag(get_quote_version(), ids, symbols)
+
+# Authentication comes first, so only signed-in clients get an ETag or a 304;
+# the ETag itself is computed from the cached quote version without queries
 @login_required
-def api_portfolio_summary(request):
-    """API endpoint for portfolio summary"""
-    portfolio = get_object_or_404(VirtualPortfolio, user=request.user)
+@condition(etag_func=_stock_quotes_etag)
+def api_stock_quotes(request):
+    """API endpoint for the quotes of many stocks, by id and/or symbol"""
+    try:
+        ids, symbols = parse_quote_request(request.GET, settings.PAISABUDDY_SETTINGS['MAX_QUOTES_PER_REQUEST'])
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    version = get_quote_version()
+    quotes, missing = get_quote_table(version).lookup(ids, symbols)
+    response = JsonResponse({'version': version, 'quotes': quotes, 'missing': missing})
+    # Let browsers keep the body but revalidate every poll
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@login_required
+def api_stock_history(request, stock_id):
+    """API endpoint for OHLC chart bars from the price history store"""
+    interval = request.GET.get('interval', '1d')
+    if interval not in PRICE_HISTORY_INTERVALS:
+        return JsonResponse({'error': f'interval must be one of {", ".join(PRICE_HISTORY_INTERVALS)}'}, status=400)
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        return JsonResponse({'error': 'days must be an integer'}, status=400)
+    if not 1 <= days <= MAX_HISTORY_DAYS:
+        return JsonResponse({'error': f'days must be between 1 and {MAX_HISTORY_DAYS}'}, status=400)
     
-    return JsonResponse({
+    stock = get_object_or_404(Stock, id=stock_id, is_active=True)
+    end = timezone.now()
+    bars = get_price_history().ohlc(stock.symbol, end - timedelta(days=days), end, PRICE_HISTORY_INTERVALS[interval])
+    return JsonResponse({'symbol': stock.symbol, 'interval': interval, 'bars': bars})
+
+@login_required
+def api_stock_search(request):
+    """Autocomplete suggestions for a symbol or company name prefix"""
+    query = request.GET.get('q', '')
+    try:
+        limit = min(int(request.GET.get('limit', AUTOCOMPLETE_LIMIT)), MAX_AUTOCOMPLETE_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    if limit < 1:
+        return JsonResponse({'error': 'limit must be positive'}, status=400)
+    return JsonResponse({'query': query, 'results': get_stock_index().suggest(query, limit)})
+
+def _portfolio_summary(portfolio):
+    """JSON-ready summary of a portfolio's stored values"""
+    return {
         'virtual_cash': float(portfolio.virtual_cash),
         'total_invested': float(portfolio.total_invested),
         'current_value': float(portfolio.current_value),
         'profit_loss': float(portfolio.profit_loss),
         'profit_loss_percent': float(portfolio.profit_loss / portfolio.total_invested * 100) if portfolio.total_invested > 0 else 0,
+    }
+
+@login_required
+def api_portfolio_summary(request):
+    """API endpoint for portfolio summary"""
+    portfolio = get_object_or_404(VirtualPortfolio, user=request.user)
+    
+    return JsonResponse(_portfolio_summary(portfolio))
+
+@login_required
+def api_batch_orders(request):
+    """API endpoint to submit a basket of buy/sell orders in one transaction"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'POST required'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        orders = data['orders']
+        if not isinstance(orders, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Expected {"orders": [...]}'}, status=400)
+    
+    portfolio = get_object_or_404(VirtualPortfolio, user=request.user)
+    try:
+        results = TradeService(portfolio).execute_batch(
+            orders, all_or_none=bool(data.get('all_or_none', False))
+        )
+    except TradeError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'portfolio': _portfolio_summary(portfolio),
     })
 
+@login_required
+def api_portfolio_history(request):
+    """API endpoint for the portfolio performance chart, read from daily snapshots"""
+    try:
+        days = int(request.GET.get('days', 90))
+    except ValueError:
+        return JsonResponse({'error': 'days must be an integer'}, status=400)
+    if not 1 <= days <= MAX_HISTORY_DAYS:
+        return JsonResponse({'error': f'days must be between 1 and {MAX_HISTORY_DAYS}'}, status=400)
+    
+    portfolio = get_object_or_404(VirtualPortfolio, user=request.user)
+    end = timezone.localdate()
+    return JsonResponse(portfolio_performance(portfolio, end - timedelta(days=days - 1), end))
+
 @login_required
 def api_user_stats(request):
     """API endpoint for user statistics"""
     profile = request.user.profile
     
     # Calculate completion rates
-    total_modules = LearningModule.objects.filter(is_active=True).count()
+    catalog = get_catalog()
+    total_modules = catalog.module_count
     completed_modules = UserProgress.objects.filter(user=request.user, is_completed=True).count()
     
-    total_scenarios = FraudScenario.objects.filter(is_active=True).count()
+    total_scenarios = catalog.scenario_count
     completed_scenarios = UserFraudProgress.objects.filter(user=request.user, is_completed=True).count()
     
     return JsonResponse({
@@ -678,8 +723,9 @@ def profile_settings(request):
     profile, created = UserProfile.objects.get_or_create(user=request.user)
     
     # Get statistics for display
-    total_modules = LearningModule.objects.filter(is_active=True).count()
-    total_scenarios = FraudScenario.objects.filter(is_active=True).count()
+    catalog = get_catalog()
+    total_modules = catalog.module_count
+    total_scenarios = catalog.scenario_count
     completed_modules = UserProgress.objects.filter(user=request.user, is_completed=True).count()
     completed_scenarios = UserFraudProgress.objects.filter(user=request.user, is_completed=True).count()
     
@@ -772,48 +818,14 @@ def user_achievements(request):
     """View user achievements"""
     profile, created = UserProfile.objects.get_or_create(user=request.user)
     
-    # Calculate achievements based on user progress
-    achievements = []
-    
-    # Module completion achievements
-    completed_modules = UserProgress.objects.filter(user=request.user, is_completed=True).count()
-    if completed_modules >= 1:
-        achievements.append("First Steps")
-    if completed_modules >= 5:
-        achievements.append("Learning Enthusiast")
-    if completed_modules >= 10:
-        achievements.append("Knowledge Seeker")
-    
-    # Points achievements
-    if profile.total_points >= 100:
-        achievements.append("Point Collector")
-    if profile.total_points >= 500:
-        achievements.append("High Achiever")
-    if profile.total_points >= 1000:
-        achievements.append("Master Learner")
-    
-    # Streak achievements
-    if profile.streak_days >= 7:
-        achievements.append("Week Warrior")
-    if profile.streak_days >= 30:
-        achievements.append("Monthly Master")
-    
-    # Portfolio achievements
-    try:
-        portfolio = request.user.portfolio
-        if portfolio.profit_loss > 0:
-            achievements.append("Profit Maker")
-        if portfolio.current_value > 110000:  # More than starting amount
-            achievements.append("Investment Growth")
-    except:
-        pass  # Portfolio might not exist yet
-    
-    # Update profile achievements
-    profile.achievements = achievements
-    profile.save()
+    # Earned achievements are awarded by main.achievements as events happen
+    earned = list(
+        UserAchievement.objects.filter(user=request.user).select_related('achievement').order_by('earned_date')
+    )
     
     context = {
-        'achievements': achievements,
+        'achievements': [earned_achievement.achievement.name for earned_achievement in earned],
+        'earned_achievements': earned,
         'profile': profile,
     }
     
@@ -822,7 +834,7 @@ from datetime import datetime, timedelta
 import calendar
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum
+from django.db.models import Sum, Count
 from .models import Budget, Expense  # Make sure these imports match your model names
 
 @login_required
@@ -863,25 +875,41 @@ def budget_analysis(request):
     # Get expenses for selected month
     monthly_expenses = Expense.objects.filter(
         user=request.user,
-        date__year=selected_year,
-        date__month=selected_month
+        date__gte=first_day,
+        date__lte=last_day
     ).select_related('category')
     
+    # Daily totals in one grouped query; days without expenses are filled below
+    daily_totals = dict(
+        monthly_expenses.order_by().values('date').annotate(
+            total=Sum('amount')
+        ).values_list('date', 'total')
+    )
+    
     # Calculate total monthly expenses
-    total_monthly_expenses = monthly_expenses.aggregate(total=Sum('amount'))['total'] or 0
+    total_monthly_expenses = sum(daily_totals.values(), Decimal('0'))
+    
+    # Summary rows for the selected month
+    month_summaries = ExpenseMonthlySummary.objects.filter(
+        user=request.user,
+        year=selected_year,
+        month=selected_month
+    )
     
     # Category-wise expense breakdown
     category_expenses = {}
-    for expense in monthly_expenses:
-        if expense.category:
-            cat_name = expense.category.name
-            if cat_name not in category_expenses:
-                category_expenses[cat_name] = {
-                    'spent': 0, 
-                    'budget': float(expense.category.allocated_amount), 
-                    'category_id': expense.category.id
-                }
-            category_expenses[cat_name]['spent'] += float(expense.amount)
+    category_totals = month_summaries.filter(category__isnull=False).values(
+        'category_id', 'category__name', 'category__allocated_amount'
+    ).annotate(total=Sum('total_amount'))
+    for row in category_totals:
+        cat_name = row['category__name']
+        if cat_name not in category_expenses:
+            category_expenses[cat_name] = {
+                'spent': 0, 
+                'budget': float(row['category__allocated_amount']), 
+                'category_id': row['category_id']
+            }
+        category_expenses[cat_name]['spent'] += float(row['total'])
     
     # Calculate budget vs actual for each category
     budget_analysis_data = []
@@ -914,14 +942,7 @@ def budget_analysis(request):
     
     # Monthly comparison (last 6 months)
     monthly_comparison = []
-    for i in range(6):
-        date = today.replace(day=1) - timedelta(days=32*i)
-        month_expenses = Expense.objects.filter(
-            user=request.user,
-            date__year=date.year,
-            date__month=date.month
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
+    for date, month_expenses in monthly_totals(request.user, recent_months(today, 6)).items():
         monthly_comparison.append({
             'month': date.strftime('%b %Y'),
             'amount': float(month_expenses),
@@ -929,21 +950,18 @@ def budget_analysis(request):
             'year': date.year
         })
     
-    monthly_comparison.reverse()
-    
     # Daily expense trends
     daily_expenses = []
     for day in range(1, calendar.monthrange(selected_year, selected_month)[1] + 1):
         day_date = datetime(selected_year, selected_month, day).date()
-        day_total = monthly_expenses.filter(date=day_date).aggregate(total=Sum('amount'))['total'] or 0
         daily_expenses.append({
             'day': day,
-            'amount': float(day_total)
+            'amount': float(daily_totals.get(day_date) or 0)
         })
     
     # Top expense categories
-    top_categories = monthly_expenses.values('category__name').annotate(
-        total=Sum('amount')
+    top_categories = month_summaries.values('category__name').annotate(
+        total=Sum('total_amount')
     ).order_by('-total')[:5]
     
     # Get user's monthly income (add error handling)
@@ -1132,54 +1150,16 @@ def budget_planner(request):
 
 @login_required
 def expense_predictor(request):
-    """Predict future expenses based on historical data"""
-    from django.db.models import Avg
-    from datetime import datetime, timedelta
-    import json
-    
+    """Forecast this month's and the next months' spending per category"""
     if request.method == 'GET':
-        # Get historical expense data for prediction
-        months_back = 6
-        start_date = timezone.now().date() - timedelta(days=30 * months_back)
-        
-        # Calculate average monthly expenses by category
-        historical_expenses = Expense.objects.filter(
-            user=request.user,
-            date__gte=start_date
-        ).values('category__name').annotate(
-            avg_monthly=Avg('amount'),
-            total_months=Count('date__month', distinct=True)
-        )
-        
-        # Seasonal adjustments (basic example)
-        current_month = timezone.now().month
-        seasonal_multipliers = {
-            12: 1.3, 1: 1.2, 2: 0.9,  # Holiday season, New Year, February
-            3: 1.0, 4: 1.0, 5: 1.0,   # Spring
-            6: 1.1, 7: 1.2, 8: 1.1,   # Summer (travel season)
-            9: 1.0, 10: 1.1, 11: 1.2  # Fall, Holiday prep
-        }
-        
-        predictions = []
-        for expense_data in historical_expenses:
-            category = expense_data['category__name'] or 'Uncategorized'
-            avg_amount = expense_data['avg_monthly'] or 0
-            seasonal_factor = seasonal_multipliers.get(current_month, 1.0)
-            predicted_amount = avg_amount * seasonal_factor
-            
-            predictions.append({
-                'category': category,
-                'historical_avg': float(avg_amount),
-                'predicted_amount': float(predicted_amount),
-                'seasonal_factor': seasonal_factor,
-                'confidence': 0.8 if expense_data['total_months'] >= 3 else 0.5
-            })
-        
+        forecasts = get_expense_forecasts(request.user.pk)
         return JsonResponse({
             'success': True,
-            'predictions': predictions,
-            'current_month': current_month,
-            'months_analyzed': months_back
+            'predictions': forecasts['predictions'],
+            'current_month': timezone.localdate().month,
+            'months_analyzed': forecasts['months_analyzed'],
+            'fitted_through': forecasts['fitted_through'],
+            'interval': forecasts['interval'],
         })
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
\ No newline at end of file
@@ -2,6 +2,8 @@
 ASGI config for paisabuddy project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests for the SSE price stream are served by main.streaming; everything
+else goes to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'paisabuddy.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up
+from main.streaming import STREAM_PATH, price_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        return await price_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -35,6 +35,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.metrics.MetricsMiddleware',  # Outermost, so latency covers the whole stack
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # For static files in production
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -246,6 +247,7 @@ PAISABUDDY_SETTINGS = {
     'POINTS_PER_FRAUD_SCENARIO': 20,
     'POINTS_FOR_DAILY_LOGIN': 5,
     'POINTS_FOR_STREAK_MILESTONE': 25,
+    'POINTS_PER_LEVEL': 100,
     
     # Learning Settings
     'QUIZ_PASSING_SCORE': 70,
@@ -276,6 +278,34 @@ PAISABUDDY_SETTINGS = {
     'STOCK_DATA_REFRESH_INTERVAL': 300,  # 5 minutes
     'PORTFOLIO_UPDATE_INTERVAL': 60,     # 1 minute
     'LEADERBOARD_UPDATE_INTERVAL': 3600, # 1 hour
+    'DASHBOARD_CACHE_TIMEOUT': 300,      # 5 minutes
+    'MAX_QUOTES_PER_REQUEST': 200,
+    
+    # Columnar tick history (one .ts/.px file pair per symbol)
+    'PRICE_HISTORY_DIR': config('PRICE_HISTORY_DIR', default=str(BASE_DIR / 'price_history')),
+    
+    # Local market simulator (geometric Brownian motion); drift and volatility are annual
+    'SIMULATOR': {
+        'DRIFT': 0.08,
+        'VOLATILITY': 0.25,
+        'SECTOR_VOLATILITY': {'IT': 0.30, 'Pharma': 0.28, 'Realty': 0.35, 'FMCG': 0.18},
+        'MARKET_CORRELATION': 0.30,  # shared by every pair of stocks
+        'SECTOR_CORRELATION': 0.30,  # extra for stocks in the same sector
+        'TICK_SECONDS': 60,          # simulated market time per step
+    },
+    
+    # Price stream (ASGI only): JSON-lines tick file every tick writer appends to and
+    # every worker tails (empty = in-process feed, which misses other processes' ticks)
+    'PRICE_FEED_FILE': config('PRICE_FEED_FILE', default=str(BASE_DIR / 'price_feed.jsonl')),
+    'PRICE_FEED_POLL_INTERVAL': 1.0,            # seconds
+    'STREAM_HEARTBEAT_SECONDS': 15,
+    'STREAM_PORTFOLIO_REFRESH_SECONDS': 120,    # reload a watcher's holdings
+    
+    # Monitoring: shared directory for multi-process metrics (empty = this process only)
+    'METRICS_DIR': config('METRICS_DIR', default=''),
+    'METRICS_FLUSH_INTERVAL': 5,         # seconds
+    'METRICS_SNAPSHOT_TTL': 3600,        # seconds before a dead worker's snapshot is deleted
+    'METRICS_TOKEN': config('METRICS_TOKEN', default=''),  # bearer token for scrapers (staff always allowed)
 }
 
 # Development-specific settings
@@ -17,6 +17,7 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('profile/settings/', views.profile_settings, name='profile_settings'),
     path('leaderboard/', views.leaderboard, name='leaderboard'),
+    path('achievements/', views.user_achievements, name='user_achievements'),
     
     # Learning Module URLs
     path('learn/', views.learning_modules, name='learning_modules'),
@@ -42,6 +43,14 @@ urlpatterns = [
     
     # API URLs
     path('api/stock/<int:stock_id>/price/', views.api_stock_price, name='api_stock_price'),
+    path('api/stock/<int:stock_id>/history/', views.api_stock_history, name='api_stock_history'),
+    path('api/stocks/search/', views.api_stock_search, name='api_stock_search'),
+    path('api/stocks/quotes/', views.api_stock_quotes, name='api_stock_quotes'),
     path('api/portfolio/summary/', views.api_portfolio_summary, name='api_portfolio_summary'),
+    path('api/portfolio/orders/', views.api_batch_orders, name='api_batch_orders'),
+    path('api/portfolio/history/', views.api_portfolio_history, name='api_portfolio_history'),
     path('api/user/stats/', views.api_user_stats, name='api_user_stats'),
+    
+    # Monitoring
+    path('metrics/', views.metrics, name='metrics'),
 ]
\ No newline at end of file